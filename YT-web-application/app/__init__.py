@@ -6,15 +6,19 @@ settings, extensions, and blueprints.
 """
 
 import os
+import queue
+import atexit
 import logging
+import threading
 from flask import Flask
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from app.config import Config
 
 
 def create_app() -> Flask:
     """
     Create and configure the Flask application.
-
+    
     Returns:
         Flask: Configured Flask application instance.
     """
@@ -22,16 +26,18 @@ def create_app() -> Flask:
     
     # Configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
-    app.config['DOWNLOAD_FOLDER'] = os.path.join(
-        os.path.dirname(os.path.dirname(__file__)), 
-        'downloads'
-    )
+    app.config['DOWNLOAD_FOLDER'] = Config.DOWNLOAD_FOLDER
+    app.config['STATE_DIR'] = Config.STATE_DIR
     app.config['MAX_CONTENT_LENGTH'] = int(
         os.environ.get('MAX_CONTENT_LENGTH', 524288000)
     )
+    app.config['YTDLP_WARMUP'] = Config.YTDLP_WARMUP
+    app.config['FILE_DELIVERY'] = Config.FILE_DELIVERY
+    app.config['USE_X_SENDFILE'] = Config.FILE_DELIVERY == 'x-sendfile'
     
-    # Ensure download folder exists
+    # Ensure download and state folders exist
     os.makedirs(app.config['DOWNLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['STATE_DIR'], exist_ok=True)
     
     # Configure logging
     if not app.debug:
@@ -46,7 +52,14 @@ def create_app() -> Flask:
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
         ))
         file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
+        # Write to disk on a listener thread so logging never blocks callers
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.setLevel(logging.INFO)
+        app.logger.addHandler(queue_handler)
         app.logger.setLevel(logging.INFO)
         app.logger.info('YouTube Downloader startup')
     
@@ -54,4 +67,43 @@ def create_app() -> Flask:
     from app.routes import main_bp
     app.register_blueprint(main_bp)
     
+    # Start enforcing the downloads folder quota and resume interrupted jobs
+    # and batches
+    from app.routes import get_batch_manager, get_job_manager, get_storage_manager
+    with app.app_context():
+        get_storage_manager()
+        get_job_manager()
+        get_batch_manager()
+    
+    # Load yt-dlp and build the downloader according to the startup mode
+    warmup = app.config['YTDLP_WARMUP']
+    if warmup == 'eager':
+        _warm_up(app)
+    elif warmup == 'background':
+        threading.Thread(
+            target=_warm_up,
+            args=(app,),
+            name='ytdlp-warmup',
+            daemon=True
+        ).start()
+    
     return app
+
+
+def _warm_up(app: Flask) -> None:
+    """
+    Import yt-dlp, create the shared downloader and warm its cache directory.
+    
+    Args:
+        app: Flask application whose configuration the downloader uses.
+    """
+    from app.routes import get_downloader
+    
+    try:
+        with app.app_context():
+            downloader = get_downloader()
+        app.logger.info('yt-dlp warm-up complete')
+        if Config.YDL_CACHE_WARM_URL:
+            downloader.warm_ydl_cache(Config.YDL_CACHE_WARM_URL)
+    except Exception as e:
+        app.logger.error(f"yt-dlp warm-up failed: {str(e)}")
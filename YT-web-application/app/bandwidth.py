@@ -0,0 +1,360 @@
+"""
+Bandwidth scheduling module.
+
+This module divides a global download rate between the running jobs. Each
+job draws from its own token bucket, whose rate is the job's fair share of the
+global cap (and of its client's cap). Shares are recomputed as jobs start and
+finish and as their measured demand changes, and the buckets are drained from
+yt-dlp's progress hook, so a job is throttled on the fly in its own download
+thread. Schedulers of several processes divide the same caps by sharing their
+jobs through a SQLite database.
+"""
+
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from app.db import connect
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lanes (
+    scheduler TEXT NOT NULL,
+    client TEXT,
+    demand REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lanes_scheduler ON lanes (scheduler);
+"""
+
+UNLIMITED = float('inf')
+
+# Lowest rate a job limited by its source is reduced to (bytes per second)
+MIN_RATE = 64 * 1024
+
+
+class BandwidthScheduler:
+    """
+    Max-min fair division of a global download rate between jobs.
+    
+    A job's cap is its client's limit split between that client's jobs and,
+    unless the job had to wait recently, its measured speed plus headroom:
+    a job limited by its source does not hold on to bandwidth others could
+    use. The global rate is then water-filled over the jobs: jobs capped
+    below an equal share keep their cap and the rest is split between the
+    others.
+    
+    With a database path, every rebalance publishes this scheduler's jobs
+    and water-fills over the jobs of all schedulers using the same file, so
+    the caps hold across worker processes. Jobs of a scheduler that has not
+    published for ``3 * rebalance_interval`` (stalled or crashed) are left
+    out.
+    """
+    
+    DB_FILENAME = '.bandwidth.sqlite3'
+    
+    def __init__(
+        self,
+        rate: float = 0,
+        client_rate: float = 0,
+        burst: float = 1.0,
+        rebalance_interval: float = 1.0,
+        headroom: float = 1.5,
+        path: Optional[str] = None
+    ):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            rate: Global limit in bytes per second, 0 for none.
+            client_rate: Limit per client in bytes per second, 0 for none.
+            burst: Seconds of a job's rate its bucket can hold.
+            rebalance_interval: Seconds between two measurements of the
+                jobs' demand while they run.
+            headroom: Factor applied to the measured speed of a job that did
+                not have to wait, letting it grow between measurements.
+            path: Optional database file shared with the schedulers of other
+                processes.
+        """
+        self.rate = rate or UNLIMITED
+        self.client_rate = client_rate or UNLIMITED
+        self.burst = burst
+        self.rebalance_interval = rebalance_interval
+        self.headroom = headroom
+        self.throttled_seconds = 0.0
+        self._lanes: List['BandwidthLane'] = []
+        self._measured_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.instance = str(uuid.uuid4())
+        self._conn = connect(path, SCHEMA) if path else None
+    
+    @property
+    def ceiling(self) -> Optional[float]:
+        """Highest rate any single job may get, or None if unlimited."""
+        ceiling = min(self.rate, self.client_rate)
+        return ceiling if ceiling != UNLIMITED else None
+    
+    def open(self, client: Optional[str] = None) -> 'BandwidthLane':
+        """
+        Register a job.
+        
+        Args:
+            client: Identity of the requesting client (e.g. its address),
+                whose jobs share ``client_rate``.
+        
+        Returns:
+            The job's lane; close it when the job ends.
+        """
+        lane = BandwidthLane(self, client)
+        with self._lock:
+            self._lanes.append(lane)
+            self._rebalance(time.monotonic())
+        return lane
+    
+    def close(self, lane: 'BandwidthLane') -> None:
+        """
+        Unregister a job and hand its share to the others.
+        
+        Args:
+            lane: Lane returned by ``open``.
+        """
+        with self._lock:
+            if lane in self._lanes:
+                self._lanes.remove(lane)
+                self._rebalance(time.monotonic())
+    
+    def consume(self, lane: 'BandwidthLane', amount: int) -> float:
+        """
+        Charge downloaded bytes to a job's bucket.
+        
+        The bucket may go into debt; the caller pays it back by sleeping
+        for the returned time, which throttles the job to its share.
+        
+        Args:
+            lane: Lane of the job.
+            amount: Bytes downloaded since the previous call.
+        
+        Returns:
+            Seconds the caller should wait, at most ``rebalance_interval``
+            so a changed share takes effect on the next call; the rest of
+            the debt stays in the bucket.
+        """
+        now = time.monotonic()
+        with self._lock:
+            lane.window_bytes += amount
+            if now - self._measured_at >= self.rebalance_interval:
+                self._measure(now)
+                self._rebalance(now)
+            if lane.rate == UNLIMITED:
+                return 0.0
+            
+            lane.refill(now)
+            lane.tokens -= amount
+            if lane.tokens >= 0:
+                return 0.0
+            wait = min(-lane.tokens / lane.rate, self.rebalance_interval)
+            lane.throttled = True
+            self.throttled_seconds += wait
+            return wait
+    
+    def _measure(self, now: float) -> None:
+        """
+        Estimate what each job would use unthrottled. Must be called with
+        the lock held.
+        
+        A job that had to wait may want more than it got; a job that never
+        waited during a full window uses what its source delivers.
+        
+        Args:
+            now: Current ``time.monotonic()``.
+        """
+        self._measured_at = now
+        for lane in self._lanes:
+            elapsed = now - lane.window_start
+            if lane.throttled or elapsed < self.rebalance_interval / 2:
+                lane.demand = UNLIMITED
+            else:
+                lane.demand = max(lane.window_bytes / elapsed * self.headroom, MIN_RATE)
+            lane.window_start = now
+            lane.window_bytes = 0
+            lane.throttled = False
+    
+    def _rebalance(self, now: float) -> None:
+        """
+        Recompute every job's rate. Must be called with the lock held.
+        
+        Args:
+            now: Current ``time.monotonic()``.
+        """
+        jobs = [(lane.client, lane.demand, lane) for lane in self._lanes]
+        if self._conn is not None:
+            jobs += self._share()
+        clients: Dict[Optional[str], int] = {}
+        for client, _, _ in jobs:
+            clients[client] = clients.get(client, 0) + 1
+        
+        caps = sorted(
+            ((min(self.client_rate / clients[client], demand), lane) for client, demand, lane in jobs),
+            key=lambda item: item[0]
+        )
+        remaining = self.rate
+        for index, (cap, lane) in enumerate(caps):
+            rate = min(cap, remaining / (len(caps) - index))
+            if remaining != UNLIMITED:
+                remaining -= rate
+            if lane is not None:
+                lane.set_rate(rate, now)
+    
+    def _share(self) -> List[Tuple[Optional[str], float, None]]:
+        """
+        Publish this scheduler's jobs and read those of other processes.
+        Must be called with the lock held.
+        
+        Returns:
+            (client, demand, None) for each recent job of another scheduler;
+            empty if the database cannot be used.
+        """
+        now = time.time()
+        expired = now - 3 * self.rebalance_interval
+        try:
+            with self._conn:
+                self._conn.execute('BEGIN')
+                self._conn.execute(
+                    'DELETE FROM lanes WHERE scheduler = ? OR updated_at < ?',
+                    (self.instance, expired)
+                )
+                self._conn.executemany(
+                    'INSERT INTO lanes (scheduler, client, demand, updated_at) VALUES (?, ?, ?, ?)',
+                    [
+                        (self.instance, lane.client, lane.demand if lane.demand != UNLIMITED else None, now)
+                        for lane in self._lanes
+                    ]
+                )
+                rows = self._conn.execute(
+                    'SELECT client, demand FROM lanes WHERE scheduler != ?', (self.instance,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not share bandwidth between processes: {str(e)}")
+            return []
+        return [
+            (row['client'], row['demand'] if row['demand'] is not None else UNLIMITED, None)
+            for row in rows
+        ]
+    
+    def stats(self) -> Dict:
+        """
+        Get scheduler statistics.
+        
+        Returns:
+            Dictionary with the limits, the rate of each running job and the
+            total time jobs were held back.
+        """
+        def limit(value: float) -> Optional[int]:
+            return round(value) if value != UNLIMITED else None
+        
+        with self._lock:
+            rates = [limit(lane.rate) for lane in self._lanes]
+        return {
+            'rate': limit(self.rate),
+            'client_rate': limit(self.client_rate),
+            'jobs': rates,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+        }
+
+
+class BandwidthLane:
+    """Token bucket of a single job, fed by its progress hook."""
+    
+    def __init__(self, scheduler: BandwidthScheduler, client: Optional[str]):
+        """
+        Initialize the lane.
+        
+        Args:
+            scheduler: Scheduler the job's share comes from.
+            client: Identity of the requesting client.
+        """
+        self.scheduler = scheduler
+        self.client = client
+        self.rate = UNLIMITED
+        self.demand = UNLIMITED
+        self.tokens = 0.0
+        self.updated_at = time.monotonic()
+        self.window_start = self.updated_at
+        self.window_bytes = 0
+        self.throttled = False
+        self.filename: Optional[str] = None
+        self.downloaded = 0
+    
+    def refill(self, now: float) -> None:
+        """
+        Add the tokens earned since the last call, up to the burst size.
+        
+        Args:
+            now: Current ``time.monotonic()``.
+        """
+        if self.rate == UNLIMITED:
+            self.tokens = 0.0
+        else:
+            self.tokens = min(
+                self.rate * self.scheduler.burst,
+                self.tokens + (now - self.updated_at) * self.rate
+            )
+        self.updated_at = now
+    
+    def set_rate(self, rate: float, now: float) -> None:
+        """
+        Change the lane's rate, keeping earned tokens and unpaid debt.
+        
+        Args:
+            rate: New rate in bytes per second.
+            now: Current ``time.monotonic()``.
+        """
+        self.refill(now)
+        self.rate = rate
+        if rate != UNLIMITED:
+            self.tokens = min(self.tokens, rate * self.scheduler.burst)
+    
+    def start(self, params: Dict) -> None:
+        """
+        Apply the job's highest possible rate to a YoutubeDL instance.
+        
+        yt-dlp's own ``ratelimit`` is an average over the whole download,
+        so changing it mid-download would stall or burst; it only receives
+        the fixed ceiling, and the changing fair share is enforced by
+        ``update``.
+        
+        Args:
+            params: ``params`` dict of the job's YoutubeDL instance.
+        """
+        params['ratelimit'] = self.scheduler.ceiling
+    
+    def update(self, data: Dict) -> None:
+        """
+        Handle a yt-dlp progress hook call, sleeping if over the share.
+        
+        Args:
+            data: Progress data from yt-dlp.
+        """
+        if data.get('status') != 'downloading':
+            return
+        filename = data.get('filename')
+        downloaded = data.get('downloaded_bytes') or 0
+        if filename != self.filename:
+            # The first report of a resumed file counts the bytes on disk
+            self.filename = filename
+            self.downloaded = downloaded
+            return
+        if downloaded <= self.downloaded:
+            return
+        wait = self.scheduler.consume(self, downloaded - self.downloaded)
+        self.downloaded = downloaded
+        if wait > 0:
+            time.sleep(wait)
+    
+    def close(self) -> None:
+        """Return the job's share to the scheduler."""
+        self.scheduler.close(self)
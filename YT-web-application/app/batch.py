@@ -0,0 +1,568 @@
+"""
+Batch download module.
+
+This module turns a list of URLs (videos and playlists) into one download job
+per unique video, executed on a dedicated bounded worker pool, and reports the
+progress of the whole batch. With a job store, batches are mirrored to it so
+that every worker process can report them and they survive restarts.
+"""
+
+import time
+import logging
+import threading
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from app.downloader import DownloadProgress
+from app.jobs import Job, JobManager, QueueFullError, new_job_id
+from app.job_store import JobStore
+from app.progress import ProgressRegistry
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem:
+    """A single video of a batch."""
+    
+    __slots__ = ('video_id', 'url', 'title', 'job', 'progress', 'error')
+    
+    def __init__(self, entry: Dict):
+        """
+        Initialize the item from an expanded entry.
+        
+        Args:
+            entry: Dictionary with ``id``, ``url``, ``title`` and optional
+                ``error`` as returned by ``YouTubeDownloader.expand_urls``.
+        """
+        self.video_id: Optional[str] = entry.get('id')
+        self.url: str = entry['url']
+        self.title: Optional[str] = entry.get('title')
+        self.job: Optional[Job] = None
+        self.progress: Optional[DownloadProgress] = None
+        self.error: Optional[str] = entry.get('error')
+    
+    @property
+    def status(self) -> str:
+        """Status of the item's job, or 'failed' if it never got one."""
+        if self.job is None:
+            return Job.FAILED
+        return self.job.status
+    
+    @property
+    def percentage(self) -> float:
+        """Download percentage of the item."""
+        if self.status == Job.FINISHED:
+            return 100.0
+        if self.progress is None:
+            return 0.0
+        return self.progress.percentage
+    
+    def to_dict(self) -> Dict:
+        """
+        Convert item to dictionary for JSON serialization.
+        
+        Returns:
+            Dictionary representation of the item.
+        """
+        job = self.job
+        return {
+            'video_id': self.video_id,
+            'url': self.url,
+            'title': self.title,
+            'job_id': job.id if job else None,
+            'status': self.status,
+            'percentage': round(self.percentage, 2),
+            'filename': job.result.get('filename') if job and job.result else None,
+            'error': job.error if job and job.error else self.error,
+        }
+
+
+class Batch:
+    """A group of downloads submitted together."""
+    
+    EXPANDING = 'expanding'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    
+    def __init__(
+        self,
+        urls: List[str],
+        params: Dict[str, Any],
+        kind: Optional[str] = None,
+        batch_id: Optional[str] = None
+    ):
+        """
+        Initialize a batch.
+        
+        Args:
+            urls: Submitted video and playlist URLs.
+            params: Download parameters shared by all items (e.g. quality).
+            kind: Optional kind of the items' downloads, stored for
+                ``BatchManager.recover``.
+            batch_id: Identifier of a batch being run again.
+        """
+        self.id: str = batch_id or new_job_id()
+        self.urls = urls
+        self.params = params
+        self.kind = kind
+        self.items: List[BatchItem] = []
+        self.expanded = False
+        self.duplicates = 0
+        self.truncated = 0
+        self.error: Optional[str] = None
+        self.created_at: float = time.time()
+        self.expanded_at: Optional[float] = None
+    
+    @property
+    def status(self) -> str:
+        """Aggregate status of the batch."""
+        if self.error is not None:
+            return self.FAILED
+        if not self.expanded:
+            return self.EXPANDING
+        if all(item.status in (Job.FINISHED, Job.FAILED) for item in self.items):
+            return self.FINISHED
+        return self.RUNNING
+    
+    @property
+    def done(self) -> bool:
+        """Whether every item of the batch has reached a terminal state."""
+        return self.status in (self.FINISHED, self.FAILED)
+    
+    @property
+    def finished_at(self) -> Optional[float]:
+        """Time the last item (or the failed expansion) ended, or None if not done."""
+        if not self.done:
+            return None
+        times = [
+            item.job.finished_at for item in self.items
+            if item.job is not None and item.job.finished_at is not None
+        ]
+        return max([self.expanded_at or self.created_at, *times])
+    
+    def to_dict(self) -> Dict:
+        """
+        Convert batch to dictionary for JSON serialization.
+        
+        Returns:
+            Dictionary with aggregate counters and per-item progress.
+        """
+        items = list(self.items)
+        counts = {status: 0 for status in (Job.QUEUED, Job.RUNNING, Job.FINISHED, Job.FAILED)}
+        for item in items:
+            counts[item.status] += 1
+        percentage = sum(item.percentage for item in items) / len(items) if items else 0.0
+        
+        return {
+            'batch_id': self.id,
+            'status': self.status,
+            'params': self.params,
+            'total': len(items),
+            'queued': counts[Job.QUEUED],
+            'running': counts[Job.RUNNING],
+            'finished': counts[Job.FINISHED],
+            'failed': counts[Job.FAILED],
+            'duplicates': self.duplicates,
+            'truncated': self.truncated,
+            'percentage': round(percentage, 2),
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'items': [item.to_dict() for item in items],
+        }
+    
+    def to_record(self) -> Dict:
+        """
+        Convert batch to the fields kept by ``JobStore.save_batch``.
+        
+        Returns:
+            Dictionary with what is needed to run the batch again and a
+            snapshot of its progress.
+        """
+        snapshot = self.to_dict()
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'urls': self.urls,
+            'params': self.params,
+            'status': snapshot['status'],
+            'snapshot': snapshot,
+            'created_at': self.created_at,
+            'finished_at': snapshot['finished_at'],
+        }
+
+
+class StoredBatch:
+    """
+    Read-only view of a batch kept in the store.
+    
+    Used for batches run by another worker process, or by a process that
+    has stopped. Offers the parts of ``Batch`` that readers use.
+    """
+    
+    def __init__(self, record: Dict):
+        """
+        Initialize the view.
+        
+        Args:
+            record: Batch fields as returned by ``JobStore.get_batch``.
+        """
+        self.id: str = record['id']
+        self._snapshot: Dict = record['snapshot']
+    
+    @property
+    def status(self) -> str:
+        """Aggregate status of the batch when it was last stored."""
+        return self._snapshot['status']
+    
+    def to_dict(self) -> Dict:
+        """
+        Get the batch as last stored.
+        
+        Returns:
+            Dictionary in the format of ``Batch.to_dict``.
+        """
+        return self._snapshot
+
+
+class BatchManager:
+    """
+    Run batches on a dedicated worker pool.
+    
+    Batch items use their own ``JobManager`` so that a large batch cannot
+    fill the queue of single downloads, and at most ``workers`` items run
+    at the same time whatever the number of batches.
+    
+    With a store, a background thread writes the state of every changed
+    batch to it every ``sync_interval`` seconds. Batches unknown to this
+    process are looked up there, and ``recover`` runs again the batches of
+    processes that stopped before they finished.
+    """
+    
+    def __init__(
+        self,
+        registry: ProgressRegistry,
+        workers: int = 3,
+        queue_size: int = 1000,
+        max_items: int = 200,
+        retention: float = 3600.0,
+        store: Optional[JobStore] = None,
+        sync_interval: float = 1.0
+    ):
+        """
+        Initialize the batch manager.
+        
+        Args:
+            registry: Progress registry holding the items' progress records.
+            workers: Number of items downloaded concurrently.
+            queue_size: Maximum number of items waiting across all batches.
+            max_items: Maximum number of videos per batch after expansion.
+            retention: Seconds a finished batch stays queryable.
+            store: Optional durable store shared with other worker
+                processes; its lease is renewed by the download
+                ``JobManager`` using it.
+            sync_interval: Seconds between two writes to the store.
+        """
+        self.registry = registry
+        self.max_items = max(1, max_items)
+        self.retention = retention
+        self.store = store
+        self.sync_interval = sync_interval
+        self.jobs = JobManager(workers=workers, queue_size=queue_size, retention=retention)
+        self._batches: Dict[str, Batch] = {}
+        self._stored_done: Set[str] = set()
+        self._lock = threading.Lock()
+        self._resolve: Optional[Callable[[Dict], Optional[Tuple[Callable, Callable]]]] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def submit(
+        self,
+        urls: List[str],
+        expand: Callable[[List[str]], List[Dict]],
+        download: Callable[..., Dict],
+        kind: Optional[str] = None,
+        **params: Any
+    ) -> Batch:
+        """
+        Create a batch and queue its expansion.
+        
+        Expansion runs on the batch pool too, so the request returns
+        immediately; it then queues one job per unique video.
+        
+        Args:
+            urls: Video and playlist URLs.
+            expand: Callable turning the URLs into video entries.
+            download: Download callable invoked per item with ``url``,
+                ``progress`` and ``params``.
+            kind: Optional kind of the items' downloads, stored for
+                ``recover``.
+            **params: Download parameters shared by all items. They must
+                be JSON-serializable when a store is used.
+        
+        Returns:
+            The new batch.
+        
+        Raises:
+            QueueFullError: If the pool queue is at capacity.
+        """
+        batch = Batch(urls, params, kind)
+        self._start(batch, expand, download)
+        logger.info(f"Queued batch {batch.id} with {len(urls)} URLs")
+        return batch
+    
+    def recover(self, resolve: Callable[[Dict], Optional[Tuple[Callable, Callable]]]) -> int:
+        """
+        Run again the batches the store shows as unfinished.
+        
+        Like ``JobManager.recover``, called at startup and then periodically,
+        since a stopped process's batches only show once its lease expires;
+        each batch is taken over by exactly one process. A batch is run
+        again from its URLs under the same id: items that had finished are
+        found in the download cache, and partial downloads are continued.
+        Batches that cannot be rebuilt or do not fit in the queue are
+        marked as failed.
+        
+        Args:
+            resolve: Returns the ``expand`` and ``download`` callables of a
+                stored batch (from its ``kind``), or None if it cannot be
+                run again.
+        
+        Returns:
+            Number of batches requeued.
+        """
+        if self.store is None:
+            return 0
+        self._resolve = resolve
+        if self._thread is None:
+            self._start_sync()
+        
+        requeued = 0
+        for record in self.store.interrupted_batches():
+            if not self.store.claim_batch(record):
+                continue  # Recovered by another worker process
+            batch = Batch(record['urls'], record['params'], record['kind'], record['id'])
+            batch.created_at = record['created_at']
+            funcs = None
+            try:
+                funcs = resolve(record)
+            except Exception as e:
+                logger.error(f"Cannot rebuild batch {batch.id}: {str(e)}")
+            if funcs is None:
+                self._fail(batch, 'Interrupted by a restart')
+                continue
+            try:
+                self._start(batch, *funcs)
+                requeued += 1
+            except QueueFullError:
+                self._fail(batch, 'Interrupted by a restart and the queue is full')
+        
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted batches")
+        return requeued
+    
+    def get(self, batch_id: str) -> Optional[Batch]:
+        """
+        Look up a batch by id, falling back to the store.
+        
+        Args:
+            batch_id: Batch identifier.
+        
+        Returns:
+            The batch (a ``StoredBatch`` if it is not run by this process),
+            or None if unknown or expired.
+        """
+        batch = self._batches.get(batch_id)
+        if batch is None and self.store is not None:
+            record = self.store.get_batch(batch_id)
+            if record is not None:
+                batch = StoredBatch(record)
+        return batch
+    
+    def _start(
+        self,
+        batch: Batch,
+        expand: Callable[[List[str]], List[Dict]],
+        download: Callable[..., Dict]
+    ) -> None:
+        """
+        Register a batch and queue its expansion.
+        
+        Args:
+            batch: New or recovered batch.
+            expand: Callable turning the URLs into video entries.
+            download: Download callable invoked per item.
+        
+        Raises:
+            QueueFullError: If the pool queue is at capacity.
+        """
+        self._prune()
+        with self._lock:
+            self._batches[batch.id] = batch
+        try:
+            self.jobs.submit(partial(self._expand, batch, expand, download))
+        except QueueFullError:
+            with self._lock:
+                self._batches.pop(batch.id, None)
+            raise
+        if self.store is not None:
+            self._save(batch)
+            if self._thread is None:
+                self._start_sync()
+    
+    def _fail(self, batch: Batch, error: str) -> None:
+        """
+        Store a recovered batch as failed without running it.
+        
+        Args:
+            batch: Recovered batch.
+            error: Reason reported to clients.
+        """
+        batch.error = error
+        batch.expanded_at = time.time()
+        self._save(batch)
+        logger.warning(f"Batch {batch.id} failed: {error}")
+    
+    def _save(self, batch: Batch) -> None:
+        """
+        Write a batch's state to the store, logging rather than raising
+        failures so that they never fail the batch itself.
+        
+        Args:
+            batch: Batch to write.
+        """
+        try:
+            self.store.save_batch(batch.to_record())
+        except Exception as e:
+            logger.error(f"Could not store batch {batch.id}: {str(e)}")
+    
+    def _start_sync(self) -> None:
+        """Start the store sync thread once."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._sync_loop,
+                    name='batch-sync',
+                    daemon=True
+                )
+                self._thread.start()
+    
+    def _sync_loop(self) -> None:
+        """Sync loop writing changed batches and picking up orphaned ones."""
+        recover_at = time.monotonic() + self.store.lease / 3
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+                if self._resolve is not None and time.monotonic() >= recover_at:
+                    recover_at = time.monotonic() + self.store.lease / 3
+                    self.recover(self._resolve)
+            except Exception as e:
+                logger.error(f"Batch sync failed: {str(e)}")
+    
+    def sync(self) -> int:
+        """
+        Write every batch not yet stored in its final state to the store.
+        
+        Returns:
+            Number of batches written.
+        """
+        with self._lock:
+            batches = [b for b in self._batches.values() if b.id not in self._stored_done]
+        for batch in batches:
+            # Read before the snapshot, so a batch ending meanwhile is
+            # written again by the next sync
+            done = batch.done
+            self._save(batch)
+            if done:
+                self._stored_done.add(batch.id)
+        return len(batches)
+    
+    def _expand(
+        self,
+        batch: Batch,
+        expand: Callable[[List[str]], List[Dict]],
+        download: Callable[..., Dict]
+    ) -> Dict:
+        """
+        Expand a batch's URLs and queue one job per unique video.
+        
+        Args:
+            batch: Batch to expand.
+            expand: Callable turning the URLs into video entries.
+            download: Download callable invoked per item.
+        
+        Returns:
+            Summary of the expansion.
+        """
+        try:
+            entries = expand(batch.urls)
+        except Exception as e:
+            batch.error = str(e)
+            batch.expanded_at = time.time()
+            raise
+        
+        seen = set()
+        for entry in entries:
+            video_id = entry.get('id')
+            if video_id is not None:
+                if video_id in seen:
+                    batch.duplicates += 1
+                    continue
+                seen.add(video_id)
+            if len(batch.items) >= self.max_items:
+                batch.truncated += 1
+                continue
+            
+            item = BatchItem(entry)
+            if item.error is None:
+                self._queue_item(item, download, batch.params)
+            batch.items.append(item)
+        
+        batch.expanded_at = time.time()
+        batch.expanded = True
+        logger.info(
+            f"Batch {batch.id}: {len(batch.items)} items, "
+            f"{batch.duplicates} duplicates, {batch.truncated} over the limit"
+        )
+        return {'items': len(batch.items)}
+    
+    def _queue_item(
+        self,
+        item: BatchItem,
+        download: Callable[..., Dict],
+        params: Dict[str, Any]
+    ) -> None:
+        """
+        Queue the download job of an item.
+        
+        Args:
+            item: Item to download.
+            download: Download callable.
+            params: Download parameters shared by the batch.
+        """
+        job_id = new_job_id()
+        progress = self.registry.create(job_id)
+        try:
+            item.job = self.jobs.submit(
+                partial(download, progress=progress),
+                job_id=job_id,
+                url=item.url,
+                **params
+            )
+            item.progress = progress
+        except QueueFullError as e:
+            self.registry.discard(job_id)
+            item.error = str(e)
+    
+    def _prune(self) -> None:
+        """Drop batches that finished longer ago than the retention period."""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [
+                batch_id for batch_id, batch in self._batches.items()
+                if batch.done and batch.finished_at < cutoff
+            ]
+            for batch_id in expired:
+                del self._batches[batch_id]
+                self._stored_done.discard(batch_id)
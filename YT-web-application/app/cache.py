@@ -0,0 +1,166 @@
+"""
+Cache module.
+
+This module provides a thread-safe, size-bounded cache with per-entry expiry,
+used to avoid repeating expensive yt-dlp metadata extractions.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Least-recently-used cache whose entries expire after a fixed TTL.
+    
+    When a ``path`` is given, entries are also written to a JSON file so the
+    cache survives restarts. Values must then be JSON-serializable.
+    """
+    
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = 3600.0,
+        path: Optional[str] = None
+    ):
+        """
+        Initialize the cache.
+        
+        Args:
+            maxsize: Maximum number of entries kept.
+            ttl: Seconds an entry stays valid.
+            path: Optional JSON file used for persistence.
+        """
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path:
+            self._load()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached value.
+        
+        Args:
+            key: Cache key.
+        
+        Returns:
+            The cached value, or None on miss or expiry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def peek(self, key: str) -> Optional[Any]:
+        """
+        Get a cached value without counting a lookup or refreshing its rank.
+        
+        Args:
+            key: Cache key.
+        
+        Returns:
+            The cached value, or None if absent or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            return entry[1]
+    
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry if full.
+        
+        Args:
+            key: Cache key.
+            value: Value to cache.
+        """
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            if self.path:
+                self._save()
+    
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            if self.path:
+                self._save()
+    
+    def __len__(self) -> int:
+        """Number of stored entries, including expired ones not yet evicted."""
+        return len(self._entries)
+    
+    def stats(self) -> Dict:
+        """
+        Get cache statistics.
+        
+        Returns:
+            Dictionary with hit/miss counters and size information.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+        }
+    
+    def _load(self) -> None:
+        """Load unexpired entries from the persistence file."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache file {self.path}: {str(e)}")
+            return
+        
+        now = time.time()
+        entries = sorted(
+            (item for item in stored if item[1] > now),
+            key=lambda item: item[1]
+        )
+        for key, expires_at, value in entries[-self.maxsize:]:
+            self._entries[key] = (expires_at, value)
+    
+    def _save(self) -> None:
+        """Atomically write all entries to the persistence file."""
+        data = [
+            [key, expires_at, value]
+            for key, (expires_at, value) in self._entries.items()
+        ]
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Could not persist cache to {self.path}: {str(e)}")
@@ -14,8 +14,36 @@ class Config:
     # Application settings
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     DOWNLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'downloads')
+    # Internal state (job, progress, download index and bandwidth databases,
+    # locks, yt-dlp cache), kept out of the served DOWNLOAD_FOLDER
+    STATE_DIR = os.environ.get(
+        'STATE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance')
+    )
     MAX_CONTENT_LENGTH = 524288000  # 500 MB
     
+    # File delivery for /api/download-file:
+    #   'direct'     - served by Flask with Range/ETag support; the WSGI
+    #                  server's file wrapper (e.g. gunicorn sendfile) is used
+    #   'x-sendfile' - X-Sendfile header for Apache/lighttpd
+    #   'x-accel'    - X-Accel-Redirect header for nginx, which must map
+    #                  X_ACCEL_PREFIX to DOWNLOAD_FOLDER as an internal location
+    FILE_DELIVERY = os.environ.get('FILE_DELIVERY', 'direct')
+    X_ACCEL_PREFIX = os.environ.get('X_ACCEL_PREFIX', '/protected-downloads/')
+    FILE_MAX_AGE = 3600  # seconds clients may cache a downloaded file
+    
+    # Disk quota of DOWNLOAD_FOLDER in bytes (0 = unlimited). Over the quota,
+    # files are evicted least recently ('lru') or least frequently ('lfu')
+    # used first; files modified within the grace period are kept.
+    STORAGE_QUOTA = int(os.environ.get('STORAGE_QUOTA', 0))
+    STORAGE_POLICY = os.environ.get('STORAGE_POLICY', 'lru')
+    STORAGE_GRACE_PERIOD = 600  # seconds
+    STORAGE_SWEEP_INTERVAL = 60  # seconds
+    
+    # Streaming of files that are still downloading (/api/stream/<job_id>)
+    STREAM_CHUNK_SIZE = 64 * 1024  # bytes
+    STREAM_START_TIMEOUT = 30  # seconds to wait for the first bytes
+    STREAM_IDLE_TIMEOUT = 60  # seconds without new data before giving up
+    
     # yt-dlp settings
     AUDIO_QUALITIES: List[Dict[str, str]] = [
         {'value': '64', 'label': '64 kbps'},
@@ -25,6 +53,14 @@ class Config:
         {'value': '320', 'label': '320 kbps (Best)'},
     ]
     
+    # Audio output formats; all but MP3 can usually be copied without re-encoding
+    AUDIO_FORMATS: List[Dict[str, str]] = [
+        {'value': 'mp3', 'label': 'MP3'},
+        {'value': 'm4a', 'label': 'M4A (AAC, no re-encode)'},
+        {'value': 'opus', 'label': 'Opus (no re-encode)'},
+        {'value': 'best', 'label': 'Original'},
+    ]
+    
     VIDEO_QUALITIES: List[Dict[str, str]] = [
         {'value': '144', 'label': '144p'},
         {'value': '240', 'label': '240p'},
@@ -35,8 +71,99 @@ class Config:
         {'value': 'best', 'label': 'Best Available'},
     ]
     
+    # Video metadata cache
+    INFO_CACHE_SIZE = int(os.environ.get('INFO_CACHE_SIZE', 512))
+    INFO_CACHE_TTL = int(os.environ.get('INFO_CACHE_TTL', 3600))  # seconds
+    INFO_CACHE_PATH = os.environ.get('INFO_CACHE_PATH')  # optional JSON file
+    
+    # Full extraction results reused by the following download. Format URLs
+    # expire after a few hours, so keep this short.
+    EXTRACTION_CACHE_SIZE = 64
+    EXTRACTION_CACHE_TTL = 600  # seconds
+    
+    # When to import yt-dlp and build the downloader:
+    #   'lazy'       - on the first request that needs it
+    #   'background' - in a background thread right after startup
+    #   'eager'      - inside create_app(), before serving
+    YTDLP_WARMUP = os.environ.get('YTDLP_WARMUP', 'background')
+    
+    # Parallel fragment downloads of segmented (DASH/HLS) formats. Off by
+    # default: those formats are skipped because they fail with HTTP 403 for
+    # some player clients (see BUGFIX_403_FORBIDDEN.md).
+    FRAGMENT_DOWNLOADS = os.environ.get('FRAGMENT_DOWNLOADS', 'false').lower() == 'true'
+    FRAGMENT_MAX_TOTAL = int(os.environ.get('FRAGMENT_MAX_TOTAL', 16))  # across all jobs
+    FRAGMENT_MAX_PER_JOB = int(os.environ.get('FRAGMENT_MAX_PER_JOB', 8))
+    FRAGMENT_INITIAL = 4  # per-job level before throughput has been measured
+    
+    # Processes encoding audio from a shared local copy of each video's best
+    # audio. 0 downloads and encodes every bitrate separately instead.
+    AUDIO_TRANSCODE_WORKERS = int(os.environ.get('AUDIO_TRANSCODE_WORKERS', 2))
+    
+    # Download rate limits in bytes per second (0 = unlimited): in total, and
+    # per client address. Running downloads share them fairly.
+    BANDWIDTH_LIMIT = int(os.environ.get('BANDWIDTH_LIMIT', 0))
+    BANDWIDTH_CLIENT_LIMIT = int(os.environ.get('BANDWIDTH_CLIENT_LIMIT', 0))
+    
+    # Reusable YoutubeDL instances kept idle per option profile
+    YDL_POOL_SIZE = int(os.environ.get('YDL_POOL_SIZE', 2))
+    
+    # yt-dlp cache of player data (signature and n-parameter functions),
+    # shared by all processes and pruned to YDL_CACHE_MAX_MB. Defaults to
+    # STATE_DIR/ydl-cache. If YDL_CACHE_WARM_URL is set, one extraction of it
+    # at background or eager startup fills the cache (off by default, since
+    # it contacts YouTube on every start).
+    YDL_CACHE = os.environ.get('YDL_CACHE', 'true').lower() == 'true'
+    YDL_CACHE_DIR = os.environ.get('YDL_CACHE_DIR')
+    YDL_CACHE_MAX_MB = int(os.environ.get('YDL_CACHE_MAX_MB', 50))
+    YDL_CACHE_WARM_URL = os.environ.get('YDL_CACHE_WARM_URL', '')
+    
+    # Run yt-dlp in this many worker processes instead of the web process's
+    # threads (0). Each worker is replaced after WORKER_MAX_JOBS jobs or once
+    # it uses more than WORKER_MAX_RSS_MB of memory (0 disables either limit).
+    DOWNLOAD_PROCESSES = int(os.environ.get('DOWNLOAD_PROCESSES', 0))
+    WORKER_MAX_JOBS = int(os.environ.get('WORKER_MAX_JOBS', 100))
+    WORKER_MAX_RSS_MB = int(os.environ.get('WORKER_MAX_RSS_MB', 512))
+    
     # Progress tracking
     PROGRESS_UPDATE_INTERVAL = 1  # seconds
+    PROGRESS_TTL = 300  # seconds a finished job's progress stays readable
+    PROGRESS_STREAM_INTERVAL = 0.5  # minimum seconds between SSE messages
+    PROGRESS_STREAM_KEEPALIVE = 15  # seconds of silence before an SSE keepalive
+    PROGRESS_LOG_INTERVAL = 5  # minimum seconds between progress log lines
+    
+    # Mirror progress to SQLite (STATE_DIR/.progress.sqlite3) so that every
+    # worker process, e.g. under ``gunicorn -w N``, can report every job
+    PROGRESS_STORE = os.environ.get('PROGRESS_STORE', 'true').lower() == 'true'
+    PROGRESS_SYNC_INTERVAL = 0.5  # seconds between writes to the store
+    
+    # Background jobs
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 50))
+    JOB_RETENTION = 3600  # seconds a finished job stays queryable
+    
+    # Run short downloads first ('sjf'), in audio and video lanes sharing the
+    # workers, or in arrival order ('fifo'). A waiting job's estimated cost
+    # (seconds of media, weighted by type and quality) drops by JOB_AGING
+    # per second so long jobs are not postponed forever.
+    JOB_SCHEDULING = os.environ.get('JOB_SCHEDULING', 'sjf').lower()
+    JOB_AGING = float(os.environ.get('JOB_AGING', 300))
+    
+    # Durable job records (SQLite) so jobs survive restarts and interrupted
+    # downloads are resumed. Defaults to STATE_DIR/.jobs.sqlite3. A worker
+    # process that has not renewed its lease for JOB_LEASE seconds is
+    # considered gone and its unfinished jobs are taken over.
+    JOB_STORE = os.environ.get('JOB_STORE', 'true').lower() == 'true'
+    JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH')
+    JOB_LEASE = float(os.environ.get('JOB_LEASE', 30))
+    # Starts after which an interrupted job is failed instead of resumed,
+    # e.g. one that crashes its process every time (0 = no limit)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    
+    # Batch and playlist downloads, run on their own worker pool
+    BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 3))
+    BATCH_QUEUE_SIZE = int(os.environ.get('BATCH_QUEUE_SIZE', 1000))
+    BATCH_MAX_URLS = 500  # URLs accepted per request
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 200))  # videos per batch
 
 
 class DevelopmentConfig(Config):
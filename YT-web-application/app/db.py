@@ -0,0 +1,39 @@
+"""
+SQLite helper module.
+
+This module opens the SQLite databases that hold state shared by all worker
+processes of the application (jobs, progress, download index).
+"""
+
+import sqlite3
+
+
+def connect(path: str, schema: str) -> sqlite3.Connection:
+    """
+    Open a database in WAL mode and create its schema.
+    
+    WAL lets one process write while others read, and ``synchronous=NORMAL``
+    keeps committed transactions across a crash of the process without a
+    full sync per write. The connection is in autocommit mode and may be
+    used from several threads, so callers serialize access with a lock and
+    wrap multi-statement writes in ``BEGIN``.
+    
+    Args:
+        path: Database file.
+        schema: SQL script creating the tables if they do not exist.
+    
+    Returns:
+        The connection, returning rows as ``sqlite3.Row``.
+    """
+    conn = sqlite3.connect(
+        path,
+        timeout=30.0,  # Wait for other processes' write transactions
+        check_same_thread=False,
+        isolation_level=None
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(schema)
+    return conn
+
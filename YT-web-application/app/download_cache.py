@@ -0,0 +1,255 @@
+"""
+Download cache module.
+
+This module keeps an index of finished downloads so that repeated requests for
+the same video, type and quality are served from disk instead of being
+downloaded and converted again. The index lives in SQLite so that all worker
+processes share it.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+from pathlib import Path
+from app.db import connect
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process, nothing to lock against
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+# (video id, download type, quality, output format)
+CacheKey = Tuple[str, str, str, str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    title TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    filename TEXT NOT NULL
+);
+"""
+
+
+class DownloadCache:
+    """
+    Index of finished files in the download folder.
+    
+    Each entry maps a cache key to the canonical file produced for it.
+    User-supplied filenames are served as aliases of the canonical file:
+    a hardlink where the file system supports it, otherwise a name mapping
+    recorded in the index. Names starting with a dot are internal (temporary
+    files, or the index itself in older layouts) and are never served.
+    """
+    
+    INDEX_FILENAME = '.download_index.sqlite3'
+    LEGACY_INDEX_FILENAME = '.download_index.json'
+    LOCK_DIRNAME = '.locks'
+    
+    def __init__(self, download_folder: str, state_dir: Optional[str] = None):
+        """
+        Initialize the cache and open its index.
+        
+        Args:
+            download_folder: Folder holding the downloaded files.
+            state_dir: Folder holding the index and the lock files, outside
+                the served folder; defaults to ``download_folder``.
+        """
+        self.download_folder = Path(download_folder)
+        self.state_dir = Path(state_dir) if state_dir else self.download_folder
+        self.index_path = self.state_dir / self.INDEX_FILENAME
+        self._conn = connect(str(self.index_path), SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._import_legacy()
+    
+    @staticmethod
+    def _key(key: CacheKey) -> str:
+        """Serialize a cache key for the index."""
+        return '|'.join(key)
+    
+    def lookup(self, key: CacheKey, count: bool = True) -> Optional[Dict]:
+        """
+        Find the finished file for a cache key.
+        
+        Args:
+            key: Cache key.
+            count: Whether the lookup counts towards the hit/miss
+                statistics; re-checks of a key already counted should not.
+        
+        Returns:
+            Entry dictionary with ``filename`` and ``title``, or None if not
+            cached or if the file has been removed from disk.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT filename, title, created_at FROM entries WHERE key = ?',
+                (self._key(key),)
+            ).fetchone()
+            if row is not None and not (self.download_folder / row['filename']).is_file():
+                self._conn.execute('DELETE FROM entries WHERE key = ?', (self._key(key),))
+                row = None
+            if count:
+                if row is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return dict(row) if row is not None else None
+    
+    def store(self, key: CacheKey, path: str, title: str) -> None:
+        """
+        Record a finished file.
+        
+        Args:
+            key: Cache key.
+            path: Path of the finished file inside the download folder.
+            title: Video title reported back to clients.
+        """
+        filename = os.path.basename(path)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (key, filename, title, created_at) '
+                'VALUES (?, ?, ?, ?)',
+                (self._key(key), filename, title, time.time())
+            )
+    
+    @contextmanager
+    def locked(self, key: CacheKey) -> Iterator[None]:
+        """
+        Hold an exclusive, cross-process lock on a cache key.
+        
+        Identical downloads within a process are coalesced by the caller;
+        this lock keeps two worker processes from writing the same files.
+        A process that waited should ``lookup`` the key again.
+        
+        Args:
+            key: Cache key.
+        """
+        if fcntl is None:
+            yield
+            return
+        
+        lock_dir = self.state_dir / self.LOCK_DIRNAME
+        lock_dir.mkdir(exist_ok=True)
+        name = hashlib.sha1(self._key(key).encode('utf-8')).hexdigest()
+        with open(lock_dir / f'{name}.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def alias(self, filename: str, alias: str) -> str:
+        """
+        Expose a cached file under another name without copying it.
+        
+        Args:
+            filename: Canonical filename in the download folder.
+            alias: Requested filename.
+        
+        Returns:
+            The alias filename.
+        """
+        if alias == filename:
+            return alias
+        
+        source = self.download_folder / filename
+        target = self.download_folder / alias
+        tmp_target = self.download_folder / f".{alias}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(source, tmp_target)
+            os.replace(tmp_target, target)
+        except OSError as e:
+            tmp_target.unlink(missing_ok=True)
+            logger.info(f"Hardlink unavailable for {alias}, using name mapping: {str(e)}")
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO aliases (alias, filename) VALUES (?, ?)',
+                    (alias, filename)
+                )
+        return alias
+    
+    def resolve(self, filename: str) -> Optional[Path]:
+        """
+        Resolve a requested filename to a file on disk.
+        
+        Args:
+            filename: Requested filename.
+        
+        Returns:
+            Path of the file to serve, or None if it does not exist or is
+            internal (a dotfile or a name outside the folder).
+        """
+        if not filename or filename.startswith('.') or os.path.basename(filename) != filename:
+            return None
+        path = self.download_folder / filename
+        if path.is_file():
+            return path
+        
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT filename FROM aliases WHERE alias = ?', (filename,)
+            ).fetchone()
+        if row is not None and (self.download_folder / row['filename']).is_file():
+            return self.download_folder / row['filename']
+        return None
+    
+    def stats(self) -> Dict:
+        """
+        Get cache statistics.
+        
+        Returns:
+            Dictionary with this process's hit/miss counters and the number
+            of entries.
+        """
+        lookups = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'size': size,
+        }
+    
+    def _import_legacy(self) -> None:
+        """Move entries of a JSON index written by older versions into SQLite."""
+        legacy_path = self.download_folder / self.LEGACY_INDEX_FILENAME
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable download index: {str(e)}")
+            return
+        
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN')
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO entries (key, filename, title, created_at) '
+                'VALUES (?, ?, ?, ?)',
+                [
+                    (key, entry['filename'], entry.get('title'), entry.get('created_at', time.time()))
+                    for key, entry in data.get('entries', {}).items()
+                ]
+            )
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO aliases (alias, filename) VALUES (?, ?)',
+                list(data.get('aliases', {}).items())
+            )
+        legacy_path.unlink(missing_ok=True)
+        logger.info(f"Imported {len(data.get('entries', {}))} entries from {legacy_path.name}")
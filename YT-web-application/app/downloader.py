@@ -6,20 +6,110 @@ using yt-dlp with progress tracking and error handling.
 """
 
 import os
+import copy
+import time
+import uuid
 import logging
-from typing import Dict, Optional, Callable
+import threading
+from functools import partial
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Callable, Tuple
 from pathlib import Path
-import yt_dlp
+from app.bandwidth import BandwidthScheduler
+from app.cache import TTLCache
+from app.download_cache import CacheKey, DownloadCache
+from app.events import ProgressEvent, ProgressEvents
+from app.fragments import FragmentSession, FragmentTuner
+from app.metrics import PHASE_SECONDS, DownloadMeter
+from app.singleflight import SingleFlight
+from app.storage import PIN_DIRNAME, pin_file
+from app.transcode import (
+    AUDIO_FORMATS, NONE, AudioTranscoder,
+    plan_audio, plan_video, run_audio_plan, run_video_plan,
+)
+from app.ydl_pool import YDLPool, load_yt_dlp
+from app.utils import extract_playlist_id, extract_video_id, sanitize_filename
+from app.ydl_cache import YDLCache
 
 
 logger = logging.getLogger(__name__)
 
+# Info dict fields that are large and never needed to start a download
+HEAVY_INFO_FIELDS = (
+    'thumbnails', 'subtitles', 'automatic_captions', 'heatmap', 'chapters',
+    'description', 'tags', 'categories',
+)
+
+# Pseudo output format of downloads written as-is for streaming
+STREAM_EXT = 'stream'
+
+# Output format of each download type when none is requested
+DEFAULT_EXT = {'video': 'mp4', 'audio': 'mp3'}
+
+# Cache key quality and format of the untouched best audio of a video
+SOURCE_QUALITY = 'best'
+SOURCE_EXT = 'source'
+
+# Time range (start, end) of a video in seconds; end is infinite for "to the end"
+Clip = Tuple[float, float]
+
+
+def make_clip(start: Optional[float], end: Optional[float]) -> Optional[Clip]:
+    """
+    Validate a requested time range.
+    
+    Args:
+        start: Start in seconds, or None for the beginning.
+        end: End in seconds, or None for the end of the video.
+    
+    Returns:
+        The range, or None if it covers the whole video.
+    
+    Raises:
+        ValueError: If the range is negative or empty.
+    """
+    if start is None and end is None:
+        return None
+    start = float(start or 0)
+    end = float('inf') if end is None else float(end)
+    if start < 0 or end <= start:
+        raise ValueError(f"Invalid time range: {start:g}-{end:g}")
+    if start == 0 and end == float('inf'):
+        return None
+    return start, end
+
+
+def clip_tag(clip: Clip) -> str:
+    """
+    Get the name of a time range used in cache keys and file names.
+    
+    Args:
+        clip: Time range.
+    
+    Returns:
+        E.g. 'clip30-90', or 'clip30-end' for a range to the end.
+    """
+    start, end = clip
+    return f"clip{start:g}-{'end' if end == float('inf') else f'{end:g}'}"
+
 
 class DownloadProgress:
     """Track download progress for real-time updates."""
     
-    def __init__(self):
-        """Initialize progress tracker."""
+    __slots__ = (
+        'job_id', 'status', 'percentage', 'speed', 'eta', 'downloaded', 'total',
+        'filename', 'error', 'closed_at', 'version', 'followers'
+    )
+    
+    def __init__(self, job_id: Optional[str] = None):
+        """
+        Initialize progress tracker.
+        
+        Args:
+            job_id: Identifier of the job, which keys the download's progress
+                events. Downloads run outside a job get a random one.
+        """
+        self.job_id: str = job_id or uuid.uuid4().hex
         self.status: str = 'idle'
         self.percentage: float = 0.0
         self.speed: str = 'N/A'
@@ -28,6 +118,9 @@ class DownloadProgress:
         self.total: str = '0 MB'
         self.filename: str = ''
         self.error: Optional[str] = None
+        self.closed_at: Optional[float] = None
+        self.version: int = 0
+        self.followers: Optional[List['DownloadProgress']] = None
     
     def update(self, data: Dict) -> None:
         """
@@ -67,6 +160,35 @@ class DownloadProgress:
         elif self.status == 'finished':
             self.percentage = 100.0
             self.filename = data.get('filename', '')
+        
+        # Bumped last so readers never see a new version with stale fields
+        self.version += 1
+        
+        if self.followers:
+            for follower in self.followers:
+                follower.update(data)
+    
+    def attach(self, follower: 'DownloadProgress') -> None:
+        """
+        Mirror this download's progress into another record.
+        
+        Used when a request joins an identical download that is already
+        running, so its client sees the shared download's progress.
+        
+        Args:
+            follower: Progress record of the joining request.
+        """
+        if self.followers is None:
+            self.followers = []
+        self.followers.append(follower)
+        for name in ('status', 'percentage', 'speed', 'eta', 'downloaded', 'total', 'filename'):
+            setattr(follower, name, getattr(self, name))
+        follower.version += 1
+    
+    def close(self) -> None:
+        """Mark the download as over so the record can expire."""
+        self.closed_at = time.time()
+        self.version += 1
     
     def to_dict(self) -> Dict:
         """
@@ -90,26 +212,90 @@ class DownloadProgress:
 class YouTubeDownloader:
     """Service class for downloading YouTube videos and audio."""
     
-    def __init__(self, download_folder: str):
+    def __init__(
+        self, 
+        download_folder: str,
+        info_cache: Optional[TTLCache] = None,
+        extraction_cache: Optional[TTLCache] = None,
+        download_cache: Optional[DownloadCache] = None,
+        ydl_pool: Optional[YDLPool] = None,
+        fragment_tuner: Optional[FragmentTuner] = None,
+        events: Optional[ProgressEvents] = None,
+        log_interval: float = 5.0,
+        transcoder: Optional[AudioTranscoder] = None,
+        bandwidth: Optional[BandwidthScheduler] = None,
+        ydl_cache: Optional[YDLCache] = None
+    ):
         """
         Initialize the YouTube downloader service.
         
         Args:
             download_folder: Path to the folder where downloads will be saved.
+            info_cache: Optional cache for video metadata, keyed by video id.
+            extraction_cache: Optional short-lived cache of full extraction
+                results (including formats) so a download can start from the
+                info retrieved by ``get_video_info``.
+            download_cache: Optional index of finished files used to serve
+                repeated downloads without fetching them again.
+            ydl_pool: Optional pool of reusable YoutubeDL instances. A
+                private pool is created if omitted.
+            fragment_tuner: Optional shared tuner enabling parallel
+                fragment downloads. Segmented (DASH/HLS) formats are only
+                selected when one is given.
+            events: Optional progress event pipeline to publish to. A
+                private one is created if omitted.
+            log_interval: Minimum seconds between progress log lines.
+            transcoder: Optional process pool for audio encodes. With one
+                (and a download cache), the best audio of a video is
+                downloaded once and kept, and every bitrate and format is
+                encoded from that local copy.
+            bandwidth: Optional scheduler dividing a download rate limit
+                between the running downloads.
+            ydl_cache: Optional managed yt-dlp cache directory for player
+                data, shared with other processes. yt-dlp's default
+                directory is used if omitted.
         """
         self.download_folder = Path(download_folder)
         self.download_folder.mkdir(parents=True, exist_ok=True)
         self.progress = DownloadProgress()
+        self.info_cache = info_cache
+        self.extraction_cache = extraction_cache
+        self.download_cache = download_cache
+        self.flights = SingleFlight()
+        self.ydl_pool = ydl_pool or YDLPool()
+        self.fragment_tuner = fragment_tuner
+        self.events = events or ProgressEvents()
+        self.events.subscribe(self._log_progress, interval=log_interval)
+        self.transcoder = transcoder
+        self.bandwidth = bandwidth
+        self.ydl_cache = ydl_cache
+        # Client of the download running in the calling thread
+        self._job = threading.local()
     
-    def _progress_hook(self, data: Dict) -> None:
+    def _progress_hook(self, progress: DownloadProgress, data: Dict) -> None:
         """
         Hook function called by yt-dlp during download.
         
         Args:
+            progress: Progress record of the running download.
             data: Progress data from yt-dlp.
         """
-        self.progress.update(data)
-        logger.info(f"Download progress: {self.progress.percentage:.2f}%")
+        progress.update(data)
+        self.events.publish(ProgressEvent.from_hook(progress.job_id, data))
+    
+    @staticmethod
+    def _log_progress(events: List[ProgressEvent]) -> None:
+        """
+        Log the latest progress of each download (events subscriber).
+        
+        Args:
+            events: Latest event of each download since the last call.
+        """
+        for event in events:
+            logger.info(
+                f"Download progress {os.path.basename(event.filename)}: "
+                f"{event.percentage:.2f}%"
+            )
     
     def _get_base_ydl_opts(self) -> Dict:
         """
@@ -118,14 +304,20 @@ class YouTubeDownloader:
         Returns:
             Dictionary with base yt-dlp options.
         """
+        youtube_args = {'player_client': ['android', 'web']}
+        if self.fragment_tuner is None:
+            # Segmented formats can fail with HTTP 403 and are slow one
+            # fragment at a time; skip them unless explicitly enabled
+            youtube_args['skip'] = ['hls', 'dash']
+        cache_args = {'cachedir': self.ydl_cache.path} if self.ydl_cache else {}
+        
         return {
+            **cache_args,
             'noplaylist': True,  # Don't download playlists, only single videos
+            'continuedl': True,  # Resume from .part files, e.g. after a restart
             'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'extractor_args': {
-                'youtube': {
-                    'player_client': ['android', 'web'],
-                    'skip': ['hls', 'dash'],  # Skip problematic formats
-                }
+                'youtube': youtube_args
             },
             'http_headers': {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -135,29 +327,264 @@ class YouTubeDownloader:
             },
         }
     
+    def _info_opts(self) -> Dict:
+        """
+        Get yt-dlp options for metadata extraction.
+        
+        Returns:
+            Dictionary with yt-dlp options of the 'info' profile.
+        """
+        return {
+            **self._get_base_ydl_opts(),
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': False,
+        }
+    
+    def _playlist_opts(self) -> Dict:
+        """
+        Get yt-dlp options for flat playlist expansion.
+        
+        Returns:
+            Dictionary with yt-dlp options of the 'playlist' profile.
+        """
+        return {
+            **self._get_base_ydl_opts(),
+            'quiet': True,
+            'no_warnings': True,
+            'noplaylist': False,
+            'extract_flat': 'in_playlist',  # List entries without resolving each video
+        }
+    
+    def _video_opts(self, quality: str) -> Dict:
+        """
+        Get yt-dlp options for video downloads of a given quality.
+        
+        No post-processor is configured: the transcode planner decides
+        after the download whether the file needs one.
+        
+        Args:
+            quality: Video quality (e.g., '720', '1080', 'best').
+        
+        Returns:
+            Dictionary with yt-dlp options of the 'video-<quality>' profile.
+        """
+        # Determine format string
+        if quality == 'best':
+            format_str = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+        else:
+            format_str = f'bestvideo[height<={quality}][ext=mp4]+bestaudio[ext=m4a]/best[height<={quality}][ext=mp4]/best'
+        
+        return {
+            **self._get_base_ydl_opts(),
+            'format': format_str,
+            'merge_output_format': 'mp4',
+        }
+    
+    def _audio_opts(self) -> Dict:
+        """
+        Get yt-dlp options for audio downloads.
+        
+        The source is downloaded as-is; conversion to the requested format
+        and bitrate is planned afterwards, so one profile serves them all.
+        
+        Returns:
+            Dictionary with yt-dlp options of the 'audio' profile.
+        """
+        return {
+            **self._get_base_ydl_opts(),
+            'format': 'bestaudio/best',
+        }
+    
+    def _stream_opts(self, download_type: str, quality: str) -> Dict:
+        """
+        Get yt-dlp options for downloads streamed while they are written.
+        
+        Only single-file (progressive) formats are selected and no
+        post-processing is done, and ``nopart`` makes yt-dlp write to the
+        final filename, so the bytes on disk can be sent as they arrive.
+        
+        Args:
+            download_type: 'video' or 'audio'.
+            quality: Video height, or 'best'. Ignored for audio.
+        
+        Returns:
+            Dictionary with yt-dlp options of the 'stream-<type>-<quality>' profile.
+        """
+        if download_type == 'audio':
+            format_str = 'bestaudio[ext=m4a]/bestaudio'
+        elif quality == 'best':
+            format_str = 'best[ext=mp4][acodec!=none][vcodec!=none]/best'
+        else:
+            format_str = f'best[height<={quality}][ext=mp4][acodec!=none][vcodec!=none]/best[height<={quality}]/best'
+        
+        return {
+            **self._get_base_ydl_opts(),
+            'format': format_str,
+            'nopart': True,
+        }
+    
+    @contextmanager
+    def _lease(
+        self, 
+        profile: str, 
+        opts: Dict, 
+        output_template: str, 
+        progress: DownloadProgress,
+        clip: Optional[Clip] = None
+    ) -> Iterator['yt_dlp.YoutubeDL']:
+        """
+        Borrow a YoutubeDL instance set up for one download.
+        
+        The instance reports to the job's progress record and to a
+        ``DownloadMeter`` for metrics. With a fragment tuner, the job's
+        fragment concurrency is applied to the instance and re-tuned after
+        each format it downloads. With a bandwidth scheduler, the job is
+        held to its share of the rate limit. With a clip, only that time
+        range of the video is fetched.
+        
+        Args:
+            profile: Pool profile name.
+            opts: yt-dlp options of the profile.
+            output_template: yt-dlp output template.
+            progress: Progress record updated by the download.
+            clip: Optional time range to download.
+        
+        Yields:
+            A configured YoutubeDL instance.
+        """
+        session = FragmentSession(self.fragment_tuner) if self.fragment_tuner else None
+        lane = self.bandwidth.open(getattr(self._job, 'client', None)) if self.bandwidth else None
+        meter = DownloadMeter(profile.split('-')[0])
+        
+        # These consumers stay in the download thread rather than subscribing
+        # to self.events: the fragment session and bandwidth lane throttle
+        # the download itself, the meter times every callback and counts
+        # every byte, which coalesced events would lose, and the progress
+        # record is read live by the progress stream. Each is a few field
+        # updates without I/O.
+        def hook(data: Dict) -> None:
+            if session is not None:
+                session.update(data)
+            meter.progress(data)
+            self._progress_hook(progress, data)
+            if lane is not None:
+                # Last: may sleep to hold the job to its share
+                lane.update(data)
+        
+        try:
+            with self.ydl_pool.lease(
+                profile,
+                opts,
+                outtmpl=output_template,
+                progress_hook=hook,
+                postprocessor_hook=meter.postprocessor
+            ) as ydl:
+                if lane is not None:
+                    lane.start(ydl.params)
+                # Set on every lease, since pooled instances serve many jobs
+                if clip is not None:
+                    ydl.params['download_ranges'] = load_yt_dlp().utils.download_range_func(None, [clip])
+                else:
+                    ydl.params.pop('download_ranges', None)
+                if session is None:
+                    yield ydl
+                    return
+                session.start(ydl.params)
+                try:
+                    yield ydl
+                finally:
+                    session.close()
+        finally:
+            meter.close()
+            if lane is not None:
+                lane.close()
+    
+    def warm_pool(self, video_quality: str = 'best') -> None:
+        """
+        Pre-build YoutubeDL instances for the most common profiles.
+        
+        Args:
+            video_quality: Video quality whose profile is warmed.
+        """
+        self.ydl_pool.warm('info', self._info_opts())
+        self.ydl_pool.warm(f'video-{video_quality}', self._video_opts(video_quality))
+        self.ydl_pool.warm('audio', self._audio_opts())
+    
+    @staticmethod
+    def _cache_key(url: str) -> str:
+        """
+        Get the cache key of a URL.
+        
+        Args:
+            url: YouTube video URL.
+        
+        Returns:
+            The video id, so that every URL form of a video shares one key,
+            or the URL itself if no id can be extracted.
+        """
+        return extract_video_id(url) or url
+    
     def get_video_info(self, url: str) -> Dict:
         """
         Retrieve video information without downloading.
         
+        Results are served from the metadata cache when one is configured.
+        
         Args:
             url: YouTube video URL.
-            
+        
         Returns:
             Dictionary containing video metadata.
-            
+        
         Raises:
             Exception: If video info cannot be retrieved.
         """
-        ydl_opts = {
-            **self._get_base_ydl_opts(),
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-        }
+        if self.info_cache is None:
+            return self._extract_video_info(url)
+        
+        key = self._cache_key(url)
+        info = self.info_cache.get(key)
+        if info is None:
+            info = self._extract_video_info(url)
+            self.info_cache.set(key, info)
+        return info
+    
+    def cached_video_info(self, url: str) -> Optional[Dict]:
+        """
+        Get video information only if it is already cached.
+        
+        Does not count as a cache lookup, so it can be used for estimates
+        without skewing the cache statistics.
         
+        Args:
+            url: YouTube video URL.
+        
+        Returns:
+            Cached video metadata, or None.
+        """
+        if self.info_cache is None:
+            return None
+        return self.info_cache.peek(self._cache_key(url))
+    
+    def _extract_video_info(self, url: str) -> Dict:
+        """
+        Extract video information with yt-dlp.
+        
+        Args:
+            url: YouTube video URL.
+        
+        Returns:
+            Dictionary containing video metadata.
+        
+        Raises:
+            Exception: If video info cannot be retrieved.
+        """
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
+            with self.ydl_pool.lease('info', self._info_opts()) as ydl, \
+                    PHASE_SECONDS.time(('info', 'info')):
+                info = self._extract(ydl, url, download=False)
+                self._remember_extraction(url, ydl.sanitize_info(info, True))
                 
                 return {
                     'title': info.get('title', 'Unknown'),
@@ -172,118 +599,819 @@ class YouTubeDownloader:
             logger.error(f"Error retrieving video info: {str(e)}")
             raise Exception(f"Failed to retrieve video information: {str(e)}")
     
+    def _extract(self, ydl: 'yt_dlp.YoutubeDL', url: str, download: bool) -> Dict:
+        """
+        Run a yt-dlp extraction, counted as warm or cold by the cache directory.
+        
+        Args:
+            ydl: Configured YoutubeDL instance.
+            url: YouTube video URL.
+            download: Whether to download the video too.
+        
+        Returns:
+            Info dict of the video.
+        """
+        if self.ydl_cache is None:
+            return ydl.extract_info(url, download=download)
+        with self.ydl_cache.track(ydl):
+            return ydl.extract_info(url, download=download)
+    
+    def warm_ydl_cache(self, url: str) -> None:
+        """
+        Prune the yt-dlp cache directory and fill it with current player data.
+        
+        Extracts one video so the player JavaScript is fetched and its
+        functions stored before the first request needs them. Other
+        processes then find them on disk.
+        
+        Args:
+            url: URL of any available video.
+        """
+        if self.ydl_cache is None:
+            return
+        self.ydl_cache.prune()
+        try:
+            self._extract_video_info(url)
+            logger.info(f"yt-dlp cache warmed: {self.ydl_cache.stats()['files']} files")
+        except Exception as e:
+            logger.warning(f"yt-dlp cache warm-up failed: {str(e)}")
+    
+    def expand_urls(self, urls: List[str]) -> List[Dict]:
+        """
+        Expand video and playlist URLs into a list of videos.
+        
+        Plain video URLs are taken as they are; other URLs (playlists,
+        channels) are listed with a single flat extraction each, which
+        fetches the playlist pages but none of the videos.
+        
+        Args:
+            urls: YouTube video or playlist URLs.
+        
+        Returns:
+            List of dictionaries with ``id``, ``url`` and ``title``, in
+            submission order. URLs that could not be expanded yield an entry
+            with an ``error`` and no ``id``.
+        """
+        entries = []
+        for url in urls:
+            video_id = extract_video_id(url)
+            if video_id and not extract_playlist_id(url):
+                entries.append({'id': video_id, 'url': url, 'title': None})
+                continue
+            
+            try:
+                with self.ydl_pool.lease('playlist', self._playlist_opts()) as ydl:
+                    info = ydl.extract_info(url, download=False)
+            except Exception as e:
+                logger.error(f"Error expanding {url}: {str(e)}")
+                entries.append({'id': None, 'url': url, 'title': None, 'error': str(e)})
+                continue
+            
+            if info.get('_type') not in ('playlist', 'multi_video'):
+                entries.append({
+                    'id': info.get('id'),
+                    'url': info.get('webpage_url') or url,
+                    'title': info.get('title'),
+                })
+                continue
+            
+            for entry in info.get('entries') or []:
+                if not entry or not entry.get('id'):
+                    continue
+                entries.append({
+                    'id': entry['id'],
+                    'url': entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}",
+                    'title': entry.get('title'),
+                })
+        return entries
+    
+    def _remember_extraction(self, url: str, info: Dict) -> None:
+        """
+        Keep a slimmed extraction result for a following download.
+        
+        Args:
+            url: YouTube video URL.
+            info: Sanitized info dict returned by yt-dlp.
+        """
+        if self.extraction_cache is None or info.get('_type', 'video') != 'video':
+            return
+        
+        slim = {k: v for k, v in info.items() if k not in HEAVY_INFO_FIELDS}
+        self.extraction_cache.set(self._cache_key(url), slim)
+    
+    def _extract_and_download(self, ydl: 'yt_dlp.YoutubeDL', url: str) -> Dict:
+        """
+        Download a video, reusing a cached extraction result if available.
+        
+        Starting from the cached info dict skips the webpage and player
+        requests of a new extraction. If the cached format URLs turned out
+        to be stale, the video is extracted again.
+        
+        Args:
+            ydl: Configured YoutubeDL instance.
+            url: YouTube video URL.
+        
+        Returns:
+            Info dict of the downloaded video.
+        """
+        cached = None
+        if self.extraction_cache is not None:
+            cached = self.extraction_cache.get(self._cache_key(url))
+        
+        if cached is not None:
+            try:
+                # process_ie_result mutates the dict; keep the cached copy intact
+                return ydl.process_ie_result(copy.deepcopy(cached), download=True)
+            except load_yt_dlp().utils.DownloadError as e:
+                logger.warning(f"Cached extraction unusable, re-extracting: {str(e)}")
+        
+        return self._extract(ydl, url, download=True)
+    
+    @staticmethod
+    def _downloaded_file(info: Dict) -> Dict:
+        """
+        Get the info dict of the file a download produced.
+        
+        yt-dlp records each downloaded (possibly merged) format in
+        ``requested_downloads``, with the keys that differ from the video's
+        info dict, such as ``filepath``.
+        
+        Args:
+            info: Info dict returned by the download.
+        
+        Returns:
+            Info dict describing the file on disk.
+        """
+        requested = info.get('requested_downloads') or [{}]
+        return {**info, **requested[0]}
+    
+    def _download_key(
+        self, 
+        url: str, 
+        download_type: str, 
+        quality: str, 
+        ext: str,
+        clip: Optional[Clip] = None
+    ) -> Optional[CacheKey]:
+        """
+        Build the download cache key of a request.
+        
+        Args:
+            url: YouTube video URL.
+            download_type: 'video' or 'audio'.
+            quality: Requested quality.
+            ext: Output file extension.
+            clip: Optional time range, which becomes part of the quality so
+                that clips are cached apart from the full video.
+        
+        Returns:
+            Cache key, or None if caching is disabled or the URL has no
+            recognizable video id.
+        """
+        if self.download_cache is None:
+            return None
+        video_id = extract_video_id(url)
+        if not video_id:
+            return None
+        if clip is not None:
+            quality = f'{quality}-{clip_tag(clip)}'
+        return (video_id, download_type, quality, ext)
+    
+    def _output_template(
+        self, 
+        filename: Optional[str], 
+        key: Optional[CacheKey], 
+        clip: Optional[Clip] = None
+    ) -> str:
+        """
+        Get the yt-dlp output template of a download.
+        
+        Cached downloads are written under a canonical name that is unique
+        per cache key; custom filenames become aliases of that file.
+        
+        Args:
+            filename: Optional custom filename.
+            key: Download cache key, if the download is cached.
+            clip: Optional time range, named in uncached default filenames
+                so a clip does not overwrite the full video.
+        
+        Returns:
+            Output template path.
+        """
+        if key is None:
+            default = f'%(title)s [{clip_tag(clip)}].%(ext)s' if clip else '%(title)s.%(ext)s'
+            return str(self.download_folder / (filename or default))
+        _, download_type, quality, ext = key
+        tag = f'{download_type}-{quality}'
+        if ext != DEFAULT_EXT.get(download_type):
+            tag += f'-{ext}'
+        return str(self.download_folder / f'%(title)s [%(id)s {tag}].%(ext)s')
+    
+    def _serve_cached(
+        self, 
+        key: Optional[CacheKey], 
+        filename: Optional[str], 
+        progress: DownloadProgress
+    ) -> Optional[Dict]:
+        """
+        Return the result of an already finished download, if any.
+        
+        Args:
+            key: Download cache key.
+            filename: Optional custom filename to alias the file as.
+            progress: Progress record to mark as finished.
+        
+        Returns:
+            Download result dictionary, or None on cache miss.
+        """
+        if key is None:
+            return None
+        entry = self.download_cache.lookup(key)
+        if entry is None:
+            return None
+        
+        logger.info(f"Serving {key} from download cache")
+        name = self._alias(entry['filename'], filename)
+        path = str(self.download_folder / name)
+        progress.update({'status': 'finished', 'filename': path})
+        return {
+            'success': True,
+            'filename': name,
+            'path': path,
+            'title': entry['title'],
+            'cached': True,
+        }
+    
+    def _store_result(self, key: Optional[CacheKey], result: Dict) -> Dict:
+        """
+        Record a finished download in the download cache.
+        
+        Args:
+            key: Download cache key.
+            result: Download result dictionary.
+        
+        Returns:
+            The result dictionary.
+        """
+        if key is not None:
+            self.download_cache.store(key, result['path'], result['title'])
+        return result
+    
+    def _alias_result(
+        self, 
+        key: Optional[CacheKey], 
+        result: Dict, 
+        filename: Optional[str]
+    ) -> Dict:
+        """
+        Apply a caller's custom filename to a (possibly shared) result.
+        
+        Args:
+            key: Download cache key.
+            result: Download result dictionary.
+            filename: Optional custom filename to alias the file as.
+        
+        Returns:
+            A copy of the result, pointing to the alias if one was created.
+        """
+        result = {'cached': False, **result}
+        if key is None:
+            return result
+        
+        name = self._alias(result['filename'], filename)
+        result['filename'] = name
+        result['path'] = str(self.download_folder / name)
+        return result
+    
+    def _alias(self, canonical: str, filename: Optional[str]) -> str:
+        """
+        Expose a cached file under a custom filename.
+        
+        Args:
+            canonical: Canonical filename.
+            filename: Optional custom filename (without extension); the
+                extension of the canonical file is kept.
+        
+        Returns:
+            The name the file is served under.
+        """
+        name = sanitize_filename(filename or '')
+        if not name:
+            return canonical
+        ext = os.path.splitext(canonical)[1]
+        return self.download_cache.alias(canonical, f'{name}{ext}')
+    
+    def _run_download(
+        self, 
+        fetch: Callable[..., Dict], 
+        download_type: str,
+        ext: str,
+        url: str, 
+        quality: str, 
+        filename: Optional[str], 
+        progress: Optional[DownloadProgress],
+        client: Optional[str] = None,
+        clip: Optional[Clip] = None
+    ) -> Dict:
+        """
+        Serve a download from cache or run it, coalescing identical requests.
+        
+        Requests with the same cache key (or, without one, the same output
+        file) that arrive while a download is running attach to it: they
+        mirror its progress and share its result instead of starting a
+        second yt-dlp run into the same files.
+        
+        Args:
+            fetch: Method performing the yt-dlp download.
+            download_type: 'video' or 'audio'.
+            ext: Output file extension.
+            url: YouTube video URL.
+            quality: Requested quality.
+            filename: Optional custom filename (without extension).
+            progress: Optional progress record to update.
+            client: Optional identity of the requesting client, whose
+                downloads share a bandwidth limit.
+            clip: Optional time range; ``fetch`` must already be bound to it.
+        
+        Returns:
+            Dictionary with download result information.
+        
+        Raises:
+            Exception: If download fails.
+        """
+        if progress is None:
+            progress = DownloadProgress()
+        self.progress = progress
+        self._job.client = client
+        
+        key = self._download_key(url, download_type, quality, ext, clip)
+        
+        try:
+            cached = self._serve_cached(key, filename, progress)
+            if cached is not None:
+                return cached
+            
+            output_template = self._output_template(filename, key, clip)
+            result = self.flights.do(
+                key or (url, download_type, quality, clip, output_template),
+                partial(
+                    self._fetch_exclusive, key, progress,
+                    partial(fetch, url, quality, output_template, key, progress)
+                ),
+                token=progress,
+                on_join=lambda leader: leader.attach(progress)
+            )
+            return self._alias_result(key, result, filename)
+        except Exception as e:
+            logger.error(f"Error downloading {download_type}: {str(e)}")
+            progress.error = str(e)
+            raise Exception(f"Failed to download {download_type}: {str(e)}")
+        finally:
+            progress.close()
+    
+    def _fetch_exclusive(
+        self, 
+        key: Optional[CacheKey], 
+        progress: DownloadProgress, 
+        fetch: Callable[[], Dict]
+    ) -> Dict:
+        """
+        Run a download while holding its cross-process lock.
+        
+        Identical downloads in this process are already coalesced; the lock
+        extends that to other worker processes. If one of them finished the
+        same download while this process waited, its file is used.
+        
+        Args:
+            key: Download cache key, or None if the download is not cached.
+            progress: Progress record of the download.
+            fetch: Performs the download.
+        
+        Returns:
+            Dictionary with download result information.
+        """
+        if key is None:
+            return fetch()
+        
+        with self.download_cache.locked(key):
+            entry = self.download_cache.lookup(key, count=False)
+            if entry is None:
+                return fetch()
+        
+        path = str(self.download_folder / entry['filename'])
+        progress.update({'status': 'finished', 'filename': path})
+        return {
+            'success': True,
+            'filename': entry['filename'],
+            'path': path,
+            'title': entry['title'],
+            'cached': True,
+        }
+    
     def download_video(
         self, 
         url: str, 
         quality: str = 'best',
-        filename: Optional[str] = None
+        filename: Optional[str] = None,
+        progress: Optional[DownloadProgress] = None,
+        client: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None
     ) -> Dict:
         """
         Download video from YouTube.
         
+        With ``start`` or ``end``, only that time range is fetched and
+        stream-copied, cut at the nearest keyframes.
+        
         Args:
             url: YouTube video URL.
             quality: Video quality (e.g., '720', '1080', 'best').
             filename: Optional custom filename (without extension).
-            
+            progress: Optional progress record to update, e.g. one owned
+                by a ProgressRegistry. A new record is created if omitted.
+            client: Optional identity of the requesting client, whose
+                downloads share a bandwidth limit.
+            start: Optional start of the clip in seconds.
+            end: Optional end of the clip in seconds.
+        
         Returns:
             Dictionary with download result information.
+        
+        Raises:
+            ValueError: If the time range is invalid.
+            Exception: If download fails.
+        """
+        clip = make_clip(start, end)
+        return self._run_download(
+            partial(self._fetch_video, clip=clip),
+            'video', 'mp4', url, quality, filename, progress, client, clip
+        )
+    
+    def _fetch_video(
+        self, 
+        url: str, 
+        quality: str, 
+        output_template: str, 
+        key: Optional[CacheKey], 
+        progress: DownloadProgress,
+        clip: Optional[Clip] = None
+    ) -> Dict:
+        """
+        Run yt-dlp to download a video and remux or convert it to MP4 as planned.
+        
+        Args:
+            url: YouTube video URL.
+            quality: Video quality (e.g., '720', '1080', 'best').
+            output_template: yt-dlp output template.
+            key: Download cache key to record the file under.
+            progress: Progress record updated by the download.
+            clip: Optional time range to download.
+        
+        Returns:
+            Dictionary with download result information.
+        """
+        with self._lease(
+            f'video-{quality}',
+            self._video_opts(quality),
+            output_template,
+            progress,
+            clip
+        ) as ydl:
+            info = self._extract_and_download(ydl, url)
+            downloaded = self._downloaded_file(info)
+            plan = plan_video(downloaded, 'mp4')
+            downloaded, seconds = run_video_plan(ydl, downloaded, plan)
+            final_filename = downloaded['filepath']
             
+            return self._store_result(key, {
+                'success': True,
+                'filename': os.path.basename(final_filename),
+                'path': final_filename,
+                'title': info.get('title', 'Unknown'),
+                'transcode': plan.to_dict(seconds),
+            })
+    
+    def download_audio(
+        self, 
+        url: str, 
+        quality: str = '192',
+        filename: Optional[str] = None,
+        progress: Optional[DownloadProgress] = None,
+        audio_format: str = 'mp3',
+        client: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None
+    ) -> Dict:
+        """
+        Download audio from YouTube.
+        
+        The source stream is copied into the requested container when its
+        codec allows it (e.g. AAC to M4A, Opus to Opus) and re-encoded only
+        otherwise. With ``start`` or ``end``, only that time range is
+        fetched and converted.
+        
+        Args:
+            url: YouTube video URL.
+            quality: Audio bitrate in kbps (e.g., '128', '192', '320'),
+                used when re-encoding.
+            filename: Optional custom filename (without extension).
+            progress: Optional progress record to update, e.g. one owned
+                by a ProgressRegistry. A new record is created if omitted.
+            audio_format: 'mp3', 'm4a', 'opus', or 'best' to keep the
+                source codec.
+            client: Optional identity of the requesting client, whose
+                downloads share a bandwidth limit.
+            start: Optional start of the clip in seconds.
+            end: Optional end of the clip in seconds.
+        
+        Returns:
+            Dictionary with download result information.
+        
         Raises:
+            ValueError: If the audio format or the time range is invalid.
             Exception: If download fails.
         """
-        self.progress = DownloadProgress()
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
+        clip = make_clip(start, end)
+        return self._run_download(
+            partial(self._fetch_audio, audio_format, clip=clip),
+            'audio', audio_format, url, quality, filename, progress, client, clip
+        )
+    
+    def _fetch_audio(
+        self, 
+        audio_format: str,
+        url: str, 
+        quality: str, 
+        output_template: str, 
+        key: Optional[CacheKey], 
+        progress: DownloadProgress,
+        clip: Optional[Clip] = None
+    ) -> Dict:
+        """
+        Run yt-dlp to download audio and copy or convert it as planned.
         
-        # Determine format string
-        if quality == 'best':
-            format_str = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+        Clips are fetched on their own rather than cut from the shared
+        source, which would mean downloading the whole audio.
+        
+        Args:
+            audio_format: Output format, one of ``AUDIO_FORMATS``.
+            url: YouTube video URL.
+            quality: Audio bitrate in kbps (e.g., '128', '192', '320').
+            output_template: yt-dlp output template.
+            key: Download cache key to record the file under.
+            progress: Progress record updated by the download.
+            clip: Optional time range to download.
+        
+        Returns:
+            Dictionary with download result information.
+        """
+        if self.transcoder is not None and key is not None and clip is None:
+            return self._encode_audio(audio_format, url, quality, output_template, key, progress)
+        
+        with self._lease('audio', self._audio_opts(), output_template, progress, clip) as ydl:
+            info = self._extract_and_download(ydl, url)
+            downloaded = self._downloaded_file(info)
+            plan = plan_audio(downloaded, audio_format)
+            downloaded, seconds = run_audio_plan(ydl, downloaded, plan, quality)
+            final_filename = downloaded['filepath']
+            
+            return self._store_result(key, {
+                'success': True,
+                'filename': os.path.basename(final_filename),
+                'path': final_filename,
+                'title': info.get('title', 'Unknown'),
+                'transcode': plan.to_dict(seconds),
+            })
+    
+    def _encode_audio(
+        self, 
+        audio_format: str,
+        url: str, 
+        quality: str, 
+        output_template: str, 
+        key: CacheKey, 
+        progress: DownloadProgress
+    ) -> Dict:
+        """
+        Produce audio from the shared local source of a video.
+        
+        Args:
+            audio_format: Output format, one of ``AUDIO_FORMATS``.
+            url: YouTube video URL.
+            quality: Audio bitrate in kbps used when re-encoding.
+            output_template: yt-dlp output template of the result.
+            key: Download cache key to record the file under.
+            progress: Progress record updated by the source download.
+        
+        Returns:
+            Dictionary with download result information.
+        """
+        source = self._audio_source(url, progress)
+        plan = plan_audio(source, audio_format)
+        if plan.action == NONE:
+            final_filename, seconds = source['filepath'], 0.0
         else:
-            format_str = f'bestvideo[height<={quality}][ext=mp4]+bestaudio[ext=m4a]/best[height<={quality}][ext=mp4]/best'
+            final_filename = self._render_output(output_template, source['filepath'], key[0], plan.target)
+            # Any process's storage sweep could evict the source meanwhile
+            pin_dir = self.download_cache.state_dir / PIN_DIRNAME
+            with pin_file(Path(source['filepath']), pin_dir):
+                seconds = self.transcoder.transcode(source['filepath'], final_filename, plan, quality)
         
-        output_template = str(self.download_folder / (filename or '%(title)s.%(ext)s'))
+        return self._store_result(key, {
+            'success': True,
+            'filename': os.path.basename(final_filename),
+            'path': final_filename,
+            'title': source['title'],
+            'transcode': plan.to_dict(seconds),
+        })
+    
+    def _audio_source(self, url: str, progress: DownloadProgress) -> Dict:
+        """
+        Get the best audio of a video as downloaded, fetching it only once.
         
-        ydl_opts = {
-            **self._get_base_ydl_opts(),
-            'format': format_str,
-            'outtmpl': output_template,
-            'progress_hooks': [self._progress_hook],
-            'merge_output_format': 'mp4',
-            'postprocessors': [{
-                'key': 'FFmpegVideoConvertor',
-                'preferedformat': 'mp4',
-            }],
-        }
+        Args:
+            url: YouTube video URL.
+            progress: Progress record updated by the download.
         
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                final_filename = ydl.prepare_filename(info)
-                
+        Returns:
+            Dictionary with ``filepath``, ``title``, ``ext`` and, when just
+            downloaded, ``acodec`` of the source file.
+        """
+        key = self._download_key(url, 'audio', SOURCE_QUALITY, SOURCE_EXT)
+        source = self._cached_source(key, progress)
+        if source is not None:
+            return source
+        
+        return self.flights.do(
+            key,
+            partial(self._fetch_audio_source, url, key, progress),
+            token=progress,
+            on_join=lambda leader: leader.attach(progress)
+        )
+    
+    def _fetch_audio_source(self, url: str, key: CacheKey, progress: DownloadProgress) -> Dict:
+        """
+        Run yt-dlp to download the best audio of a video without conversion.
+        
+        Args:
+            url: YouTube video URL.
+            key: Download cache key of the source.
+            progress: Progress record updated by the download.
+        
+        Returns:
+            Source file description, see ``_audio_source``.
+        """
+        with self.download_cache.locked(key):
+            # Another worker process may have fetched it meanwhile
+            source = self._cached_source(key, progress, count=False)
+            if source is not None:
+                return source
+            
+            output_template = self._output_template(None, key)
+            with self._lease('audio', self._audio_opts(), output_template, progress) as ydl:
+                info = self._extract_and_download(ydl, url)
+                downloaded = self._downloaded_file(info)
+                title = info.get('title', 'Unknown')
+                self.download_cache.store(key, downloaded['filepath'], title)
                 return {
-                    'success': True,
-                    'filename': os.path.basename(final_filename),
-                    'path': final_filename,
-                    'title': info.get('title', 'Unknown'),
+                    'filepath': downloaded['filepath'],
+                    'title': title,
+                    'ext': downloaded.get('ext'),
+                    'acodec': downloaded.get('acodec'),
                 }
-        except Exception as e:
-            logger.error(f"Error downloading video: {str(e)}")
-            self.progress.error = str(e)
-            raise Exception(f"Failed to download video: {str(e)}")
     
-    def download_audio(
+    def _cached_source(
+        self, 
+        key: CacheKey, 
+        progress: DownloadProgress, 
+        count: bool = True
+    ) -> Optional[Dict]:
+        """
+        Get an already downloaded audio source.
+        
+        Args:
+            key: Download cache key of the source.
+            progress: Progress record to mark as finished on a hit.
+            count: Whether the lookup counts towards cache statistics.
+        
+        Returns:
+            Source file description, see ``_audio_source``, or None.
+        """
+        entry = self.download_cache.lookup(key, count=count)
+        if entry is None:
+            return None
+        path = str(self.download_folder / entry['filename'])
+        progress.update({'status': 'finished', 'filename': path})
+        return {
+            'filepath': path,
+            'title': entry['title'],
+            'ext': os.path.splitext(path)[1][1:],
+        }
+    
+    @staticmethod
+    def _render_output(output_template: str, source: str, video_id: str, ext: str) -> str:
+        """
+        Fill in an output template for a file derived from a source file.
+        
+        The title part is taken from the source's name, which yt-dlp
+        already rendered and sanitized from the same ``%(title)s`` field.
+        
+        Args:
+            output_template: yt-dlp output template of the result.
+            source: Path of the source file.
+            video_id: YouTube video id.
+            ext: Extension of the result.
+        
+        Returns:
+            Path of the result.
+        """
+        title = os.path.basename(source).rsplit(' [', 1)[0]
+        return (
+            output_template
+            .replace('%(ext)s', ext)
+            .replace('%(id)s', video_id)
+            .replace('%(title)s', title)
+        )
+    
+    def download_stream(
         self, 
         url: str, 
-        quality: str = '192',
-        filename: Optional[str] = None
+        download_type: str = 'audio',
+        quality: str = 'best',
+        filename: Optional[str] = None,
+        progress: Optional[DownloadProgress] = None,
+        client: Optional[str] = None
     ) -> Dict:
         """
-        Download audio from YouTube and convert to MP3.
+        Download a single-file format that can be streamed while it downloads.
+        
+        Unlike ``download_video`` and ``download_audio`` the file is neither
+        merged nor converted: it keeps the source container (e.g. m4a, mp4),
+        which lets clients read it from ``progress.filename`` as it grows.
         
         Args:
             url: YouTube video URL.
-            quality: Audio bitrate in kbps (e.g., '128', '192', '320').
+            download_type: 'video' or 'audio'.
+            quality: Video quality (e.g., '720', 'best'). Ignored for audio.
             filename: Optional custom filename (without extension).
-            
+            progress: Optional progress record to update.
+            client: Optional identity of the requesting client, whose
+                downloads share a bandwidth limit.
+        
         Returns:
             Dictionary with download result information.
-            
+        
         Raises:
             Exception: If download fails.
         """
-        self.progress = DownloadProgress()
-        
-        output_template = str(self.download_folder / (filename or '%(title)s.%(ext)s'))
+        if download_type == 'audio':
+            quality = 'best'
+        return self._run_download(
+            partial(self._fetch_stream, download_type),
+            download_type, STREAM_EXT, url, quality, filename, progress, client
+        )
+    
+    def _fetch_stream(
+        self, 
+        download_type: str,
+        url: str, 
+        quality: str, 
+        output_template: str, 
+        key: Optional[CacheKey], 
+        progress: DownloadProgress
+    ) -> Dict:
+        """
+        Run yt-dlp to download a single-file format without post-processing.
         
-        ydl_opts = {
-            **self._get_base_ydl_opts(),
-            'format': 'bestaudio/best',
-            'outtmpl': output_template,
-            'progress_hooks': [self._progress_hook],
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': quality,
-            }],
-        }
+        Args:
+            download_type: 'video' or 'audio'.
+            url: YouTube video URL.
+            quality: Video quality (e.g., '720', 'best').
+            output_template: yt-dlp output template.
+            key: Download cache key to record the file under.
+            progress: Progress record updated by the download.
         
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                
-                # Get the final filename after post-processing
-                base_filename = ydl.prepare_filename(info)
-                final_filename = os.path.splitext(base_filename)[0] + '.mp3'
-                
-                return {
-                    'success': True,
-                    'filename': os.path.basename(final_filename),
-                    'path': final_filename,
-                    'title': info.get('title', 'Unknown'),
-                }
-        except Exception as e:
-            logger.error(f"Error downloading audio: {str(e)}")
-            self.progress.error = str(e)
-            raise Exception(f"Failed to download audio: {str(e)}")
+        Returns:
+            Dictionary with download result information.
+        """
+        with self._lease(
+            f'stream-{download_type}-{quality}',
+            self._stream_opts(download_type, quality),
+            output_template,
+            progress
+        ) as ydl:
+            info = self._extract_and_download(ydl, url)
+            final_filename = ydl.prepare_filename(info)
+            
+            return self._store_result(key, {
+                'success': True,
+                'filename': os.path.basename(final_filename),
+                'path': final_filename,
+                'title': info.get('title', 'Unknown'),
+            })
     
     def get_progress(self) -> Dict:
         """
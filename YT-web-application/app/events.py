@@ -0,0 +1,166 @@
+"""
+Progress event module.
+
+This module decouples yt-dlp progress callbacks from the consumers that may
+lag behind them, such as the progress log. The hook enqueues a compact event;
+a dispatcher thread coalesces events per download and hands the latest ones
+to each subscriber at that subscriber's own rate. Consumers that must see
+every callback, or act in the download thread, are called by the hook itself
+(see ``YouTubeDownloader._lease``).
+"""
+
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressEvent(NamedTuple):
+    """Compact snapshot of a yt-dlp progress callback."""
+    
+    key: Hashable
+    status: str
+    downloaded: int
+    total: int
+    speed: float
+    eta: Optional[int]
+    filename: str
+    
+    @classmethod
+    def from_hook(cls, key: Hashable, data: Dict) -> 'ProgressEvent':
+        """
+        Build an event from yt-dlp progress data.
+        
+        Args:
+            key: Identity of the download, i.e. its job id.
+            data: Progress data from yt-dlp.
+        
+        Returns:
+            The event.
+        """
+        return cls(
+            key,
+            data.get('status', 'unknown'),
+            data.get('downloaded_bytes') or 0,
+            data.get('total_bytes') or data.get('total_bytes_estimate') or 0,
+            data.get('speed') or 0.0,
+            data.get('eta'),
+            data.get('filename', ''),
+        )
+    
+    @property
+    def percentage(self) -> float:
+        """Downloaded share in percent, 100 once finished."""
+        if self.status == 'finished':
+            return 100.0
+        return self.downloaded / self.total * 100 if self.total else 0.0
+
+
+class _Subscriber:
+    """A consumer of coalesced events."""
+    
+    __slots__ = ('callback', 'interval', 'pending', 'next_at')
+    
+    def __init__(self, callback: Callable[[List[ProgressEvent]], None], interval: float):
+        """
+        Initialize the subscriber.
+        
+        Args:
+            callback: Called with the latest event of each download.
+            interval: Minimum seconds between calls.
+        """
+        self.callback = callback
+        self.interval = interval
+        self.pending: Dict[Hashable, ProgressEvent] = {}
+        self.next_at = 0.0
+
+
+class ProgressEvents:
+    """Queue of progress events fanned out to rate-limited subscribers."""
+    
+    def __init__(self):
+        """Initialize the pipeline; the dispatcher starts on first publish."""
+        self._queue: 'queue.SimpleQueue[ProgressEvent]' = queue.SimpleQueue()
+        self._subscribers: List[_Subscriber] = []
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.delivered = 0
+    
+    def subscribe(
+        self,
+        callback: Callable[[List[ProgressEvent]], None],
+        interval: float = 1.0
+    ) -> None:
+        """
+        Register a subscriber.
+        
+        Args:
+            callback: Called on the dispatcher thread with the latest event
+                of each download that changed since the previous call.
+            interval: Minimum seconds between calls.
+        """
+        with self._lock:
+            self._subscribers.append(_Subscriber(callback, interval))
+    
+    def publish(self, event: ProgressEvent) -> None:
+        """
+        Enqueue an event. Never blocks and does no I/O.
+        
+        Args:
+            event: Event to publish.
+        """
+        if self._thread is None:
+            self._start()
+        self._queue.put(event)
+    
+    def _start(self) -> None:
+        """Start the dispatcher thread once."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='progress-events',
+                    daemon=True
+                )
+                self._thread.start()
+    
+    def _run(self) -> None:
+        """Dispatcher loop."""
+        while True:
+            subscribers = list(self._subscribers)
+            now = time.monotonic()
+            due = [s.next_at for s in subscribers if s.pending]
+            timeout = max(0.0, min(due) - now) if due else None
+            try:
+                event = self._queue.get(timeout=timeout)
+                while True:
+                    for subscriber in subscribers:
+                        subscriber.pending[event.key] = event
+                    event = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._deliver(subscribers, time.monotonic())
+    
+    def _deliver(self, subscribers: List[_Subscriber], now: float) -> None:
+        """
+        Call every subscriber whose interval has elapsed.
+        
+        Args:
+            subscribers: Registered subscribers.
+            now: Current monotonic time.
+        """
+        for subscriber in subscribers:
+            if not subscriber.pending or now < subscriber.next_at:
+                continue
+            events = list(subscriber.pending.values())
+            subscriber.pending.clear()
+            subscriber.next_at = now + subscriber.interval
+            try:
+                subscriber.callback(events)
+                self.delivered += len(events)
+            except Exception as e:
+                logger.error(f"Progress subscriber failed: {str(e)}")
@@ -0,0 +1,190 @@
+"""
+Fragment concurrency module.
+
+This module chooses how many fragments of a segmented (DASH/HLS) format yt-dlp
+downloads in parallel. The level is tuned from observed throughput and capped
+globally so that many simultaneous jobs cannot flood the network link.
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class FragmentTuner:
+    """
+    Shared, throughput-driven choice of per-job fragment concurrency.
+    
+    Concurrency levels are powers of two up to ``max_per_job``. The tuner
+    keeps a moving average of the throughput measured at each level and
+    picks the smallest level within ``tolerance`` of the best one, probing
+    the next level up whenever the current choice is the highest measured.
+    """
+    
+    def __init__(
+        self,
+        max_total: int = 16,
+        max_per_job: int = 8,
+        initial: int = 4,
+        tolerance: float = 0.1,
+        smoothing: float = 0.3
+    ):
+        """
+        Initialize the tuner.
+        
+        Args:
+            max_total: Fragment downloads allowed across all jobs.
+            max_per_job: Fragment downloads allowed in a single job.
+            initial: Level used before anything has been measured.
+            tolerance: Relative throughput loss accepted for a lower level.
+            smoothing: Weight of a new measurement in the moving average.
+        """
+        self.max_total = max(1, max_total)
+        self.max_per_job = max(1, min(max_per_job, self.max_total))
+        self.levels: List[int] = []
+        level = 1
+        while level < self.max_per_job:
+            self.levels.append(level)
+            level *= 2
+        self.levels.append(self.max_per_job)
+        self.target = min((l for l in self.levels if l >= initial), default=self.max_per_job)
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.in_use = 0
+        self._throughput: Dict[int, float] = {}
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> int:
+        """
+        Reserve fragment slots for the next format of a job.
+        
+        Every job gets at least one slot, so the global cap may be exceeded
+        by one slot per job rather than blocking a job entirely.
+        
+        Returns:
+            Number of fragments to download in parallel.
+        """
+        with self._lock:
+            count = max(1, min(self.target, self.max_total - self.in_use))
+            self.in_use += count
+            return count
+    
+    def release(self, count: int) -> None:
+        """
+        Return slots reserved with ``acquire``.
+        
+        Args:
+            count: Number of slots to return.
+        """
+        with self._lock:
+            self.in_use = max(0, self.in_use - count)
+    
+    def observe(self, level: int, speed: float) -> None:
+        """
+        Record the throughput of a finished segmented download.
+        
+        Args:
+            level: Concurrency the download ran with.
+            speed: Average speed in bytes per second.
+        """
+        if speed <= 0:
+            return
+        with self._lock:
+            level = min((l for l in self.levels if l >= level), default=self.max_per_job)
+            previous = self._throughput.get(level)
+            if previous is None:
+                self._throughput[level] = speed
+            else:
+                self._throughput[level] = previous + self.smoothing * (speed - previous)
+            target = self._choose()
+            if target != self.target:
+                logger.info(f"Fragment concurrency {self.target} -> {target}")
+                self.target = target
+    
+    def _choose(self) -> int:
+        """Pick the level to use next. Must be called with the lock held."""
+        best = max(self._throughput.values())
+        choice = min(
+            level for level, speed in self._throughput.items()
+            if speed >= best * (1 - self.tolerance)
+        )
+        if choice == max(self._throughput):
+            higher = [level for level in self.levels if level > choice]
+            if higher:
+                return higher[0]
+        return choice
+    
+    def stats(self) -> Dict:
+        """
+        Get tuner statistics.
+        
+        Returns:
+            Dictionary with the current level, slot usage and measurements.
+        """
+        return {
+            'target': self.target,
+            'in_use': self.in_use,
+            'max_total': self.max_total,
+            'max_per_job': self.max_per_job,
+            'throughput': {str(level): round(speed) for level, speed in sorted(self._throughput.items())},
+        }
+
+
+class FragmentSession:
+    """Fragment concurrency of a single job, fed by its progress hook."""
+    
+    def __init__(self, tuner: FragmentTuner):
+        """
+        Initialize the session.
+        
+        Args:
+            tuner: Shared tuner the job's slots come from.
+        """
+        self.tuner = tuner
+        self.params: Optional[Dict] = None
+        self.level = 0
+        self.fragmented = False
+    
+    def start(self, params: Dict) -> None:
+        """
+        Reserve slots and apply them to a YoutubeDL instance.
+        
+        yt-dlp reads ``concurrent_fragment_downloads`` from the params dict
+        shared with its downloaders when each format starts, so the value
+        can be changed between the formats of a job (e.g. video and audio).
+        
+        Args:
+            params: ``params`` dict of the job's YoutubeDL instance.
+        """
+        self.params = params
+        self.level = self.tuner.acquire()
+        params['concurrent_fragment_downloads'] = self.level
+    
+    def update(self, data: Dict) -> None:
+        """
+        Handle a yt-dlp progress hook call.
+        
+        Args:
+            data: Progress data from yt-dlp.
+        """
+        status = data.get('status')
+        if status == 'downloading':
+            if data.get('fragment_count'):
+                self.fragmented = True
+        elif status == 'finished' and self.params is not None:
+            elapsed = data.get('elapsed') or 0
+            if self.fragmented and elapsed > 0:
+                self.tuner.observe(self.level, (data.get('downloaded_bytes') or 0) / elapsed)
+            self.fragmented = False
+            # Re-tune before the next format of the job starts
+            self.tuner.release(self.level)
+            self.start(self.params)
+    
+    def close(self) -> None:
+        """Return the job's slots."""
+        if self.params is not None:
+            self.tuner.release(self.level)
+            self.params = None
@@ -0,0 +1,760 @@
+"""
+Process isolation module.
+
+This module runs ``YouTubeDownloader`` work in a pool of worker processes so
+that yt-dlp's extraction (which holds the GIL) and the memory held by large
+info dicts stay out of the web process. Workers are replaced after a number
+of jobs or once their resident memory exceeds a limit, and progress is sent
+back to the web process as compact tuples over a queue.
+"""
+
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+import itertools
+import threading
+import multiprocessing
+import multiprocessing.connection
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from app.cache import TTLCache
+from app.download_cache import DownloadCache
+from app.downloader import DownloadProgress, YouTubeDownloader
+from app.events import ProgressEvent, ProgressEvents
+from app.metrics import DownloadMeter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+# Messages sent from the workers to the web process
+STARTED = 'started'
+PROGRESS = 'progress'
+DONE = 'done'
+FAILED = 'failed'
+RETIRED = 'retired'
+
+# yt-dlp progress fields sent back; the rest (e.g. the info dict) stays behind
+RELAYED_FIELDS = (
+    'status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate',
+    'speed', 'eta', 'filename', 'elapsed',
+)
+
+
+class WorkerError(Exception):
+    """Raised in the web process when a job failed in a worker process."""
+
+
+def rss_mb() -> float:
+    """
+    Get the resident memory of the calling process.
+    
+    Returns:
+        Resident set size in MB. Where ``/proc`` is unavailable, the peak
+        size is returned instead, or 0 if that is unknown too.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+class _RelayProgress(DownloadProgress):
+    """Progress record of a worker process that reports to the web process."""
+    
+    __slots__ = ('channel', 'task_id', 'interval', 'sent_at')
+    
+    def __init__(self, channel: multiprocessing.Queue, task_id: int, interval: float):
+        """
+        Initialize the record.
+        
+        Args:
+            channel: Queue read by the web process.
+            task_id: Task the record belongs to.
+            interval: Minimum seconds between two 'downloading' messages.
+        """
+        super().__init__()
+        self.channel = channel
+        self.task_id = task_id
+        self.interval = interval
+        self.sent_at = 0.0
+    
+    def update(self, data: Dict) -> None:
+        """
+        Update the record and forward the change.
+        
+        Status changes are always sent; 'downloading' updates at most every
+        ``interval`` seconds.
+        
+        Args:
+            data: Progress data dictionary from yt-dlp.
+        """
+        super().update(data)
+        now = time.monotonic()
+        if data.get('status') == 'downloading' and now - self.sent_at < self.interval:
+            return
+        self.sent_at = now
+        self.channel.put((
+            PROGRESS, os.getpid(), self.task_id,
+            {name: data[name] for name in RELAYED_FIELDS if name in data}
+        ))
+
+
+def _build_downloader(settings: Dict) -> YouTubeDownloader:
+    """
+    Create the downloader of a worker process.
+    
+    Args:
+        settings: Keyword arguments of the components, see ``WorkerPool``.
+    
+    Returns:
+        YouTubeDownloader instance.
+    """
+    from app.bandwidth import BandwidthScheduler
+    from app.fragments import FragmentTuner
+    from app.transcode import AudioTranscoder
+    from app.ydl_cache import YDLCache
+    from app.ydl_pool import YDLPool
+    
+    fragments = settings.get('fragments')
+    bandwidth = settings.get('bandwidth')
+    ydl_cache = settings.get('ydl_cache')
+    return YouTubeDownloader(
+        settings['download_folder'],
+        extraction_cache=TTLCache(
+            maxsize=settings.get('extraction_cache_size', 64),
+            ttl=settings.get('extraction_cache_ttl', 600)
+        ),
+        download_cache=DownloadCache(settings['download_folder'], settings.get('state_dir')),
+        ydl_pool=YDLPool(size=settings.get('ydl_pool_size', 2)),
+        fragment_tuner=FragmentTuner(**fragments) if fragments else None,
+        log_interval=settings.get('log_interval', 5.0),
+        # Already outside the web process: encode in the worker itself
+        transcoder=AudioTranscoder(workers=0) if settings.get('transcode') else None,
+        bandwidth=BandwidthScheduler(**bandwidth) if bandwidth else None,
+        ydl_cache=YDLCache(**ydl_cache) if ydl_cache else None
+    )
+
+
+def _exit_with_parent() -> None:
+    """
+    Stop the worker process once the web process is gone. Watchdog thread.
+    
+    Workers are not daemonic, so if the web process is killed nothing else
+    stops them: idle ones would wait for tasks forever, busy ones would
+    finish downloads whose results nobody collects. The parent's sentinel
+    is a pipe that reaches EOF when the parent exits, however it exits.
+    """
+    parent = multiprocessing.parent_process()
+    if parent is None:
+        return
+    multiprocessing.connection.wait([parent.sentinel])
+    logger.warning(f"Web process {parent.pid} is gone, stopping worker")
+    os._exit(1)
+
+
+def _worker_main(
+    settings: Dict,
+    tasks: multiprocessing.SimpleQueue,
+    results: multiprocessing.Queue,
+    max_jobs: int,
+    max_rss_mb: float,
+    progress_interval: float
+) -> None:
+    """
+    Run tasks until told to stop or due for recycling. Worker process entry point.
+    
+    Args:
+        settings: Downloader settings, see ``WorkerPool``.
+        tasks: This worker's queue of (task id, method, args, kwargs, with
+            progress) tuples; None stops the worker.
+        results: Queue of (kind, pid, task id, payload) messages to the web
+            process, shared by all workers.
+        max_jobs: Jobs after which the worker exits, 0 for no limit.
+        max_rss_mb: Resident MB after which the worker exits, 0 for no limit.
+        progress_interval: Minimum seconds between progress messages of a job.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s %(levelname)s [worker {os.getpid()}]: %(message)s'
+    )
+    pid = os.getpid()
+    threading.Thread(target=_exit_with_parent, name='parent-watchdog', daemon=True).start()
+    downloader = _build_downloader(settings)
+    downloader.warm_pool()
+    jobs = 0
+    
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        
+        task_id, method, args, kwargs, with_progress = task
+        results.put((STARTED, pid, task_id, None))
+        if with_progress:
+            kwargs['progress'] = _RelayProgress(results, task_id, progress_interval)
+        try:
+            outcome = (DONE, pid, task_id, getattr(downloader, method)(*args, **kwargs))
+        except Exception as e:
+            outcome = (FAILED, pid, task_id, str(e))
+        
+        jobs += 1
+        rss = rss_mb()
+        retire = (max_jobs and jobs >= max_jobs) or (max_rss_mb and rss >= max_rss_mb)
+        if retire:
+            # Announced before the result so no further task is assigned
+            results.put((RETIRED, pid, task_id, f'{jobs} jobs, {rss:.0f} MB resident'))
+        results.put(outcome)
+        if retire:
+            return
+
+
+class _Task:
+    """A call waiting for its worker's answer."""
+    
+    __slots__ = ('done', 'result', 'error', 'on_progress')
+    
+    def __init__(self, on_progress: Optional[Callable[[Dict], None]]):
+        """
+        Initialize the task.
+        
+        Args:
+            on_progress: Called with relayed progress data, if any.
+        """
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.on_progress = on_progress
+
+
+class _Worker:
+    """A worker process and the task assigned to it."""
+    
+    __slots__ = ('process', 'tasks', 'task', 'started', 'retiring')
+    
+    def __init__(self, process: multiprocessing.Process, tasks: multiprocessing.SimpleQueue):
+        """
+        Initialize the handle.
+        
+        Args:
+            process: The worker process.
+            tasks: Queue only this worker reads from.
+        """
+        self.process = process
+        self.tasks = tasks
+        self.task: Optional[Tuple] = None
+        self.started = False
+        self.retiring = False
+
+
+class WorkerPool:
+    """
+    Worker processes running downloader methods.
+    
+    Each worker builds its own ``YouTubeDownloader`` and runs one task at a
+    time. After ``max_jobs`` tasks, or once its resident memory exceeds
+    ``max_rss_mb``, a worker exits and a fresh one is started, so memory that
+    yt-dlp leaves fragmented or cached is returned to the OS.
+    
+    Tasks wait in the web process and are handed to idle workers through a
+    queue of their own, so a worker killed while idle (e.g. by the OOM
+    killer) cannot leave a shared queue locked. A collector thread reads the
+    workers' messages, replaces exited workers, requeues a task its worker
+    never started and fails one its worker crashed on.
+    """
+    
+    def __init__(
+        self,
+        settings: Dict,
+        workers: int = 2,
+        max_jobs: int = 100,
+        max_rss_mb: float = 512.0,
+        progress_interval: float = 0.25,
+        poll_interval: float = 1.0
+    ):
+        """
+        Initialize the pool; workers start with ``start`` or the first call.
+        
+        Args:
+            settings: Downloader settings: ``download_folder`` and optionally
+                ``state_dir``, ``extraction_cache_size``, ``extraction_cache_ttl``,
+                ``ydl_pool_size``, ``fragments`` (``FragmentTuner`` keyword
+                arguments), ``log_interval``, ``transcode`` and
+                ``bandwidth`` (``BandwidthScheduler`` keyword arguments).
+            workers: Number of worker processes.
+            max_jobs: Jobs after which a worker is replaced, 0 for no limit.
+            max_rss_mb: Resident MB after which a worker is replaced, 0 for
+                no limit.
+            progress_interval: Minimum seconds between progress messages of
+                a job.
+            poll_interval: Seconds between checks for exited workers.
+        """
+        self.settings = settings
+        self.workers = max(1, workers)
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.progress_interval = progress_interval
+        self.poll_interval = poll_interval
+        self.recycled = 0
+        self.crashed = 0
+        # Forking a threaded server is unsafe; start clean interpreters
+        self._context = multiprocessing.get_context('spawn')
+        self._results: Optional[multiprocessing.Queue] = None
+        self._workers: Dict[int, _Worker] = {}
+        self._backlog: Deque[Tuple] = deque()
+        self._pending: Dict[int, _Task] = {}
+        self._ids = itertools.count()
+        self._collector: Optional[threading.Thread] = None
+        self._closed = False
+        self._lock = threading.Lock()
+    
+    def start(self) -> None:
+        """Start the worker processes and the collector thread once."""
+        with self._lock:
+            if self._collector is not None:
+                return
+            self._results = self._context.Queue()
+            for _ in range(self.workers):
+                self._spawn()
+            self._collector = threading.Thread(
+                target=self._collect,
+                name='worker-pool',
+                daemon=True
+            )
+            self._collector.start()
+            atexit.register(self.close)
+    
+    def call(
+        self,
+        method: str,
+        args: Tuple = (),
+        kwargs: Optional[Dict] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None
+    ) -> Any:
+        """
+        Run a downloader method in a worker and wait for its result.
+        
+        Args:
+            method: Name of the ``YouTubeDownloader`` method.
+            args: Positional arguments.
+            kwargs: Keyword arguments.
+            on_progress: Optional callback receiving the job's yt-dlp
+                progress data (``RELAYED_FIELDS``) on the collector thread.
+                The method is then given a ``progress`` record.
+        
+        Returns:
+            The method's return value.
+        
+        Raises:
+            WorkerError: If the method raised, or its worker crashed.
+        """
+        self.start()
+        task = _Task(on_progress)
+        task_id = next(self._ids)
+        with self._lock:
+            self._pending[task_id] = task
+            self._backlog.append((task_id, method, args, kwargs or {}, on_progress is not None))
+            self._dispatch()
+        try:
+            task.done.wait()
+        finally:
+            with self._lock:
+                self._pending.pop(task_id, None)
+        if task.error is not None:
+            raise WorkerError(task.error)
+        return task.result
+    
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Stop the workers, letting running tasks finish within a timeout.
+        
+        Args:
+            timeout: Seconds to wait for each worker before terminating it.
+        """
+        with self._lock:
+            if self._closed or self._collector is None:
+                return
+            self._closed = True
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.tasks.put(None)
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+    
+    def stats(self) -> Dict:
+        """
+        Get pool statistics.
+        
+        Returns:
+            Dictionary with the pool size, busy workers, waiting tasks and
+            replaced workers.
+        """
+        with self._lock:
+            busy = sum(1 for worker in self._workers.values() if worker.task is not None)
+            waiting = len(self._backlog)
+        return {
+            'workers': self.workers,
+            'busy': busy,
+            'waiting': waiting,
+            'recycled': self.recycled,
+            'crashed': self.crashed,
+        }
+    
+    def _spawn(self) -> None:
+        """Start one worker process. Must be called with the lock held."""
+        tasks = self._context.SimpleQueue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                self.settings, tasks, self._results,
+                self.max_jobs, self.max_rss_mb, self.progress_interval,
+            ),
+            name='download-worker',
+            daemon=False  # Workers start their own FFmpeg processes
+        )
+        process.start()
+        self._workers[process.pid] = _Worker(process, tasks)
+    
+    def _dispatch(self) -> None:
+        """Hand waiting tasks to idle workers. Must be called with the lock held."""
+        for worker in self._workers.values():
+            if not self._backlog:
+                return
+            if worker.task is None and not worker.retiring:
+                worker.task = self._backlog.popleft()
+                worker.started = False
+                worker.tasks.put(worker.task)
+    
+    def _collect(self) -> None:
+        """Collector loop."""
+        while not self._closed:
+            try:
+                self._handle(self._results.get(timeout=self.poll_interval))
+            except queue.Empty:
+                pass
+            except Exception as e:
+                logger.error(f"Worker pool collector error: {str(e)}")
+            self._reap()
+    
+    def _handle(self, message: Tuple) -> None:
+        """
+        Process a message of a worker.
+        
+        Args:
+            message: (kind, pid, task id, payload) tuple.
+        """
+        kind, pid, task_id, payload = message
+        if kind == PROGRESS:
+            task = self._pending.get(task_id)
+            if task is not None and task.on_progress is not None:
+                task.on_progress(payload)
+            return
+        
+        with self._lock:
+            worker = self._workers.get(pid)
+            if kind == STARTED:
+                if worker is not None:
+                    worker.started = True
+            elif kind == RETIRED:
+                self.recycled += 1
+                if worker is not None:
+                    worker.retiring = True
+                logger.info(f"Recycling worker {pid} after {payload}")
+            else:
+                if worker is not None:
+                    worker.task = None
+                self._finish(task_id, kind, payload)
+                self._dispatch()
+    
+    def _finish(self, task_id: int, kind: str, payload: Any) -> None:
+        """Complete a task with a result or an error."""
+        task = self._pending.get(task_id)
+        if task is None:
+            return
+        if kind == DONE:
+            task.result = payload
+        else:
+            task.error = payload
+        task.done.set()
+    
+    def _reap(self) -> None:
+        """Replace exited workers and requeue or fail their tasks."""
+        exited = [
+            worker for worker in list(self._workers.values())
+            if not worker.process.is_alive()
+        ]
+        if not exited or self._closed:
+            return
+        
+        # A worker's messages are flushed before it exits: read them first
+        # so a finished task is not mistaken for one lost in a crash
+        while True:
+            try:
+                self._handle(self._results.get_nowait())
+            except queue.Empty:
+                break
+        
+        with self._lock:
+            for worker in exited:
+                process = worker.process
+                process.join()
+                del self._workers[process.pid]
+                if worker.task is not None and not worker.started:
+                    self._backlog.appendleft(worker.task)
+                elif worker.task is not None:
+                    self.crashed += 1
+                    logger.error(f"Worker {process.pid} died with exit code {process.exitcode}")
+                    self._finish(
+                        worker.task[0], FAILED,
+                        f'Worker process exited with code {process.exitcode}'
+                    )
+                elif not worker.retiring:
+                    logger.error(f"Worker {process.pid} exited with code {process.exitcode}")
+                self._spawn()
+            self._dispatch()
+
+
+class ProcessDownloader:
+    """
+    ``YouTubeDownloader`` counterpart running the work in a ``WorkerPool``.
+    
+    Video info is cached in the web process, so repeated lookups never
+    reach a worker. Download progress relayed by the workers updates the
+    caller's progress record, the progress log and the download metrics as
+    if the download ran here.
+    """
+    
+    def __init__(
+        self,
+        pool: WorkerPool,
+        info_cache: Optional[TTLCache] = None,
+        download_cache: Optional[DownloadCache] = None,
+        events: Optional[ProgressEvents] = None,
+        log_interval: float = 5.0
+    ):
+        """
+        Initialize the downloader.
+        
+        Args:
+            pool: Worker processes doing the work.
+            info_cache: Optional cache for video metadata, keyed by video id.
+            download_cache: Optional index of finished files.
+            events: Optional progress event pipeline to publish to.
+            log_interval: Minimum seconds between progress log lines.
+        """
+        self.pool = pool
+        self.info_cache = info_cache
+        # Each worker keeps its own, only reused when it also ran the info lookup
+        self.extraction_cache = None
+        self.download_cache = download_cache
+        self.transcoder = None  # Workers encode themselves
+        self.bandwidth = None  # Workers schedule their own share
+        self.ydl_cache = None  # Shared on disk, counted by each worker
+        self.progress = DownloadProgress()
+        self.events = events or ProgressEvents()
+        self.events.subscribe(YouTubeDownloader._log_progress, interval=log_interval)
+    
+    def warm_pool(self, video_quality: str = 'best') -> None:
+        """
+        Start the worker processes, which warm their own YoutubeDL pools.
+        
+        Args:
+            video_quality: Unused; kept for ``YouTubeDownloader`` parity.
+        """
+        self.pool.start()
+    
+    def get_video_info(self, url: str) -> Dict:
+        """
+        Retrieve video information without downloading.
+        
+        Args:
+            url: YouTube video URL.
+        
+        Returns:
+            Dictionary containing video metadata.
+        
+        Raises:
+            WorkerError: If video info cannot be retrieved.
+        """
+        if self.info_cache is None:
+            return self.pool.call('get_video_info', (url,))
+        
+        key = YouTubeDownloader._cache_key(url)
+        info = self.info_cache.get(key)
+        if info is None:
+            info = self.pool.call('get_video_info', (url,))
+            self.info_cache.set(key, info)
+        return info
+    
+    def cached_video_info(self, url: str) -> Optional[Dict]:
+        """
+        Get video information only if it is already cached.
+        
+        Does not count as a cache lookup, so it can be used for estimates
+        without skewing the cache statistics.
+        
+        Args:
+            url: YouTube video URL.
+        
+        Returns:
+            Cached video metadata, or None.
+        """
+        if self.info_cache is None:
+            return None
+        return self.info_cache.peek(YouTubeDownloader._cache_key(url))
+    
+    def warm_ydl_cache(self, url: str) -> None:
+        """
+        Warm the shared yt-dlp cache directory from one worker.
+        
+        The other workers then load the player data from disk. See
+        ``YouTubeDownloader.warm_ydl_cache``.
+        
+        Args:
+            url: URL of any available video.
+        """
+        self.pool.call('warm_ydl_cache', (url,))
+    
+    def expand_urls(self, urls: List[str]) -> List[Dict]:
+        """
+        Expand video and playlist URLs into a list of videos.
+        
+        Args:
+            urls: YouTube video or playlist URLs.
+        
+        Returns:
+            See ``YouTubeDownloader.expand_urls``.
+        """
+        return self.pool.call('expand_urls', (urls,))
+    
+    def download_video(
+        self,
+        url: str,
+        quality: str = 'best',
+        filename: Optional[str] = None,
+        progress: Optional[DownloadProgress] = None,
+        client: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None
+    ) -> Dict:
+        """
+        Download a video, see ``YouTubeDownloader.download_video``.
+        
+        Raises:
+            WorkerError: If download fails.
+        """
+        return self._download(
+            'video', 'download_video', (url, quality, filename),
+            {'client': client, 'start': start, 'end': end}, progress
+        )
+    
+    def download_audio(
+        self,
+        url: str,
+        quality: str = '192',
+        filename: Optional[str] = None,
+        progress: Optional[DownloadProgress] = None,
+        audio_format: str = 'mp3',
+        client: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None
+    ) -> Dict:
+        """
+        Download audio, see ``YouTubeDownloader.download_audio``.
+        
+        Raises:
+            WorkerError: If download fails.
+        """
+        return self._download(
+            'audio', 'download_audio', (url, quality, filename),
+            {'audio_format': audio_format, 'client': client, 'start': start, 'end': end},
+            progress
+        )
+    
+    def download_stream(
+        self,
+        url: str,
+        download_type: str = 'audio',
+        quality: str = 'best',
+        filename: Optional[str] = None,
+        progress: Optional[DownloadProgress] = None,
+        client: Optional[str] = None
+    ) -> Dict:
+        """
+        Download a streamable format, see ``YouTubeDownloader.download_stream``.
+        
+        Raises:
+            WorkerError: If download fails.
+        """
+        return self._download(
+            'stream', 'download_stream', (url, download_type, quality, filename),
+            {'client': client}, progress
+        )
+    
+    def _download(
+        self,
+        download_type: str,
+        method: str,
+        args: Tuple,
+        kwargs: Dict,
+        progress: Optional[DownloadProgress]
+    ) -> Dict:
+        """
+        Run a download in a worker, mirroring its progress locally.
+        
+        Args:
+            download_type: 'video', 'audio' or 'stream', used as metrics label.
+            method: Name of the ``YouTubeDownloader`` method.
+            args: Positional arguments.
+            kwargs: Keyword arguments.
+            progress: Optional progress record to update.
+        
+        Returns:
+            Dictionary with download result information.
+        
+        Raises:
+            WorkerError: If download fails.
+        """
+        if progress is None:
+            progress = DownloadProgress()
+        self.progress = progress
+        meter = DownloadMeter(download_type)
+        
+        def relay(data: Dict) -> None:
+            meter.progress(data)
+            progress.update(data)
+            self.events.publish(ProgressEvent.from_hook(progress.job_id, data))
+        
+        try:
+            return self.pool.call(method, args, kwargs, on_progress=relay)
+        except WorkerError as e:
+            progress.error = str(e)
+            raise
+        finally:
+            meter.close()
+            progress.close()
+    
+    def get_progress(self) -> Dict:
+        """
+        Get current download progress.
+        
+        Returns:
+            Dictionary with current progress information.
+        """
+        return self.progress.to_dict()
@@ -0,0 +1,384 @@
+"""
+Job store module.
+
+This module persists download jobs and batches in a SQLite database so that
+their state survives restarts and is visible to every worker process: finished
+jobs and batches stay queryable and interrupted ones can be requeued.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from app.db import connect
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    path TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id);
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    kind TEXT,
+    urls TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    snapshot TEXT NOT NULL,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS batches_status ON batches (status);
+CREATE TABLE IF NOT EXISTS instances (
+    token TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+# Statuses of jobs that had not ended when the process stopped
+UNFINISHED = ('queued', 'running')
+
+# Statuses of batches that had not ended when the process stopped
+UNFINISHED_BATCHES = ('expanding', 'running')
+
+
+class JobStore:
+    """
+    Durable record of jobs, their parameters, state changes and results.
+    
+    The database runs in WAL mode (see ``app.db.connect``), so several
+    worker processes can share it. Each job is owned by the store instance
+    that last wrote it, identified by a random token rather than a pid,
+    which a restarted container may reuse. An instance holds a lease it
+    renews with ``heartbeat``; only jobs whose owner's lease has expired
+    count as interrupted. Batches are kept the same way, as a snapshot of
+    their progress next to what is needed to run them again.
+    """
+    
+    DB_FILENAME = '.jobs.sqlite3'
+    
+    def __init__(self, path: str, lease: float = 30.0):
+        """
+        Open (and if needed create) the store.
+        
+        Args:
+            path: Database file.
+            lease: Seconds without a heartbeat after which the jobs of an
+                instance are considered interrupted.
+        """
+        self.path = path
+        self.lease = lease
+        self.instance = str(uuid.uuid4())
+        self._conn = connect(path, SCHEMA)
+        self._lock = threading.Lock()
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'owner' not in columns:
+            # Databases created before jobs had owners
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+        now = time.time()
+        self._conn.execute(
+            'INSERT INTO instances (token, pid, started_at, heartbeat) VALUES (?, ?, ?, ?)',
+            (self.instance, os.getpid(), now, now)
+        )
+    
+    def heartbeat(self) -> None:
+        """Renew the lease of this instance on the jobs it owns."""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE instances SET heartbeat = ? WHERE token = ?',
+                (time.time(), self.instance)
+            )
+    
+    def save(self, record: Dict) -> None:
+        """
+        Write the current state of a job and log the state change.
+        
+        Args:
+            record: Job fields as returned by ``Job.to_record``.
+        """
+        result = record.get('result')
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN')
+            self._conn.execute(
+                """
+                INSERT INTO jobs (
+                    id, kind, params, status, result, error, path, attempts,
+                    owner, created_at, started_at, finished_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    kind = excluded.kind,
+                    params = excluded.params,
+                    status = excluded.status,
+                    result = excluded.result,
+                    error = excluded.error,
+                    path = excluded.path,
+                    attempts = jobs.attempts + excluded.attempts,
+                    owner = excluded.owner,
+                    started_at = excluded.started_at,
+                    finished_at = excluded.finished_at
+                """,
+                (
+                    record['id'],
+                    record.get('kind'),
+                    json.dumps(record['params']),
+                    record['status'],
+                    json.dumps(result) if result is not None else None,
+                    record.get('error'),
+                    result.get('path') if isinstance(result, dict) else None,
+                    1 if record['status'] == 'running' else 0,
+                    self.instance,
+                    record['created_at'],
+                    record.get('started_at'),
+                    record.get('finished_at'),
+                )
+            )
+            self._conn.execute(
+                'INSERT INTO job_events (job_id, status, at) VALUES (?, ?, ?)',
+                (record['id'], record['status'], now)
+            )
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        Load a job.
+        
+        Args:
+            job_id: Job identifier.
+        
+        Returns:
+            Job fields, or None if the job is unknown.
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._decode(row) if row is not None else None
+    
+    def interrupted(self) -> List[Dict]:
+        """
+        Load the jobs left queued or running by instances that are gone.
+        
+        An instance is gone once its lease has expired, or if it is unknown
+        (jobs written before instances were recorded).
+        
+        Returns:
+            Job fields, oldest first.
+        """
+        return [self._decode(row) for row in self._orphans('jobs', UNFINISHED)]
+    
+    def claim(self, record: Dict) -> bool:
+        """
+        Take over an interrupted job, unless another process did first.
+        
+        Args:
+            record: Job fields as returned by ``interrupted``.
+        
+        Returns:
+            True if this instance now owns the job.
+        """
+        return self._claim('jobs', record)
+    
+    def save_batch(self, record: Dict) -> None:
+        """
+        Write the current state of a batch.
+        
+        Args:
+            record: Batch fields as returned by ``Batch.to_record``.
+        """
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO batches (
+                    id, kind, urls, params, status, snapshot, owner,
+                    created_at, finished_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    status = excluded.status,
+                    snapshot = excluded.snapshot,
+                    owner = excluded.owner,
+                    finished_at = excluded.finished_at
+                """,
+                (
+                    record['id'],
+                    record.get('kind'),
+                    json.dumps(record['urls']),
+                    json.dumps(record['params']),
+                    record['status'],
+                    json.dumps(record['snapshot']),
+                    self.instance,
+                    record['created_at'],
+                    record.get('finished_at'),
+                )
+            )
+    
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        """
+        Load a batch.
+        
+        Args:
+            batch_id: Batch identifier.
+        
+        Returns:
+            Batch fields, or None if the batch is unknown.
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM batches WHERE id = ?', (batch_id,)).fetchone()
+        return self._decode_batch(row) if row is not None else None
+    
+    def interrupted_batches(self) -> List[Dict]:
+        """
+        Load the batches left unfinished by instances that are gone.
+        
+        Returns:
+            Batch fields, oldest first.
+        """
+        return [self._decode_batch(row) for row in self._orphans('batches', UNFINISHED_BATCHES)]
+    
+    def claim_batch(self, record: Dict) -> bool:
+        """
+        Take over an interrupted batch, unless another process did first.
+        
+        Args:
+            record: Batch fields as returned by ``interrupted_batches``.
+        
+        Returns:
+            True if this instance now owns the batch.
+        """
+        return self._claim('batches', record)
+    
+    def _orphans(self, table: str, statuses: Tuple[str, ...]) -> List[sqlite3.Row]:
+        """
+        Select the unfinished rows of a table whose owner's lease expired.
+        
+        Args:
+            table: 'jobs' or 'batches'.
+            statuses: Statuses of unfinished rows.
+        
+        Returns:
+            Matching rows, oldest first.
+        """
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT {table}.* FROM {table} LEFT JOIN instances ON instances.token = {table}.owner "
+                f"WHERE {table}.status IN ({', '.join('?' * len(statuses))}) "
+                f"AND {table}.owner IS NOT ? "
+                f"AND (instances.token IS NULL OR instances.heartbeat < ?) "
+                f"ORDER BY {table}.created_at",
+                (*statuses, self.instance, time.time() - self.lease)
+            ).fetchall()
+    
+    def _claim(self, table: str, record: Dict) -> bool:
+        """
+        Change the owner of a row to this instance if it is still unchanged.
+        
+        Args:
+            table: 'jobs' or 'batches'.
+            record: Fields of the row, with its current ``owner``.
+        
+        Returns:
+            True if this instance now owns the row.
+        """
+        with self._lock:
+            claimed = self._conn.execute(
+                f'UPDATE {table} SET owner = ? WHERE id = ? AND owner IS ?',
+                (self.instance, record['id'], record['owner'])
+            ).rowcount
+        return claimed == 1
+    
+    def events(self, job_id: str) -> List[Tuple[str, float]]:
+        """
+        Get the state changes of a job.
+        
+        Args:
+            job_id: Job identifier.
+        
+        Returns:
+            (status, timestamp) pairs in order.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT status, at FROM job_events WHERE job_id = ? ORDER BY rowid',
+                (job_id,)
+            ).fetchall()
+        return [(row['status'], row['at']) for row in rows]
+    
+    def delete(self, job_id: str) -> None:
+        """
+        Forget a job, e.g. one that was never accepted.
+        
+        Args:
+            job_id: Job identifier.
+        """
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN')
+            self._conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            self._conn.execute('DELETE FROM job_events WHERE job_id = ?', (job_id,))
+    
+    def prune(self, cutoff: float) -> int:
+        """
+        Delete jobs and batches that finished before a point in time, and
+        instances whose lease expired before it.
+        
+        Args:
+            cutoff: Timestamp; older finished jobs are deleted.
+        
+        Returns:
+            Number of jobs deleted.
+        """
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN')
+            self._conn.execute(
+                'DELETE FROM job_events WHERE job_id IN '
+                '(SELECT id FROM jobs WHERE finished_at < ?)',
+                (cutoff,)
+            )
+            deleted = self._conn.execute(
+                'DELETE FROM jobs WHERE finished_at < ?', (cutoff,)
+            ).rowcount
+            self._conn.execute('DELETE FROM batches WHERE finished_at < ?', (cutoff,))
+            self._conn.execute(
+                'DELETE FROM instances WHERE heartbeat < ? AND token != ?',
+                (min(cutoff, time.time() - self.lease), self.instance)
+            )
+        return deleted
+    
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict:
+        """Convert a database row to job fields."""
+        record = dict(row)
+        record['params'] = json.loads(record['params'])
+        if record['result'] is not None:
+            record['result'] = json.loads(record['result'])
+        return record
+    
+    @staticmethod
+    def _decode_batch(row: sqlite3.Row) -> Dict:
+        """Convert a database row to batch fields."""
+        record = dict(row)
+        for name in ('urls', 'params', 'snapshot'):
+            record[name] = json.loads(record[name])
+        return record
@@ -0,0 +1,434 @@
+"""
+Background job module.
+
+This module provides a bounded job queue and worker pool so that long-running
+downloads are executed outside of the Flask request threads.
+"""
+
+import time
+import uuid
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.job_store import JobStore
+from app.scheduler import DEFAULT_LANE, JobScheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be accepted because the queue is full."""
+
+
+def new_job_id() -> str:
+    """
+    Allocate a unique job identifier.
+    
+    Returns:
+        Hex job id.
+    """
+    return uuid.uuid4().hex
+
+
+class Job:
+    """A unit of work executed by the job manager."""
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    
+    def __init__(
+        self,
+        func: Optional[Callable[..., Dict]],
+        params: Dict[str, Any],
+        job_id: Optional[str] = None,
+        kind: Optional[str] = None
+    ):
+        """
+        Initialize a job.
+        
+        Args:
+            func: Callable invoked with ``params`` as keyword arguments.
+            params: Job parameters (also reported back to the client).
+            job_id: Optional pre-allocated identifier.
+            kind: Optional name of the kind of work, which together with
+                ``params`` describes the job well enough to rebuild
+                ``func`` after a restart.
+        """
+        self.id: str = job_id or new_job_id()
+        self.func = func
+        self.params = params
+        self.kind = kind
+        self.status: str = self.QUEUED
+        self.lane: str = DEFAULT_LANE
+        self.cost: float = 0.0
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at: float = time.time()
+        self.queued_at: float = self.created_at
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+    
+    @property
+    def done(self) -> bool:
+        """Whether the job has reached a terminal state."""
+        return self.status in (self.FINISHED, self.FAILED)
+    
+    @property
+    def wait_time(self) -> Optional[float]:
+        """Seconds the job waited for a worker, None if it never started."""
+        if self.status == self.QUEUED:
+            return time.time() - self.queued_at
+        if self.started_at is None:
+            return None
+        return max(0.0, self.started_at - self.queued_at)
+    
+    @classmethod
+    def from_record(cls, record: Dict) -> 'Job':
+        """
+        Rebuild a job from its stored fields, without a callable.
+        
+        Args:
+            record: Job fields as loaded from a ``JobStore``.
+        
+        Returns:
+            The job.
+        """
+        job = cls(None, record['params'], record['id'], record.get('kind'))
+        job.status = record['status']
+        job.result = record.get('result')
+        job.error = record.get('error')
+        job.created_at = record['created_at']
+        job.queued_at = job.created_at
+        job.started_at = record.get('started_at')
+        job.finished_at = record.get('finished_at')
+        return job
+    
+    def to_record(self) -> Dict:
+        """
+        Get the fields persisted in a ``JobStore``.
+        
+        Returns:
+            Dictionary of job fields.
+        """
+        return {**self.to_dict(), 'id': self.id, 'kind': self.kind}
+    
+    def to_dict(self) -> Dict:
+        """
+        Convert job to dictionary for JSON serialization.
+        
+        Returns:
+            Dictionary representation of the job.
+        """
+        wait_time = self.wait_time
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'params': self.params,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'lane': self.lane,
+            'cost': round(self.cost, 1),
+            'wait_time': round(wait_time, 3) if wait_time is not None else None,
+        }
+
+
+class JobManager:
+    """
+    Bounded job queue served by a fixed pool of worker threads.
+    
+    Jobs run in arrival order unless an ``estimate`` function assigns them
+    a lane and a cost, in which case the cheapest ones run first (see
+    ``JobScheduler``).
+    """
+    
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_size: int = 50,
+        retention: float = 3600.0,
+        store: Optional[JobStore] = None,
+        estimate: Optional[Callable[[Job], Tuple[str, float]]] = None,
+        aging: float = 0.0,
+        max_attempts: int = 3
+    ):
+        """
+        Initialize the job manager and start its workers.
+        
+        Args:
+            workers: Number of worker threads.
+            queue_size: Maximum number of jobs waiting to be executed.
+            retention: Seconds a finished job stays queryable.
+            store: Optional durable store every state change is written
+                to, so jobs survive a restart (see ``recover``).
+            estimate: Optional function returning the lane and the cost of
+                a job when it is queued.
+            aging: Cost forgiven per second a job waits, so that costly
+                jobs are not postponed forever.
+            max_attempts: Times a stored job may start before ``recover``
+                gives up on it, so a job that kills its process is not
+                resumed forever. 0 for no limit.
+        """
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.retention = retention
+        self.store = store
+        self.estimate = estimate
+        self.max_attempts = max_attempts
+        self._queue = JobScheduler(self.queue_size, aging)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._active = 0
+        self._resolve: Optional[Callable[[Job], Optional[Callable[..., Dict]]]] = None
+        self._threads = []
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f'job-worker-{index}',
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        if store is not None:
+            thread = threading.Thread(target=self._renew, name='job-lease', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def submit(
+        self,
+        func: Callable[..., Dict],
+        job_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        **params: Any
+    ) -> Job:
+        """
+        Enqueue a job.
+        
+        Args:
+            func: Callable executing the work.
+            job_id: Optional pre-allocated identifier (see ``new_job_id``).
+            kind: Optional kind of work, stored for ``recover``.
+            **params: Keyword arguments passed to ``func``. They must be
+                JSON-serializable when a store is used.
+        
+        Returns:
+            The queued job.
+        
+        Raises:
+            QueueFullError: If the queue is at capacity.
+        """
+        job = Job(func, params, job_id, kind)
+        self._prune()
+        self._enqueue(job)
+        return job
+    
+    def recover(self, resolve: Callable[[Job], Optional[Callable[..., Dict]]]) -> int:
+        """
+        Requeue the jobs the store shows as queued or running.
+        
+        Called at startup, and then again on every lease renewal: those jobs
+        were interrupted by the process that ran them stopping, which may
+        only show once its lease expires. With several worker processes,
+        each job is taken over by exactly one of them. Jobs that cannot be
+        rebuilt, already started ``max_attempts`` times or do not fit in the
+        queue are marked as failed.
+        
+        Args:
+            resolve: Returns the callable of a stored job (from its
+                ``kind`` and ``params``), or None if it cannot be resumed.
+        
+        Returns:
+            Number of jobs requeued.
+        """
+        if self.store is None:
+            return 0
+        self._resolve = resolve
+        
+        requeued = 0
+        for record in self.store.interrupted():
+            if not self.store.claim(record):
+                continue  # Recovered by another worker process
+            job = Job.from_record(record)
+            job.status = Job.QUEUED
+            job.started_at = None
+            if self.max_attempts and record.get('attempts', 0) >= self.max_attempts:
+                self._fail(job, f'Interrupted {record["attempts"]} times, giving up')
+                continue
+            try:
+                job.func = resolve(job)
+            except Exception as e:
+                logger.error(f"Cannot rebuild job {job.id}: {str(e)}")
+            if job.func is None:
+                self._fail(job, 'Interrupted by a restart')
+                continue
+            try:
+                self._enqueue(job)
+                requeued += 1
+            except QueueFullError:
+                self._fail(job, 'Interrupted by a restart and the queue is full')
+        
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted jobs")
+        return requeued
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Look up a job by id, falling back to the store.
+        
+        Args:
+            job_id: Job identifier.
+        
+        Returns:
+            The job, or None if unknown or expired.
+        """
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            record = self.store.get(job_id)
+            if record is not None:
+                job = Job.from_record(record)
+        return job
+    
+    def stats(self) -> Dict:
+        """
+        Get queue statistics.
+        
+        Returns:
+            Dictionary with queue depth, worker utilisation and the waiting
+            and running jobs of each lane.
+        """
+        return {
+            'queued': self._queue.qsize(),
+            'active': self._active,
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'lanes': self._queue.stats(),
+        }
+    
+    def _renew(self) -> None:
+        """Lease loop renewing the store lease and picking up orphaned jobs."""
+        while True:
+            time.sleep(self.store.lease / 3)
+            try:
+                self.store.heartbeat()
+                if self._resolve is not None:
+                    self.recover(self._resolve)
+            except Exception as e:
+                logger.error(f"Could not renew the job lease: {str(e)}")
+    
+    def _worker(self) -> None:
+        """Worker loop executing queued jobs."""
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._active += 1
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                self._queue.done(job)
+    
+    def _enqueue(self, job: Job) -> None:
+        """
+        Register and queue a job.
+        
+        Args:
+            job: Job to queue.
+        
+        Raises:
+            QueueFullError: If the queue is at capacity.
+        """
+        job.queued_at = time.time()
+        if self.estimate is not None:
+            try:
+                job.lane, job.cost = self.estimate(job)
+            except Exception as e:
+                logger.error(f"Cannot estimate job {job.id}: {str(e)}")
+        with self._lock:
+            self._jobs[job.id] = job
+        # Stored before a worker can pick it up, so states are written in order
+        self._record(job)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            if self.store is not None:
+                self.store.delete(job.id)
+            raise QueueFullError('Download queue is full, please retry later')
+        logger.info(f"Queued job {job.id} in lane {job.lane} (cost {job.cost:.0f})")
+    
+    def _run(self, job: Job) -> None:
+        """
+        Execute a single job and record its outcome.
+        
+        Args:
+            job: Job to execute.
+        """
+        job.status = Job.RUNNING
+        job.started_at = time.time()
+        self._record(job)
+        logger.info(f"Started job {job.id} after waiting {job.wait_time:.1f}s")
+        try:
+            job.result = job.func(**job.params)
+            job.status = Job.FINISHED
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = Job.FAILED
+        finally:
+            job.finished_at = time.time()
+            self._record(job)
+    
+    def _fail(self, job: Job, error: str) -> None:
+        """
+        Mark a job that will not run as failed.
+        
+        Args:
+            job: Job to fail.
+            error: Reason reported to the client.
+        """
+        logger.warning(f"Job {job.id} failed: {error}")
+        job.status = Job.FAILED
+        job.error = error
+        job.finished_at = time.time()
+        self._record(job)
+    
+    def _record(self, job: Job) -> None:
+        """
+        Write a job's state to the store, if any.
+        
+        A store failure is logged rather than raised so that it never
+        fails the download itself.
+        
+        Args:
+            job: Job whose state changed.
+        """
+        if self.store is None:
+            return
+        try:
+            self.store.save(job.to_record())
+        except Exception as e:
+            logger.error(f"Could not store job {job.id}: {str(e)}")
+    
+    def _prune(self) -> None:
+        """Drop finished jobs older than the retention period."""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.done and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        if self.store is not None:
+            try:
+                self.store.prune(cutoff)
+            except Exception as e:
+                logger.error(f"Could not prune stored jobs: {str(e)}")
@@ -0,0 +1,493 @@
+"""
+Metrics module.
+
+This module provides counters, gauges and histograms rendered in the
+Prometheus text exposition format, plus the application's metric series.
+
+Counters and histograms are sharded per thread: each thread only ever writes
+its own shard, so recording needs no lock and never contends with other
+threads or with a scrape. Shards are summed when metrics are rendered.
+"""
+
+import time
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+Labels = Tuple[str, ...]
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets for long operations (extractions, downloads, conversions) in seconds
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the exposition format."""
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = '') -> str:
+    """Format a label set, e.g. ``{route="/",method="GET"}``."""
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value."""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Shards:
+    """Per-thread dictionaries of a metric, merged on collection."""
+    
+    def __init__(self):
+        """Initialize the shard set."""
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, Dict]] = []
+        self._retired: Dict = {}
+        self._lock = threading.Lock()
+    
+    def shard(self) -> Dict:
+        """
+        Get the calling thread's shard.
+        
+        Returns:
+            Dictionary only the calling thread writes to.
+        """
+        try:
+            return self._local.values
+        except AttributeError:
+            values: Dict = {}
+            self._local.values = values
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            return values
+    
+    def collect(self, merge: Callable[[object, object], object]) -> Dict:
+        """
+        Merge all shards.
+        
+        Shards of finished threads are folded into a single retired shard,
+        so short-lived request threads do not accumulate.
+        
+        Args:
+            merge: Function combining two values of the same label set.
+        
+        Returns:
+            Dictionary of merged values per label set.
+        """
+        with self._lock:
+            alive = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    self._fold(self._retired, values.copy(), merge)
+            self._shards = alive
+            result = dict(self._retired)
+            for _, values in alive:
+                # dict.copy() is atomic, so the owner may keep writing
+                self._fold(result, values.copy(), merge)
+        return result
+    
+    @staticmethod
+    def _fold(target: Dict, values: Dict, merge: Callable[[object, object], object]) -> None:
+        """Merge ``values`` into ``target``."""
+        for labels, value in values.items():
+            target[labels] = merge(target[labels], value) if labels in target else value
+
+
+class Metric:
+    """Base class of a named metric with label names."""
+    
+    TYPE = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        """
+        Initialize the metric.
+        
+        Args:
+            name: Metric name.
+            documentation: HELP text.
+            labelnames: Names of the labels of each series.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+    
+    def render(self) -> List[str]:
+        """
+        Render the metric in the text exposition format.
+        
+        Returns:
+            Lines of the metric, including HELP and TYPE.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.TYPE}']
+        lines.extend(self._samples())
+        return lines
+    
+    def _samples(self) -> List[str]:
+        """Render the sample lines."""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing counter with lock-free per-thread shards."""
+    
+    TYPE = 'counter'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        """Initialize the counter (see ``Metric``)."""
+        super().__init__(name, documentation, labelnames)
+        self._shards = _Shards()
+    
+    def inc(self, amount: float = 1, labels: Labels = ()) -> None:
+        """
+        Increase the counter.
+        
+        Args:
+            amount: Non-negative increment.
+            labels: Label values, in ``labelnames`` order.
+        """
+        shard = self._shards.shard()
+        shard[labels] = shard.get(labels, 0) + amount
+    
+    def values(self) -> Dict[Labels, float]:
+        """
+        Get the current totals.
+        
+        Returns:
+            Total per label set.
+        """
+        return self._shards.collect(lambda a, b: a + b)
+    
+    def _samples(self) -> List[str]:
+        """Render the sample lines."""
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+            for labels, value in sorted(self.values().items())
+        ]
+
+
+class Histogram(Metric):
+    """Histogram with fixed buckets and lock-free per-thread shards."""
+    
+    TYPE = 'histogram'
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        """
+        Initialize the histogram.
+        
+        Args:
+            name: Metric name.
+            documentation: HELP text.
+            labelnames: Names of the labels of each series.
+            buckets: Sorted upper bounds of the buckets (``+Inf`` is implied).
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._shards = _Shards()
+    
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        """
+        Record an observation.
+        
+        Args:
+            value: Observed value.
+            labels: Label values, in ``labelnames`` order.
+        """
+        shard = self._shards.shard()
+        state = shard.get(labels)
+        if state is None:
+            # One count per bucket plus +Inf, then sum
+            state = [0] * (len(self.buckets) + 1) + [0.0]
+            shard[labels] = state
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+    
+    def _samples(self) -> List[str]:
+        """Render the sample lines."""
+        merged = self._shards.collect(lambda a, b: [x + y for x, y in zip(a, b)])
+        lines = []
+        bounds = self.buckets + (float('inf'),)
+        for labels, state in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}'
+                )
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_str} {_format_value(state[-1])}')
+            lines.append(f'{self.name}_count{label_str} {cumulative}')
+        return lines
+    
+    def time(self, labels: Labels = ()) -> '_Timer':
+        """
+        Time a block of code.
+        
+        Args:
+            labels: Label values, in ``labelnames`` order.
+        
+        Returns:
+            Context manager observing the elapsed seconds on exit.
+        """
+        return _Timer(self, labels)
+
+
+class _Timer:
+    """Context manager recording its duration into a histogram."""
+    
+    __slots__ = ('histogram', 'labels', 'start')
+    
+    def __init__(self, histogram: Histogram, labels: Labels):
+        """Initialize the timer."""
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+    
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+
+class Gauge(Metric):
+    """Gauge whose values are set when metrics are scraped."""
+    
+    TYPE = 'gauge'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        """Initialize the gauge (see ``Metric``)."""
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+    
+    def set(self, value: float, labels: Labels = ()) -> None:
+        """
+        Set the value of a series.
+        
+        Args:
+            value: New value.
+            labels: Label values, in ``labelnames`` order.
+        """
+        self._values[labels] = value
+    
+    def _samples(self) -> List[str]:
+        """Render the sample lines."""
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class SampledCounter(Gauge):
+    """
+    Counter whose totals are kept by another component and copied in when
+    metrics are scraped, like a gauge, but exposed with the counter type.
+    """
+    
+    TYPE = 'counter'
+
+
+class DownloadMeter:
+    """
+    Per-download accounting fed by yt-dlp progress and postprocessor hooks.
+    
+    Only a subtraction and a counter increment happen per progress
+    callback; everything else is done once per file.
+    """
+    
+    __slots__ = ('download_type', 'started_at', 'first_byte_at', 'filename', 'downloaded', 'pp_started')
+    
+    def __init__(self, download_type: str):
+        """
+        Initialize the meter and register it as active.
+        
+        Args:
+            download_type: 'video', 'audio' or 'stream', used as label.
+        """
+        self.download_type = download_type
+        self.started_at = time.perf_counter()
+        self.first_byte_at: Optional[float] = None
+        self.filename: Optional[str] = None
+        self.downloaded = 0
+        self.pp_started: Dict[str, float] = {}
+        ACTIVE_DOWNLOADS[id(self)] = 0.0
+    
+    def progress(self, data: Dict) -> None:
+        """
+        Handle a yt-dlp progress hook call.
+        
+        Args:
+            data: Progress data from yt-dlp.
+        """
+        status = data.get('status')
+        if status == 'downloading':
+            if self.first_byte_at is None:
+                self.first_byte_at = time.perf_counter()
+                PHASE_SECONDS.observe(
+                    self.first_byte_at - self.started_at, (self.download_type, 'extract')
+                )
+            filename = data.get('filename')
+            if filename != self.filename:
+                self.filename = filename
+                self.downloaded = 0
+            downloaded = data.get('downloaded_bytes') or 0
+            if downloaded > self.downloaded:
+                DOWNLOADED_BYTES.inc(downloaded - self.downloaded, (self.download_type,))
+                self.downloaded = downloaded
+            ACTIVE_DOWNLOADS[id(self)] = data.get('speed') or 0.0
+        elif status == 'finished':
+            total = data.get('downloaded_bytes') or data.get('total_bytes') or 0
+            if total > self.downloaded and data.get('filename') == self.filename:
+                DOWNLOADED_BYTES.inc(total - self.downloaded, (self.download_type,))
+            self.filename = None
+            self.downloaded = 0
+            if data.get('elapsed'):
+                PHASE_SECONDS.observe(data['elapsed'], (self.download_type, 'download'))
+            ACTIVE_DOWNLOADS[id(self)] = 0.0
+    
+    def postprocessor(self, data: Dict) -> None:
+        """
+        Handle a yt-dlp postprocessor hook call.
+        
+        Args:
+            data: Postprocessor data from yt-dlp.
+        """
+        name = data.get('postprocessor', 'unknown')
+        status = data.get('status')
+        if status == 'started':
+            self.pp_started[name] = time.perf_counter()
+        elif status == 'finished' and name in self.pp_started:
+            POSTPROCESS_SECONDS.observe(
+                time.perf_counter() - self.pp_started.pop(name), (name,)
+            )
+    
+    def close(self) -> None:
+        """Unregister the meter."""
+        ACTIVE_DOWNLOADS.pop(id(self), None)
+
+
+# Current speed (bytes/s) of each running download, keyed by meter id
+ACTIVE_DOWNLOADS: Dict[int, float] = {}
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'Time to produce the response headers, per route.',
+    ('route', 'method', 'status')
+)
+PHASE_SECONDS = Histogram(
+    'ytdl_phase_duration_seconds',
+    'Duration of yt-dlp work by phase: info (metadata extraction), '
+    'extract (job start to first byte) and download (per file).',
+    ('type', 'phase'),
+    DURATION_BUCKETS
+)
+POSTPROCESS_SECONDS = Histogram(
+    'ytdl_postprocess_duration_seconds',
+    'Duration of FFmpeg post-processing steps.',
+    ('postprocessor',),
+    DURATION_BUCKETS
+)
+DOWNLOADED_BYTES = Counter(
+    'ytdl_downloaded_bytes_total',
+    'Bytes downloaded from the source.',
+    ('type',)
+)
+DOWNLOAD_SPEED = Gauge(
+    'ytdl_download_speed_bytes',
+    'Current aggregate download speed in bytes per second.'
+)
+DOWNLOADS_ACTIVE = Gauge(
+    'ytdl_downloads_active',
+    'Number of running yt-dlp downloads.'
+)
+QUEUE_DEPTH = Gauge(
+    'job_queue_depth',
+    'Jobs waiting for a worker.',
+    ('queue',)
+)
+WORKERS_ACTIVE = Gauge(
+    'job_workers_active',
+    'Workers executing a job.',
+    ('queue',)
+)
+WORKERS = Gauge(
+    'job_workers',
+    'Configured workers.',
+    ('queue',)
+)
+CACHE_REQUESTS = SampledCounter(
+    'cache_requests_total',
+    'Cache lookups since startup by result.',
+    ('cache', 'result')
+)
+CACHE_HIT_RATIO = Gauge(
+    'cache_hit_ratio',
+    'Share of cache lookups that were hits.',
+    ('cache',)
+)
+STORAGE_BYTES = Gauge(
+    'storage_usage_bytes',
+    'Bytes used by the downloads folder at the last sweep.'
+)
+BANDWIDTH_THROTTLED = SampledCounter(
+    'ytdl_bandwidth_throttled_seconds_total',
+    'Total time downloads were held back to their bandwidth share.'
+)
+WORKER_RESTARTS = SampledCounter(
+    'download_worker_restarts_total',
+    'Download worker processes replaced since startup, by reason.',
+    ('reason',)
+)
+YDL_CACHE_EXTRACTIONS = SampledCounter(
+    'ytdl_cache_extractions_total',
+    'Extractions since startup that found the player data cached (warm) '
+    'or had to fetch it (cold).',
+    ('result',)
+)
+
+ALL_METRICS: List[Metric] = [
+    REQUEST_SECONDS, PHASE_SECONDS, POSTPROCESS_SECONDS, DOWNLOADED_BYTES,
+    DOWNLOAD_SPEED, DOWNLOADS_ACTIVE, QUEUE_DEPTH, WORKERS_ACTIVE, WORKERS,
+    CACHE_REQUESTS, CACHE_HIT_RATIO, STORAGE_BYTES, BANDWIDTH_THROTTLED,
+    WORKER_RESTARTS, YDL_CACHE_EXTRACTIONS,
+]
+
+
+def render(metrics: Iterable[Metric] = ()) -> str:
+    """
+    Render metrics in the Prometheus text exposition format.
+    
+    Args:
+        metrics: Metrics to render; all application metrics if empty.
+    
+    Returns:
+        Exposition text.
+    """
+    speeds = list(ACTIVE_DOWNLOADS.values())
+    DOWNLOAD_SPEED.set(sum(speeds))
+    DOWNLOADS_ACTIVE.set(len(speeds))
+    
+    lines = []
+    for metric in metrics or ALL_METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
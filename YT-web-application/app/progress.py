@@ -0,0 +1,430 @@
+"""
+Progress registry module.
+
+This module keeps one progress record per download job so that concurrent
+downloads do not overwrite each other's progress. Records can be mirrored to
+SQLite so that a job started by one worker process can be polled through any
+other.
+"""
+
+import json
+import time
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from app.db import connect
+from app.downloader import DownloadProgress
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    job_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    path TEXT,
+    version INTEGER NOT NULL,
+    closed_at REAL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+# Sentinel distinguishing "never sent" from a sent ``None`` value
+_MISSING = object()
+
+
+class ProgressStore:
+    """
+    Progress snapshots shared by all worker processes.
+    
+    Only the process running a download writes its row; every other process
+    reads it through a ``RemoteProgress``.
+    """
+    
+    DB_FILENAME = '.progress.sqlite3'
+    
+    def __init__(self, path: str):
+        """
+        Open (and if needed create) the store.
+        
+        Args:
+            path: Database file.
+        """
+        self.path = path
+        self._conn = connect(path, SCHEMA)
+        self._lock = threading.Lock()
+    
+    def write(self, records: Iterable[Tuple[str, DownloadProgress]]) -> None:
+        """
+        Write snapshots of several records in one transaction.
+        
+        Args:
+            records: (job id, progress record) pairs.
+        """
+        now = time.time()
+        rows = [
+            (
+                job_id,
+                json.dumps(progress.to_dict()),
+                progress.filename or None,
+                progress.version,
+                progress.closed_at,
+                now,
+            )
+            for job_id, progress in records
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN')
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO progress '
+                '(job_id, state, path, version, closed_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+    
+    def read(self, job_id: str) -> Optional[Dict]:
+        """
+        Read the latest snapshot of a job.
+        
+        Args:
+            job_id: Job identifier.
+        
+        Returns:
+            Dictionary with ``state`` (as returned by
+            ``DownloadProgress.to_dict``), ``path``, ``version`` and
+            ``closed_at``, or None if the job is unknown.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT state, path, version, closed_at FROM progress WHERE job_id = ?',
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'state': json.loads(row['state']),
+            'path': row['path'] or '',
+            'version': row['version'],
+            'closed_at': row['closed_at'],
+        }
+    
+    def prune(self, cutoff: float) -> int:
+        """
+        Delete snapshots of downloads closed before a point in time.
+        
+        Args:
+            cutoff: Timestamp; older closed snapshots are deleted.
+        
+        Returns:
+            Number of snapshots deleted.
+        """
+        with self._lock:
+            return self._conn.execute(
+                'DELETE FROM progress WHERE closed_at < ?', (cutoff,)
+            ).rowcount
+
+
+class RemoteProgress:
+    """
+    Read-only view of a download running in another worker process.
+    
+    Offers the attributes of ``DownloadProgress`` that readers use and
+    re-reads the store at most every ``refresh_interval`` seconds.
+    """
+    
+    def __init__(
+        self,
+        store: ProgressStore,
+        job_id: str,
+        snapshot: Dict,
+        refresh_interval: float = 0.2
+    ):
+        """
+        Initialize the view.
+        
+        Args:
+            store: Store holding the job's snapshots.
+            job_id: Job identifier.
+            snapshot: Snapshot as returned by ``ProgressStore.read``.
+            refresh_interval: Minimum seconds between two reads.
+        """
+        self.store = store
+        self.job_id = job_id
+        self.refresh_interval = refresh_interval
+        self._snapshot = snapshot
+        self._read_at = time.monotonic()
+    
+    def _current(self) -> Dict:
+        """Get the latest snapshot, reading the store if it is due."""
+        now = time.monotonic()
+        if self._snapshot['closed_at'] is None and now - self._read_at >= self.refresh_interval:
+            self._snapshot = self.store.read(self.job_id) or self._snapshot
+            self._read_at = now
+        return self._snapshot
+    
+    @property
+    def status(self) -> str:
+        """Download status."""
+        return self._current()['state']['status']
+    
+    @property
+    def percentage(self) -> float:
+        """Downloaded share in percent."""
+        return self._current()['state']['percentage']
+    
+    @property
+    def filename(self) -> str:
+        """Full path of the file being written."""
+        return self._current()['path']
+    
+    @property
+    def error(self) -> Optional[str]:
+        """Error message of a failed download."""
+        return self._current()['state']['error']
+    
+    @property
+    def closed_at(self) -> Optional[float]:
+        """Time the download ended, or None while it runs."""
+        return self._current()['closed_at']
+    
+    @property
+    def version(self) -> int:
+        """Change counter of the record."""
+        return self._current()['version']
+    
+    def to_dict(self) -> Dict:
+        """
+        Convert progress to dictionary for JSON serialization.
+        
+        Returns:
+            Dictionary representation of progress.
+        """
+        return dict(self._current()['state'])
+
+
+class ProgressRegistry:
+    """
+    Thread-safe mapping of job ids to their progress records.
+    
+    Writers (record creation and expiry) are serialized by a private lock.
+    Readers only perform a single dictionary lookup, which is atomic, so
+    polling never contends with the yt-dlp progress hooks that update the
+    records in place.
+    
+    With a store, a background thread mirrors changed records into it every
+    ``sync_interval`` seconds, and jobs unknown to this process are looked
+    up there, so any worker process can report any job's progress.
+    """
+    
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        store: Optional[ProgressStore] = None,
+        sync_interval: float = 0.5
+    ):
+        """
+        Initialize the registry.
+        
+        Args:
+            ttl: Seconds a closed record remains readable.
+            store: Optional store shared with other worker processes.
+            sync_interval: Seconds between two writes to the store.
+        """
+        self.ttl = ttl
+        self.store = store
+        self.sync_interval = sync_interval
+        self._records: Dict[str, DownloadProgress] = {}
+        self._synced: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    def create(self, job_id: str) -> DownloadProgress:
+        """
+        Create and register a progress record for a job.
+        
+        Args:
+            job_id: Job identifier.
+        
+        Returns:
+            The new progress record.
+        """
+        progress = DownloadProgress(job_id)
+        with self._lock:
+            self._expire()
+            self._records[job_id] = progress
+        if self.store is not None and self._thread is None:
+            self._start()
+        return progress
+    
+    def get(self, job_id: str) -> Optional[DownloadProgress]:
+        """
+        Look up the progress record of a job.
+        
+        Args:
+            job_id: Job identifier.
+        
+        Returns:
+            The progress record (a ``RemoteProgress`` for a job of another
+            worker process), or None if unknown or expired.
+        """
+        progress = self._records.get(job_id)
+        if progress is None and self.store is not None:
+            snapshot = self.store.read(job_id)
+            if snapshot is not None:
+                progress = RemoteProgress(self.store, job_id, snapshot)
+        if progress is not None and self._is_expired(progress, time.time()):
+            return None
+        return progress
+    
+    def discard(self, job_id: str) -> None:
+        """
+        Remove the record of a job that will never run.
+        
+        Args:
+            job_id: Job identifier.
+        """
+        with self._lock:
+            self._records.pop(job_id, None)
+            self._synced.pop(job_id, None)
+    
+    def __len__(self) -> int:
+        """Number of registered records, including expired ones not yet pruned."""
+        return len(self._records)
+    
+    def _is_expired(self, progress: DownloadProgress, now: float) -> bool:
+        """Check whether a closed record has outlived the TTL."""
+        return progress.closed_at is not None and now - progress.closed_at > self.ttl
+    
+    def _expire(self) -> None:
+        """Remove expired records. Must be called with the lock held."""
+        now = time.time()
+        expired = [
+            job_id for job_id, progress in self._records.items()
+            if self._is_expired(progress, now)
+        ]
+        for job_id in expired:
+            del self._records[job_id]
+            self._synced.pop(job_id, None)
+    
+    def _start(self) -> None:
+        """Start the sync thread once."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='progress-sync',
+                    daemon=True
+                )
+                self._thread.start()
+    
+    def _run(self) -> None:
+        """Sync loop."""
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except Exception as e:
+                logger.warning(f"Progress sync failed: {str(e)}")
+    
+    def sync(self) -> int:
+        """
+        Write the records that changed since the previous sync to the store.
+        
+        Returns:
+            Number of records written.
+        """
+        with self._lock:
+            changed = [
+                (job_id, progress) for job_id, progress in self._records.items()
+                if self._synced.get(job_id) != progress.version
+            ]
+        # Versions are read before the snapshots are taken, so a change
+        # racing with the write is picked up by the next sync
+        versions = [(job_id, progress.version) for job_id, progress in changed]
+        self.store.write(changed)
+        with self._lock:
+            for job_id, version in versions:
+                if job_id in self._records:
+                    self._synced[job_id] = version
+        self.store.prune(time.time() - self.ttl)
+        return len(changed)
+
+
+def _sse(data: Dict, event: Optional[str] = None) -> str:
+    """
+    Format a Server-Sent Events message.
+    
+    Args:
+        data: JSON-serializable payload.
+        event: Optional event name.
+    
+    Returns:
+        Encoded SSE message.
+    """
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def stream_progress(
+    registry: ProgressRegistry,
+    job_id: str,
+    interval: float = 0.5,
+    keepalive: float = 15.0
+) -> Iterator[str]:
+    """
+    Generate Server-Sent Events for a job's progress.
+    
+    The record is sampled every ``interval`` seconds and an event is sent
+    only when its version changed, so bursts of yt-dlp callbacks are
+    coalesced into at most one message per interval. Each message carries
+    only the fields that changed since the previous one (the first message
+    carries the full state).
+    
+    Args:
+        registry: Registry holding the job's progress record.
+        job_id: Job identifier.
+        interval: Minimum seconds between two messages.
+        keepalive: Seconds of silence after which a comment is sent so
+            proxies keep the connection open.
+    
+    Yields:
+        Encoded SSE messages. The stream ends with a ``done`` event once
+        the download is over, or ``gone`` if the job is unknown.
+    """
+    sent: Dict = {}
+    version = -1
+    last_write = time.monotonic()
+    
+    while True:
+        progress = registry.get(job_id)
+        if progress is None:
+            yield _sse({'job_id': job_id}, event='gone')
+            return
+        
+        # Read before the snapshot: once closed, no further updates happen,
+        # so the snapshot taken below is guaranteed to be the final state
+        closed = progress.closed_at is not None
+        current = progress.version
+        if current != version or closed:
+            version = current
+            snapshot = progress.to_dict()
+            delta = {
+                key: value for key, value in snapshot.items()
+                if sent.get(key, _MISSING) != value
+            }
+            sent = snapshot
+            if delta:
+                yield _sse(delta)
+                last_write = time.monotonic()
+            if closed:
+                yield _sse(snapshot, event='done')
+                return
+        
+        if time.monotonic() - last_write >= keepalive:
+            yield ': keepalive\n\n'
+            last_write = time.monotonic()
+        
+        time.sleep(interval)
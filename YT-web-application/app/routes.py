@@ -5,17 +5,45 @@ This module defines all the API endpoints and routes for the application.
 """
 
 import os
+import time
 import logging
+import mimetypes
+import threading
+from functools import partial
+from pathlib import Path
+from urllib.parse import quote
 from flask import (
     Blueprint, 
+    Flask,
+    Response,
     render_template, 
     request, 
     jsonify, 
     send_file,
-    current_app
+    stream_with_context,
+    current_app,
+    g
 )
-from typing import Dict, Tuple
-from app.downloader import YouTubeDownloader
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from werkzeug.wsgi import FileWrapper
+from app.batch import BatchManager
+from app.bandwidth import BandwidthScheduler
+from app.cache import TTLCache
+from app.download_cache import DownloadCache
+from app.downloader import DownloadProgress, YouTubeDownloader, make_clip
+from app.fragments import FragmentTuner
+from app.isolation import ProcessDownloader, WorkerPool
+from app.ydl_cache import YDLCache
+from app.ydl_pool import YDLPool
+from app.jobs import Job, JobManager, QueueFullError, new_job_id
+from app.job_store import JobStore
+from app.scheduler import estimate_cost
+from app import metrics
+from app.progress import ProgressRegistry, ProgressStore, stream_progress
+from app.storage import PinnedFile, StorageManager
+from app.streaming import follow_file, wait_for_file
+from app.transcode import AUDIO_FORMATS, AudioTranscoder
+from app.utils import parse_timestamp
 from app.config import Config
 
 
@@ -24,21 +52,463 @@ main_bp = Blueprint('main', __name__)
 
 # Global downloader instance
 downloader: YouTubeDownloader = None
+_downloader_lock = threading.Lock()
 
+# Global finished-file index
+download_cache: DownloadCache = None
+_download_cache_lock = threading.Lock()
 
-def get_downloader() -> YouTubeDownloader:
+# Global storage quota manager
+storage_manager: StorageManager = None
+_storage_manager_lock = threading.Lock()
+
+# Global job manager instance
+job_manager: JobManager = None
+_job_manager_lock = threading.Lock()
+
+# Global per-job progress registry
+progress_registry: ProgressRegistry = None
+
+# Global batch manager instance
+batch_manager: BatchManager = None
+
+# Downloader method run by each kind of download job
+DOWNLOAD_METHODS = {
+    'video': 'download_video',
+    'audio': 'download_audio',
+    'stream': 'download_stream',
+}
+
+
+def get_downloader() -> Union[YouTubeDownloader, ProcessDownloader]:
     """
     Get or create the downloader instance.
     
     Returns:
-        YouTubeDownloader instance.
+        YouTubeDownloader instance, or a ProcessDownloader running the work
+        in worker processes if ``DOWNLOAD_PROCESSES`` is set.
     """
     global downloader
-    if downloader is None:
-        downloader = YouTubeDownloader(current_app.config['DOWNLOAD_FOLDER'])
+    if downloader is not None:
+        return downloader
+    
+    # Serialize creation: the startup warm-up thread may race a request
+    with _downloader_lock:
+        if downloader is not None:
+            return downloader
+        
+        info_cache = TTLCache(
+            maxsize=Config.INFO_CACHE_SIZE,
+            ttl=Config.INFO_CACHE_TTL,
+            path=Config.INFO_CACHE_PATH
+        )
+        if Config.DOWNLOAD_PROCESSES > 0:
+            instance = _process_downloader(info_cache)
+        else:
+            instance = YouTubeDownloader(
+                current_app.config['DOWNLOAD_FOLDER'],
+                info_cache=info_cache,
+                extraction_cache=TTLCache(
+                    maxsize=Config.EXTRACTION_CACHE_SIZE,
+                    ttl=Config.EXTRACTION_CACHE_TTL
+                ),
+                download_cache=get_download_cache(),
+                ydl_pool=YDLPool(size=Config.YDL_POOL_SIZE),
+                fragment_tuner=FragmentTuner(
+                    max_total=Config.FRAGMENT_MAX_TOTAL,
+                    max_per_job=Config.FRAGMENT_MAX_PER_JOB,
+                    initial=Config.FRAGMENT_INITIAL
+                ) if Config.FRAGMENT_DOWNLOADS else None,
+                log_interval=Config.PROGRESS_LOG_INTERVAL,
+                transcoder=AudioTranscoder(
+                    workers=Config.AUDIO_TRANSCODE_WORKERS
+                ) if Config.AUDIO_TRANSCODE_WORKERS > 0 else None,
+                bandwidth=BandwidthScheduler(
+                    **_bandwidth_settings()
+                ) if Config.BANDWIDTH_LIMIT or Config.BANDWIDTH_CLIENT_LIMIT else None,
+                ydl_cache=YDLCache(**_ydl_cache_settings()) if Config.YDL_CACHE else None
+            )
+        instance.warm_pool()
+        # Publish only once warm so the unlocked fast path never sees a
+        # half-initialized downloader
+        downloader = instance
     return downloader
 
 
+def _process_downloader(info_cache: TTLCache) -> ProcessDownloader:
+    """
+    Create a downloader that runs yt-dlp in worker processes.
+    
+    Each worker runs one job at a time, so the fragment budget is split
+    between the workers. Their bandwidth schedulers share the limits
+    through the state folder.
+    
+    Args:
+        info_cache: Video metadata cache kept in the web process.
+    
+    Returns:
+        ProcessDownloader instance; workers start on ``warm_pool``.
+    """
+    pool = WorkerPool(
+        {
+            'download_folder': current_app.config['DOWNLOAD_FOLDER'],
+            'state_dir': current_app.config['STATE_DIR'],
+            'extraction_cache_size': Config.EXTRACTION_CACHE_SIZE,
+            'extraction_cache_ttl': Config.EXTRACTION_CACHE_TTL,
+            'ydl_pool_size': Config.YDL_POOL_SIZE,
+            'fragments': {
+                'max_total': max(1, Config.FRAGMENT_MAX_TOTAL // Config.DOWNLOAD_PROCESSES),
+                'max_per_job': Config.FRAGMENT_MAX_PER_JOB,
+                'initial': Config.FRAGMENT_INITIAL,
+            } if Config.FRAGMENT_DOWNLOADS else None,
+            'log_interval': Config.PROGRESS_LOG_INTERVAL,
+            'transcode': Config.AUDIO_TRANSCODE_WORKERS > 0,
+            'bandwidth': _bandwidth_settings()
+            if Config.BANDWIDTH_LIMIT or Config.BANDWIDTH_CLIENT_LIMIT else None,
+            'ydl_cache': _ydl_cache_settings() if Config.YDL_CACHE else None,
+        },
+        workers=Config.DOWNLOAD_PROCESSES,
+        max_jobs=Config.WORKER_MAX_JOBS,
+        max_rss_mb=Config.WORKER_MAX_RSS_MB
+    )
+    return ProcessDownloader(
+        pool,
+        info_cache=info_cache,
+        download_cache=get_download_cache(),
+        log_interval=Config.PROGRESS_LOG_INTERVAL
+    )
+
+
+def _bandwidth_settings() -> Dict:
+    """
+    Get the settings of the bandwidth scheduler of each process.
+    
+    Returns:
+        Keyword arguments of ``BandwidthScheduler``.
+    """
+    return {
+        'rate': Config.BANDWIDTH_LIMIT,
+        'client_rate': Config.BANDWIDTH_CLIENT_LIMIT,
+        'path': os.path.join(current_app.config['STATE_DIR'], BandwidthScheduler.DB_FILENAME),
+    }
+
+
+def _ydl_cache_settings() -> Dict:
+    """
+    Get the settings of the shared yt-dlp cache directory.
+    
+    Returns:
+        Keyword arguments of ``YDLCache``.
+    """
+    return {
+        'path': Config.YDL_CACHE_DIR or os.path.join(current_app.config['STATE_DIR'], 'ydl-cache'),
+        'max_bytes': Config.YDL_CACHE_MAX_MB * 1024 * 1024,
+    }
+
+
+def get_download_cache() -> DownloadCache:
+    """
+    Get or create the finished-file index.
+    
+    Kept separate from the downloader so serving files never loads yt-dlp.
+    
+    Returns:
+        DownloadCache instance.
+    """
+    global download_cache
+    with _download_cache_lock:
+        if download_cache is None:
+            download_cache = DownloadCache(
+                current_app.config['DOWNLOAD_FOLDER'], current_app.config['STATE_DIR']
+            )
+    return download_cache
+
+
+def get_storage_manager() -> StorageManager:
+    """
+    Get or create the storage manager and start its sweeper.
+    
+    Returns:
+        StorageManager instance.
+    """
+    global storage_manager
+    with _storage_manager_lock:
+        if storage_manager is None:
+            storage_manager = StorageManager(
+                current_app.config['DOWNLOAD_FOLDER'],
+                quota=Config.STORAGE_QUOTA or None,
+                policy=Config.STORAGE_POLICY,
+                grace_period=Config.STORAGE_GRACE_PERIOD,
+                interval=Config.STORAGE_SWEEP_INTERVAL,
+                state_dir=current_app.config['STATE_DIR']
+            )
+            storage_manager.start()
+    return storage_manager
+
+
+def get_job_manager() -> JobManager:
+    """
+    Get or create the job manager instance.
+    
+    On creation, downloads that the job store shows as interrupted by the
+    previous process are requeued.
+    
+    Returns:
+        JobManager instance.
+    """
+    global job_manager
+    if job_manager is not None:
+        return job_manager
+    
+    with _job_manager_lock:
+        if job_manager is not None:
+            return job_manager
+        store = None
+        if Config.JOB_STORE:
+            store = JobStore(Config.JOB_STORE_PATH or os.path.join(
+                current_app.config['STATE_DIR'], JobStore.DB_FILENAME
+            ), lease=Config.JOB_LEASE)
+        sjf = Config.JOB_SCHEDULING == 'sjf'
+        job_manager = JobManager(
+            workers=Config.JOB_WORKERS,
+            queue_size=Config.JOB_QUEUE_SIZE,
+            retention=Config.JOB_RETENTION,
+            store=store,
+            estimate=_estimate_download if sjf else None,
+            aging=Config.JOB_AGING,
+            max_attempts=Config.JOB_MAX_ATTEMPTS
+        )
+    job_manager.recover(partial(_resume_download, current_app._get_current_object()))
+    return job_manager
+
+
+def _estimate_download(job: Job) -> Tuple[str, float]:
+    """
+    Get the lane and the cost of a download job.
+    
+    The duration comes from the video info cache, which the page fills
+    before a download is requested; it is not extracted here so that
+    queueing stays fast, and the downloader is not built for it (jobs are
+    also estimated when recovered at startup or on the lease thread). Jobs
+    of unknown duration get a default one, and clips count for their own
+    length.
+    
+    Args:
+        job: Queued download job.
+    
+    Returns:
+        The lane ('audio' or 'video') and the estimated cost.
+    """
+    params = job.params
+    download_type = params.get('download_type') or job.kind
+    lane = 'audio' if download_type == 'audio' else 'video'
+    info = downloader.cached_video_info(params['url']) if downloader is not None else None
+    duration = info.get('duration') if info else None
+    if params.get('start') is not None or params.get('end') is not None:
+        start = params.get('start') or 0
+        end = min(filter(None, (params.get('end'), duration)), default=None)
+        duration = end - start if end is not None else None
+    return lane, estimate_cost(lane, params.get('quality', 'best'), duration)
+
+
+def _download_func(
+    kind: str,
+    progress: DownloadProgress,
+    client: Optional[str] = None
+) -> Callable[..., Dict]:
+    """
+    Get the callable of a download job.
+    
+    The downloader is looked up only when the job runs, inside an app
+    context, so queueing (or recovering) a job never loads yt-dlp and the
+    job can run on any thread.
+    
+    Args:
+        kind: Kind of download, a key of ``DOWNLOAD_METHODS``.
+        progress: Progress record the download updates.
+        client: Optional identity of the requesting client, whose downloads
+            share a bandwidth limit. Not part of the job's parameters, so it
+            is neither reported back nor stored.
+    
+    Returns:
+        Callable running the downloader method with the progress record and
+        client. Must be called in an app context.
+    """
+    app = current_app._get_current_object()
+    
+    def run(**params: Any) -> Dict:
+        with app.app_context():
+            method = getattr(get_downloader(), DOWNLOAD_METHODS[kind])
+            return method(progress=progress, client=client, **params)
+    
+    return run
+
+
+def _submit_download(kind: str, job_id: str, client: Optional[str] = None, **params) -> Job:
+    """
+    Enqueue a download job with its own progress record.
+    
+    Args:
+        kind: Kind of download, a key of ``DOWNLOAD_METHODS``.
+        job_id: Identifier of the job.
+        client: Optional identity of the requesting client.
+        **params: Keyword arguments of the downloader method.
+    
+    Returns:
+        The queued job.
+    
+    Raises:
+        QueueFullError: If the queue is at capacity.
+    """
+    progress = get_progress_registry().create(job_id)
+    try:
+        return get_job_manager().submit(
+            _download_func(kind, progress, client),
+            job_id=job_id,
+            kind=kind,
+            **params
+        )
+    except QueueFullError:
+        get_progress_registry().discard(job_id)
+        raise
+
+
+def _resume_download(app: Flask, job: Job) -> Optional[Callable[..., Dict]]:
+    """
+    Rebuild the callable of a download interrupted by a restart.
+    
+    yt-dlp continues from the ``.part`` files left behind, since the output
+    names are derived from the same parameters. Streamed downloads are not
+    resumed: they write no ``.part`` file and their client is gone. Called
+    from ``create_app`` and from the job lease thread, which has no app
+    context of its own.
+    
+    Args:
+        app: Application the job belongs to.
+        job: Stored job.
+    
+    Returns:
+        Callable running the job, or None if it cannot be resumed.
+    """
+    if job.kind not in ('video', 'audio'):
+        return None
+    with app.app_context():
+        return _download_func(job.kind, get_progress_registry().create(job.id))
+
+
+def _batch_funcs(
+    kind: str,
+    client: Optional[str] = None
+) -> Tuple[Callable[[List[str]], List[Dict]], Callable[..., Dict]]:
+    """
+    Get the callables of a batch: URL expansion and per-item download.
+    
+    Like ``_download_func``, the downloader is looked up only when they run,
+    on the batch pool's threads.
+    
+    Args:
+        kind: Kind of the items' downloads, 'video' or 'audio'.
+        client: Optional identity of the requesting client.
+    
+    Returns:
+        ``expand`` and ``download`` callables for ``BatchManager.submit``.
+        Must be called in an app context.
+    """
+    app = current_app._get_current_object()
+    
+    def expand(urls: List[str]) -> List[Dict]:
+        with app.app_context():
+            return get_downloader().expand_urls(urls)
+    
+    def download(progress: DownloadProgress, **params: Any) -> Dict:
+        with app.app_context():
+            return _download_func(kind, progress, client)(**params)
+    
+    return expand, download
+
+
+def _resume_batch(app: Flask, record: Dict) -> Optional[Tuple[Callable, Callable]]:
+    """
+    Rebuild the callables of a batch interrupted by a restart.
+    
+    Args:
+        app: Application the batch belongs to.
+        record: Stored batch.
+    
+    Returns:
+        ``expand`` and ``download`` callables, or None if the batch cannot
+        be run again.
+    """
+    if record['kind'] not in ('video', 'audio'):
+        return None
+    with app.app_context():
+        return _batch_funcs(record['kind'])
+
+
+def get_progress_registry() -> ProgressRegistry:
+    """
+    Get or create the progress registry instance.
+    
+    Returns:
+        ProgressRegistry instance.
+    """
+    global progress_registry
+    if progress_registry is None:
+        store = None
+        if Config.PROGRESS_STORE:
+            store = ProgressStore(os.path.join(
+                current_app.config['STATE_DIR'], ProgressStore.DB_FILENAME
+            ))
+        progress_registry = ProgressRegistry(
+            ttl=Config.PROGRESS_TTL,
+            store=store,
+            sync_interval=Config.PROGRESS_SYNC_INTERVAL
+        )
+    return progress_registry
+
+
+def get_batch_manager() -> BatchManager:
+    """
+    Get or create the batch manager instance.
+    
+    Returns:
+        BatchManager instance.
+    """
+    global batch_manager
+    if batch_manager is None:
+        batch_manager = BatchManager(
+            get_progress_registry(),
+            workers=Config.BATCH_WORKERS,
+            queue_size=Config.BATCH_QUEUE_SIZE,
+            max_items=Config.BATCH_MAX_ITEMS,
+            retention=Config.JOB_RETENTION,
+            # Shares the job store and its lease
+            store=get_job_manager().store,
+            sync_interval=Config.PROGRESS_SYNC_INTERVAL
+        )
+        batch_manager.recover(partial(_resume_batch, current_app._get_current_object()))
+    return batch_manager
+
+
+@main_bp.before_app_request
+def _start_timer() -> None:
+    """Record the start time of a request for the latency histogram."""
+    g.request_started = time.perf_counter()
+
+
+@main_bp.after_app_request
+def _record_latency(response: Response) -> Response:
+    """Observe the latency of a request by route."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            (route, request.method, str(response.status_code))
+        )
+    return response
+
+
 @main_bp.route('/')
 def index() -> str:
     """
@@ -50,6 +520,7 @@ def index() -> str:
     return render_template(
         'index.html',
         audio_qualities=Config.AUDIO_QUALITIES,
+        audio_formats=Config.AUDIO_FORMATS,
         video_qualities=Config.VIDEO_QUALITIES
     )
 
@@ -90,46 +561,276 @@ def get_video_info() -> Tuple[Dict, int]:
         return jsonify({'error': str(e)}), 400
 
 
+def _invalid_download_params(download_type: str, quality: str) -> Optional[str]:
+    """
+    Check the type and quality of a download request.
+    
+    The quality ends up in output filenames, cache keys and yt-dlp option
+    profiles, so only the values offered by ``Config`` are accepted.
+    
+    Args:
+        download_type: Requested download type.
+        quality: Requested quality.
+    
+    Returns:
+        Error message, or None if both are valid.
+    """
+    qualities = {'video': Config.VIDEO_QUALITIES, 'audio': Config.AUDIO_QUALITIES}
+    if download_type not in qualities:
+        return f'Unsupported download type: {download_type}'
+    if quality not in {option['value'] for option in qualities[download_type]}:
+        return f'Unsupported {download_type} quality: {quality}'
+    return None
+
+
 @main_bp.route('/api/download', methods=['POST'])
 def download() -> Tuple[Dict, int]:
     """
-    Initiate video or audio download.
+    Enqueue a video or audio download.
     
     Returns:
-        JSON response with download result or error.
+        JSON response with the queued job id or error.
     """
     try:
         data = request.get_json()
         url = (data.get('url') or '').strip()
         download_type = data.get('type', 'video')
-        quality = data.get('quality', 'best')
+        quality = str(data.get('quality') or ('192' if download_type == 'audio' else 'best'))
         filename = (data.get('filename') or '').strip()
+        stream = bool(data.get('stream', False))
+        audio_format = data.get('format', 'mp3')
         
         if not url:
             return jsonify({'error': 'URL is required'}), 400
+        error = _invalid_download_params(download_type, quality)
+        if error:
+            return jsonify({'error': error}), 400
+        if audio_format not in AUDIO_FORMATS:
+            return jsonify({'error': f'Unsupported audio format: {audio_format}'}), 400
+        try:
+            clip = make_clip(parse_timestamp(data.get('start')), parse_timestamp(data.get('end')))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if clip is not None and stream:
+            return jsonify({'error': 'Time ranges cannot be streamed'}), 400
         
-        dl = get_downloader()
-        
-        if download_type == 'audio':
-            result = dl.download_audio(
-                url, 
-                quality=quality,
-                filename=filename if filename else None
-            )
+        if stream:
+            kind, options = 'stream', {'download_type': download_type}
+        elif download_type == 'audio':
+            kind, options = 'audio', {'audio_format': audio_format}
         else:
-            result = dl.download_video(
-                url, 
-                quality=quality,
-                filename=filename if filename else None
-            )
+            kind, options = 'video', {}
+        if clip is not None:
+            start, end = clip
+            options.update(start=start, end=end if end != float('inf') else None)
+        
+        job = _submit_download(
+            kind,
+            new_job_id(),
+            client=request.remote_addr,
+            url=url,
+            quality=quality,
+            filename=filename if filename else None,
+            **options
+        )
         
-        return jsonify(result), 200
+        # Make room for the new file early
+        get_storage_manager().request_sweep()
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+        }), 202
+    
+    except QueueFullError as e:
+        logger.warning(f"Rejected download: {str(e)}")
+        return jsonify({'error': str(e)}), 503
     
     except Exception as e:
         logger.error(f"Error in download: {str(e)}")
         return jsonify({'error': str(e)}), 400
 
 
+@main_bp.route('/api/batch', methods=['POST'])
+def batch_download() -> Tuple[Dict, int]:
+    """
+    Enqueue downloads of several videos and playlists at once.
+    
+    Returns:
+        JSON response with the batch id or error.
+    """
+    try:
+        data = request.get_json()
+        urls = data.get('urls') or []
+        download_type = data.get('type', 'video')
+        quality = str(data.get('quality') or ('192' if download_type == 'audio' else 'best'))
+        audio_format = data.get('format', 'mp3')
+        
+        if isinstance(urls, str):
+            urls = urls.split()
+        urls = [url.strip() for url in urls if isinstance(url, str) and url.strip()]
+        
+        if not urls:
+            return jsonify({'error': 'At least one URL is required'}), 400
+        if len(urls) > Config.BATCH_MAX_URLS:
+            return jsonify({'error': f'At most {Config.BATCH_MAX_URLS} URLs per batch'}), 400
+        error = _invalid_download_params(download_type, quality)
+        if error:
+            return jsonify({'error': error}), 400
+        if audio_format not in AUDIO_FORMATS:
+            return jsonify({'error': f'Unsupported audio format: {audio_format}'}), 400
+        
+        kind = 'audio' if download_type == 'audio' else 'video'
+        params = {'quality': quality}
+        if kind == 'audio':
+            params['audio_format'] = audio_format
+        expand, download = _batch_funcs(kind, request.remote_addr)
+        
+        batch = get_batch_manager().submit(urls, expand, download, kind=kind, **params)
+        get_storage_manager().request_sweep()
+        
+        return jsonify({
+            'success': True,
+            'batch_id': batch.id,
+            'status': batch.status,
+        }), 202
+    
+    except QueueFullError as e:
+        logger.warning(f"Rejected batch: {str(e)}")
+        return jsonify({'error': str(e)}), 503
+    
+    except Exception as e:
+        logger.error(f"Error in batch_download: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+
+
+@main_bp.route('/api/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id: str) -> Tuple[Dict, int]:
+    """
+    Get aggregate and per-item progress of a batch.
+    
+    Args:
+        batch_id: Identifier returned by ``/api/batch``.
+    
+    Returns:
+        JSON response with batch information.
+    """
+    batch = get_batch_manager().get(batch_id)
+    
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    
+    return jsonify(batch.to_dict()), 200
+
+
+@main_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str) -> Tuple[Dict, int]:
+    """
+    Get status and result of a download job.
+    
+    Args:
+        job_id: Identifier returned by ``/api/download``.
+    
+    Returns:
+        JSON response with job information.
+    """
+    job = get_job_manager().get(job_id)
+    
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job.to_dict()), 200
+
+
+@main_bp.route('/api/jobs', methods=['GET'])
+def get_jobs_stats() -> Tuple[Dict, int]:
+    """
+    Get job queue statistics.
+    
+    Returns:
+        JSON response with queue depth and worker usage.
+    """
+    return jsonify(get_job_manager().stats()), 200
+
+
+@main_bp.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats() -> Tuple[Dict, int]:
+    """
+    Get cache hit/miss statistics.
+    
+    Returns:
+        JSON response with statistics per cache.
+    """
+    dl = get_downloader()
+    stats = {
+        'video_info': dl.info_cache.stats(),
+        'downloads': get_download_cache().stats(),
+    }
+    if dl.extraction_cache is not None:
+        stats['extraction'] = dl.extraction_cache.stats()
+    if dl.transcoder is not None:
+        stats['audio_transcodes'] = dl.transcoder.stats()
+    if dl.ydl_cache is not None:
+        stats['ydl'] = dl.ydl_cache.stats()
+    return jsonify(stats), 200
+
+
+@main_bp.route('/metrics', methods=['GET'])
+def get_metrics() -> Response:
+    """
+    Expose metrics in the Prometheus text format.
+    
+    Gauges are sampled here from the live components; components that do
+    not exist yet (e.g. the downloader before yt-dlp is loaded) are skipped
+    rather than created.
+    
+    Returns:
+        ``text/plain`` exposition response.
+    """
+    queues = {'download': job_manager}
+    if batch_manager is not None:
+        queues['batch'] = batch_manager.jobs
+    for name, manager in queues.items():
+        if manager is not None:
+            stats = manager.stats()
+            metrics.QUEUE_DEPTH.set(stats['queued'], (name,))
+            metrics.WORKERS_ACTIVE.set(stats['active'], (name,))
+            metrics.WORKERS.set(stats['workers'], (name,))
+    
+    caches = {}
+    if downloader is not None:
+        caches['video_info'] = downloader.info_cache
+        caches['extraction'] = downloader.extraction_cache
+    if download_cache is not None:
+        caches['downloads'] = download_cache
+    for name, cache in caches.items():
+        if cache is not None:
+            stats = cache.stats()
+            metrics.CACHE_REQUESTS.set(stats['hits'], (name, 'hit'))
+            metrics.CACHE_REQUESTS.set(stats['misses'], (name, 'miss'))
+            metrics.CACHE_HIT_RATIO.set(stats['hit_ratio'], (name,))
+    
+    if storage_manager is not None:
+        metrics.STORAGE_BYTES.set(storage_manager.usage)
+    
+    ydl_cache = getattr(downloader, 'ydl_cache', None)
+    if ydl_cache is not None:
+        metrics.YDL_CACHE_EXTRACTIONS.set(ydl_cache.warm, ('warm',))
+        metrics.YDL_CACHE_EXTRACTIONS.set(ydl_cache.cold, ('cold',))
+    
+    bandwidth = getattr(downloader, 'bandwidth', None)
+    if bandwidth is not None:
+        metrics.BANDWIDTH_THROTTLED.set(bandwidth.stats()['throttled_seconds'])
+    
+    if isinstance(downloader, ProcessDownloader):
+        stats = downloader.pool.stats()
+        metrics.WORKER_RESTARTS.set(stats['recycled'], ('recycled',))
+        metrics.WORKER_RESTARTS.set(stats['crashed'], ('crashed',))
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @main_bp.route('/api/progress', methods=['GET'])
 def get_progress() -> Tuple[Dict, int]:
     """
@@ -148,34 +849,231 @@ def get_progress() -> Tuple[Dict, int]:
         return jsonify({'error': str(e)}), 500
 
 
+@main_bp.route('/api/progress/<job_id>', methods=['GET'])
+def get_job_progress(job_id: str) -> Tuple[Dict, int]:
+    """
+    Get download progress of a single job.
+    
+    Args:
+        job_id: Identifier returned by ``/api/download``.
+    
+    Returns:
+        JSON response with progress information.
+    """
+    progress = get_progress_registry().get(job_id)
+    
+    if progress is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(progress.to_dict()), 200
+
+
+@main_bp.route('/api/progress/<job_id>/stream', methods=['GET'])
+def stream_job_progress(job_id: str) -> Response:
+    """
+    Stream download progress of a single job as Server-Sent Events.
+    
+    Args:
+        job_id: Identifier returned by ``/api/download``.
+    
+    Returns:
+        ``text/event-stream`` response pushing progress changes.
+    """
+    registry = get_progress_registry()
+    
+    if registry.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    events = stream_progress(
+        registry,
+        job_id,
+        interval=Config.PROGRESS_STREAM_INTERVAL,
+        keepalive=Config.PROGRESS_STREAM_KEEPALIVE
+    )
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable nginx response buffering
+        }
+    )
+
+
 @main_bp.route('/api/download-file/<filename>', methods=['GET'])
-def download_file(filename: str) -> send_file:
+def download_file(filename: str) -> Response:
     """
     Download a file from the server.
     
+    Supports conditional and partial requests (``Range``, ``If-Range``,
+    ``If-None-Match``, ``If-Modified-Since``) so resumed downloads and
+    seeking in media players do not restart from zero.
+    
     Args:
         filename: Name of the file to download.
-        
+    
     Returns:
         File download response.
     """
     try:
-        file_path = os.path.join(current_app.config['DOWNLOAD_FOLDER'], filename)
+        file_path = get_download_cache().resolve(filename)
         
-        if not os.path.exists(file_path):
+        if file_path is None:
             return jsonify({'error': 'File not found'}), 404
         
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=filename
-        )
+        return _send_download(file_path, filename)
     
     except Exception as e:
         logger.error(f"Error in download_file: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@main_bp.route('/api/stream/<job_id>', methods=['GET'])
+def stream_file(job_id: str) -> Response:
+    """
+    Stream the file of a download job, starting before the job finishes.
+    
+    Once the job is finished the file is served like ``/api/download-file``
+    (with Range support). While it runs, the bytes written so far are sent
+    and the response follows the file until the download ends.
+    
+    Args:
+        job_id: Identifier returned by ``/api/download`` with ``stream`` set.
+    
+    Returns:
+        Streaming file response.
+    """
+    job = get_job_manager().get(job_id)
+    
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job.status == Job.FINISHED:
+        file_path = get_download_cache().resolve(job.result['filename'])
+        if file_path is None:
+            return jsonify({'error': 'File not found'}), 404
+        return _send_download(file_path, job.result['filename'])
+    
+    if job.status == Job.FAILED:
+        return jsonify({'error': job.error}), 500
+    
+    progress = get_progress_registry().get(job_id)
+    path = wait_for_file(progress, timeout=Config.STREAM_START_TIMEOUT) if progress else None
+    
+    if path is None:
+        # The job may have finished in the meantime, or never started writing
+        job = get_job_manager().get(job_id)
+        if job.status == Job.FINISHED:
+            return stream_file(job_id)
+        return jsonify({'error': job.error or 'Download has not started'}), 503
+    
+    name = os.path.basename(path)
+    return Response(
+        stream_with_context(_follow_pinned(path, progress)),
+        mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+        headers={
+            'Content-Disposition': _content_disposition(name),
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable nginx response buffering
+        }
+    )
+
+
+def _follow_pinned(path: str, progress) -> Iterator[bytes]:
+    """
+    Follow a growing file, protecting it from eviction while streaming.
+    
+    Args:
+        path: File being written.
+        progress: Progress record of the download writing the file.
+    
+    Yields:
+        Chunks of file data.
+    """
+    with get_storage_manager().pinned(Path(path)):
+        yield from follow_file(
+            path,
+            progress,
+            chunk_size=Config.STREAM_CHUNK_SIZE,
+            idle_timeout=Config.STREAM_IDLE_TIMEOUT
+        )
+
+
+def _send_download(file_path: Path, download_name: str) -> Response:
+    """
+    Build the response delivering a downloaded file.
+    
+    In 'x-accel' mode the body is left to nginx, which then also handles
+    ranges and validators, so no Python worker is tied up. Otherwise Flask
+    serves the file (or emits X-Sendfile when ``USE_X_SENDFILE`` is set),
+    and the file is pinned against eviction until the response is closed.
+    
+    Args:
+        file_path: Path of the file on disk.
+        download_name: Filename presented to the client.
+    
+    Returns:
+        File download response.
+    """
+    storage = get_storage_manager()
+    storage.touch(file_path)
+    
+    if current_app.config['FILE_DELIVERY'] == 'x-accel':
+        response = Response(status=200)
+        response.headers['X-Accel-Redirect'] = (
+            Config.X_ACCEL_PREFIX.rstrip('/') + '/' + quote(file_path.name)
+        )
+        response.headers['Content-Disposition'] = _content_disposition(download_name)
+        # Let nginx pick the type from the file extension
+        del response.headers['Content-Type']
+        return response
+    
+    # Keep the file until the body has been sent. The server gets the file
+    # wrapper as the response body, bypassing Response.call_on_close, so the
+    # pin is released when the server closes the file instead.
+    unpin = storage.pin(file_path)
+    environ = request.environ
+    file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+    environ['wsgi.file_wrapper'] = lambda file, *args: file_wrapper(PinnedFile(file, unpin), *args)
+    try:
+        response = send_file(
+            file_path,
+            as_attachment=True,
+            download_name=download_name,
+            conditional=True,
+            etag=True,
+            last_modified=file_path.stat().st_mtime,
+            max_age=Config.FILE_MAX_AGE
+        )
+    except BaseException:
+        unpin()
+        raise
+    finally:
+        environ['wsgi.file_wrapper'] = file_wrapper
+    if not response.response:
+        # X-Sendfile: the web server opens the file itself
+        unpin()
+    return response
+
+
+def _content_disposition(download_name: str) -> str:
+    """
+    Build an attachment ``Content-Disposition`` header value.
+    
+    Args:
+        download_name: Filename presented to the client.
+    
+    Returns:
+        Header value, with an RFC 5987 ``filename*`` for non-ASCII names.
+    """
+    try:
+        download_name.encode('ascii')
+        escaped = download_name.replace('\\', '\\\\').replace('"', '\\"')
+        return f'attachment; filename="{escaped}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(download_name)}"
+
+
 @main_bp.errorhandler(404)
 def not_found(error) -> Tuple[Dict, int]:
     """Handle 404 errors."""
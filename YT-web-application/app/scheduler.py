@@ -0,0 +1,161 @@
+"""
+Job scheduling module.
+
+This module orders waiting jobs shortest-first instead of by arrival, so a
+long video does not hold up many short downloads. Jobs wait in lanes (audio
+and video) that share the workers, and their priority improves the longer
+they wait so long jobs still run.
+"""
+
+import heapq
+import queue
+import itertools
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from app.jobs import Job
+
+
+# Lane of jobs submitted without an estimate
+DEFAULT_LANE = 'default'
+
+# Duration assumed for videos whose metadata is not known yet (seconds)
+DEFAULT_DURATION = 600.0
+
+# Relative cost of one second of media, by download type and quality: roughly
+# its size compared to a second of audio, since downloads are network bound
+AUDIO_WEIGHT = 1.0
+VIDEO_WEIGHTS = {
+    '144': 2.0,
+    '240': 3.0,
+    '360': 5.0,
+    '480': 8.0,
+    '720': 15.0,
+    '1080': 25.0,
+    'best': 25.0,
+}
+
+
+def estimate_cost(download_type: str, quality: str, duration: Optional[float]) -> float:
+    """
+    Estimate the cost of a download.
+    
+    Args:
+        download_type: 'video' or 'audio'.
+        quality: Requested quality (video height, 'best', or audio bitrate).
+        duration: Length of the video in seconds, or None if unknown.
+    
+    Returns:
+        Cost in seconds of audio-equivalent media.
+    """
+    if download_type == 'audio':
+        weight = AUDIO_WEIGHT
+    else:
+        weight = VIDEO_WEIGHTS.get(str(quality), VIDEO_WEIGHTS['best'])
+    return (duration or DEFAULT_DURATION) * weight
+
+
+class JobScheduler:
+    """
+    Bounded queue handing out the cheapest waiting job, per lane.
+    
+    A job's priority is its cost minus ``aging`` for every second it has
+    waited, so a job of cost C is overtaken by newer jobs for at most
+    C / ``aging`` seconds. With no costs, jobs run in arrival order.
+    
+    A free worker serves the lane with the fewest running jobs among those
+    with waiting jobs, so each lane gets its share of the workers while the
+    others are busy, and all of them when it is the only one with work.
+    
+    Implements the part of the ``queue.Queue`` interface the job manager
+    uses, with ``done`` in place of ``task_done``.
+    """
+    
+    def __init__(self, maxsize: int, aging: float = 0.0):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            maxsize: Maximum number of waiting jobs, across lanes.
+            aging: Cost forgiven per second a job waits.
+        """
+        self.maxsize = max(1, maxsize)
+        self.aging = aging
+        self._lanes: Dict[str, List[Tuple[float, int, 'Job']]] = {}
+        self._running: Dict[str, int] = {}
+        self._size = 0
+        self._order = itertools.count()
+        self._ready = threading.Condition()
+    
+    def put_nowait(self, job: 'Job') -> None:
+        """
+        Add a job to its lane.
+        
+        Since every waiting job ages at the same rate, ordering by cost
+        plus ``aging`` times the enqueue time is the same as ordering by
+        current priority, and a heap per lane stays valid.
+        
+        Args:
+            job: Job with ``lane``, ``cost`` and ``queued_at`` set.
+        
+        Raises:
+            queue.Full: If ``maxsize`` jobs are already waiting.
+        """
+        with self._ready:
+            if self._size >= self.maxsize:
+                raise queue.Full
+            key = job.cost + self.aging * job.queued_at
+            heapq.heappush(self._lanes.setdefault(job.lane, []), (key, next(self._order), job))
+            self._size += 1
+            self._ready.notify()
+    
+    def get(self) -> 'Job':
+        """
+        Take the next job, blocking until one is waiting.
+        
+        Returns:
+            The most urgent job of the lane with the fewest running jobs.
+        """
+        with self._ready:
+            while not self._size:
+                self._ready.wait()
+            lane = min(
+                (lane for lane, waiting in self._lanes.items() if waiting),
+                key=lambda lane: (self._running.get(lane, 0), self._lanes[lane][0][:2])
+            )
+            job = heapq.heappop(self._lanes[lane])[2]
+            self._size -= 1
+            self._running[lane] = self._running.get(lane, 0) + 1
+            return job
+    
+    def done(self, job: 'Job') -> None:
+        """
+        Release the worker share a job's lane held while it ran.
+        
+        Args:
+            job: Job returned by ``get`` that has finished.
+        """
+        with self._ready:
+            self._running[job.lane] -= 1
+    
+    def qsize(self) -> int:
+        """Number of waiting jobs, across lanes."""
+        return self._size
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get per-lane statistics.
+        
+        Returns:
+            Dictionary mapping each lane to its waiting and running jobs.
+        """
+        with self._ready:
+            lanes = set(self._lanes) | set(self._running)
+            return {
+                lane: {
+                    'queued': len(self._lanes.get(lane, ())),
+                    'running': self._running.get(lane, 0),
+                }
+                for lane in sorted(lanes)
+            }
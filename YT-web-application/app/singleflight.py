@@ -0,0 +1,105 @@
+"""
+Single-flight module.
+
+This module coalesces identical concurrent calls so that the work is done once
+and its outcome is shared with every caller that asked for it meanwhile.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """In-flight call shared by the leader and its followers."""
+    
+    __slots__ = ('done', 'result', 'error', 'token', 'followers')
+    
+    def __init__(self, token: Any):
+        """
+        Initialize the call.
+        
+        Args:
+            token: Leader's token handed to joining callers.
+        """
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.token = token
+        self.followers = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its result."""
+    
+    def __init__(self):
+        """Initialize the single-flight group."""
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+    
+    def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Any],
+        token: Any = None,
+        on_join: Optional[Callable[[Any], None]] = None
+    ) -> Any:
+        """
+        Execute ``func`` unless an identical call is already running.
+        
+        The first caller for a key (the leader) executes ``func``. Callers
+        arriving while it runs wait for it and receive the same result, or
+        the same exception.
+        
+        Args:
+            key: Identity of the call.
+            func: Work to execute.
+            token: Leader's token, e.g. its progress record.
+            on_join: Called with the leader's token when this caller joins
+                a running call instead of executing ``func``.
+        
+        Returns:
+            The result of the (shared) call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call(token)
+                self._calls[key] = call
+            else:
+                call.followers += 1
+                self.coalesced += 1
+        
+        if not leader:
+            logger.info(f"Joining in-flight call {key}")
+            if on_join is not None:
+                on_join(call.token)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    def in_flight(self) -> int:
+        """
+        Get the number of running calls.
+        
+        Returns:
+            Number of distinct keys currently executing.
+        """
+        return len(self._calls)
@@ -11,7 +11,11 @@ const videoQualityGroup = document.getElementById('videoQualityGroup');
 const audioQualityGroup = document.getElementById('audioQualityGroup');
 const videoQualitySelect = document.getElementById('videoQuality');
 const audioQualitySelect = document.getElementById('audioQuality');
+const audioFormatSelect = document.getElementById('audioFormat');
 const filenameInput = document.getElementById('filename');
+const clipStartInput = document.getElementById('clipStart');
+const clipEndInput = document.getElementById('clipEnd');
+const streamCheckbox = document.getElementById('streamMode');
 const infoBtn = document.getElementById('infoBtn');
 const downloadBtn = document.getElementById('downloadBtn');
 const videoInfoSection = document.getElementById('videoInfo');
@@ -33,8 +37,12 @@ const videoUploader = document.getElementById('videoUploader');
 const videoDuration = document.getElementById('videoDuration');
 const videoViews = document.getElementById('videoViews');
 
+// Settings
+const JOB_POLL_INTERVAL = 1000; // ms
+
 // State
 let progressInterval = null;
+let progressSource = null;
 let isDownloading = false;
 
 /**
@@ -163,6 +171,9 @@ async function handleDownload(event) {
         ? audioQualitySelect.value 
         : videoQualitySelect.value;
     const filename = filenameInput.value.trim();
+    const start = clipStartInput.value.trim();
+    const end = clipEndInput.value.trim();
+    const stream = streamCheckbox.checked;
     
     if (!url) {
         showMessage('Please enter a YouTube URL', 'error');
@@ -177,9 +188,6 @@ async function handleDownload(event) {
     progressSection.classList.remove('hidden');
     resetProgress();
     
-    // Start progress tracking
-    startProgressTracking();
-    
     try {
         const response = await fetch('/api/download', {
             method: 'POST',
@@ -190,20 +198,41 @@ async function handleDownload(event) {
                 url,
                 type: format,
                 quality,
-                filename: filename || null
+                filename: filename || null,
+                format: audioFormatSelect.value,
+                start: start || null,
+                end: end || null,
+                stream
             })
         });
         
         const data = await response.json();
         
         if (response.ok && data.success) {
-            showMessage(
-                `✓ Download complete! File: ${data.filename}`,
-                'success'
-            );
+            // Start progress tracking
+            startProgressTracking(data.job_id);
+            
+            // In stream mode the file is received while it downloads
+            if (stream) {
+                triggerStream(data.job_id);
+            }
+            
+            // Wait for the queued job to finish
+            const job = await waitForJob(data.job_id);
             
-            // Trigger file download
-            triggerDownload(data.filename);
+            if (job.status === 'finished' && job.result) {
+                showMessage(
+                    `✓ Download complete! File: ${job.result.filename}`,
+                    'success'
+                );
+                
+                // Trigger file download
+                if (!stream) {
+                    triggerDownload(job.result.filename);
+                }
+            } else {
+                showMessage(job.error || 'Download failed', 'error');
+            }
         } else {
             showMessage(data.error || 'Download failed', 'error');
         }
@@ -218,12 +247,63 @@ async function handleDownload(event) {
 }
 
 /**
- * Start polling for progress updates
+ * Poll a queued download job until it finishes or fails
  */
-function startProgressTracking() {
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/api/jobs/${encodeURIComponent(jobId)}`);
+        const job = await response.json();
+        
+        if (!response.ok) {
+            return { status: 'failed', error: job.error || 'Job lookup failed' };
+        }
+        if (job.status === 'finished' || job.status === 'failed') {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+}
+
+/**
+ * Start tracking progress of a job.
+ * Uses the Server-Sent Events stream when available and falls back to polling.
+ */
+function startProgressTracking(jobId) {
+    if (!window.EventSource) {
+        startProgressPolling(jobId);
+        return;
+    }
+    
+    // The server only sends changed fields, so keep the merged state here
+    const state = {};
+    const applyEvent = (event) => {
+        Object.assign(state, JSON.parse(event.data));
+        updateProgress(state);
+    };
+    
+    progressSource = new EventSource(`/api/progress/${encodeURIComponent(jobId)}/stream`);
+    progressSource.onmessage = applyEvent;
+    progressSource.addEventListener('done', (event) => {
+        applyEvent(event);
+        closeProgressSource();
+    });
+    progressSource.addEventListener('gone', closeProgressSource);
+    progressSource.onerror = () => {
+        console.warn('Progress stream unavailable, falling back to polling');
+        closeProgressSource();
+        if (isDownloading) {
+            startProgressPolling(jobId);
+        }
+    };
+}
+
+/**
+ * Start polling for progress updates of a job
+ */
+function startProgressPolling(jobId) {
     progressInterval = setInterval(async () => {
         try {
-            const response = await fetch('/api/progress');
+            const response = await fetch(`/api/progress/${encodeURIComponent(jobId)}`);
             const data = await response.json();
             
             if (response.ok) {
@@ -235,10 +315,21 @@ function startProgressTracking() {
     }, 1000); // Poll every second
 }
 
+/**
+ * Close the progress event stream
+ */
+function closeProgressSource() {
+    if (progressSource) {
+        progressSource.close();
+        progressSource = null;
+    }
+}
+
 /**
  * Stop progress tracking
  */
 function stopProgressTracking() {
+    closeProgressSource();
     if (progressInterval) {
         clearInterval(progressInterval);
         progressInterval = null;
@@ -281,6 +372,17 @@ function triggerDownload(filename) {
     document.body.removeChild(link);
 }
 
+/**
+ * Trigger the download of a job's file while the job is still running
+ */
+function triggerStream(jobId) {
+    const link = document.createElement('a');
+    link.href = `/api/stream/${encodeURIComponent(jobId)}`;
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+}
+
 /**
  * Show message to user
  */
@@ -0,0 +1,401 @@
+"""
+Storage module.
+
+This module keeps the downloads folder under a byte quota by evicting the least
+valuable files in the background, sparing files that any process has pinned.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: pins only protect files within their process
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+# Suffixes of files yt-dlp is still writing
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp', '.tmp')
+
+# Folder of the pin lock files, inside the state directory
+PIN_DIRNAME = '.pins'
+
+
+@contextmanager
+def pin_file(path: Path, pin_dir: Optional[Path]) -> Iterator[None]:
+    """
+    Protect a file from eviction by every process sharing a pin folder.
+    
+    A pin is a shared ``flock`` on a lock file named after the file's inode,
+    so it is released even if its process dies. Eviction takes that lock
+    exclusively without waiting and skips the file if it cannot.
+    
+    Args:
+        path: File to protect.
+        pin_dir: Folder of the lock files, or None to pin nothing.
+    """
+    if pin_dir is None or fcntl is None:
+        yield
+        return
+    try:
+        inode = path.stat().st_ino
+    except OSError:
+        yield
+        return
+    pin_dir.mkdir(parents=True, exist_ok=True)
+    with open(pin_dir / f'{inode}.pin', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_SH)
+        yield
+
+
+class PinnedFile:
+    """A file object that releases a pin when it is closed."""
+    
+    def __init__(self, file: BinaryIO, unpin: Callable[[], None]):
+        """
+        Wrap an open file.
+        
+        Args:
+            file: Open binary file.
+            unpin: Function releasing the file's pin.
+        """
+        self._file = file
+        self._unpin = unpin
+    
+    def __getattr__(self, name: str) -> Any:
+        """Delegate everything else (read, seek, fileno, ...) to the file."""
+        return getattr(self._file, name)
+    
+    def close(self) -> None:
+        """Close the file, then release the pin."""
+        try:
+            self._file.close()
+        finally:
+            self._unpin()
+
+
+class _StoredFile:
+    """A file on disk with all of its names (hardlinked aliases)."""
+    
+    __slots__ = ('inode', 'paths', 'size', 'modified_at', 'accessed_at', 'hits')
+    
+    def __init__(self, inode: int, size: int, modified_at: float, accessed_at: float):
+        """
+        Initialize the file record.
+        
+        Args:
+            inode: Inode number shared by all names of the file.
+            size: Size in bytes.
+            modified_at: Last modification time.
+            accessed_at: Last access time known from the file system.
+        """
+        self.inode = inode
+        self.paths: List[Path] = []
+        self.size = size
+        self.modified_at = modified_at
+        self.accessed_at = accessed_at
+        self.hits = 0
+
+
+class StorageManager:
+    """
+    Byte quota for the downloads folder with LRU or LFU eviction.
+    
+    Files are grouped by inode, so a file and its hardlinked aliases are
+    counted and evicted together. Files that are pinned (being streamed,
+    served or transcoded), still being written, or younger than the grace
+    period are never evicted. With a state directory, pins are lock files
+    there and protect a file from the sweeps of every process; without
+    one, only from this manager's own sweeps.
+    """
+    
+    POLICIES = ('lru', 'lfu')
+    
+    def __init__(
+        self,
+        download_folder: str,
+        quota: Optional[int],
+        policy: str = 'lru',
+        grace_period: float = 600.0,
+        low_watermark: float = 0.9,
+        interval: float = 60.0,
+        state_dir: Optional[str] = None
+    ):
+        """
+        Initialize the storage manager.
+        
+        Args:
+            download_folder: Folder holding the downloaded files.
+            quota: Maximum bytes used by the folder, or None for no limit.
+            policy: 'lru' (least recently used first) or 'lfu' (least
+                frequently used first, least recent among equals).
+            grace_period: Seconds since last modification during which a
+                file is never evicted, so downloads in progress and files
+                waiting to be fetched survive.
+            low_watermark: Fraction of the quota eviction frees down to,
+                so that one sweep makes room for more than one download.
+            interval: Seconds between background sweeps.
+            state_dir: Folder holding the pins shared with other
+                processes, outside the served folder.
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.download_folder = Path(download_folder)
+        self.quota = quota
+        self.policy = policy
+        self.grace_period = grace_period
+        self.low_watermark = low_watermark
+        self.interval = interval
+        self.pin_dir = Path(state_dir) / PIN_DIRNAME if state_dir else None
+        self.usage = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self._access: Dict[int, Tuple[float, int]] = {}
+        self._pins: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> None:
+        """Start the background sweeper thread if a quota is set."""
+        if self._thread is not None or self.quota is None:
+            return
+        self._thread = threading.Thread(
+            target=self._run,
+            name='storage-sweeper',
+            daemon=True
+        )
+        self._thread.start()
+    
+    def request_sweep(self) -> None:
+        """Ask the sweeper to run now, e.g. after a download finished."""
+        self._wakeup.set()
+    
+    def touch(self, path: Path) -> None:
+        """
+        Record an access to a file.
+        
+        Args:
+            path: File that was served.
+        """
+        try:
+            inode = path.stat().st_ino
+        except OSError:
+            return
+        with self._lock:
+            _, hits = self._access.get(inode, (0.0, 0))
+            self._access[inode] = (time.time(), hits + 1)
+    
+    @contextmanager
+    def pinned(self, path: Path) -> Iterator[None]:
+        """
+        Protect a file from eviction while it is in use.
+        
+        Args:
+            path: File to protect.
+        """
+        try:
+            inode = path.stat().st_ino
+        except OSError:
+            yield
+            return
+        with self._lock:
+            self._pins[inode] = self._pins.get(inode, 0) + 1
+        try:
+            with pin_file(path, self.pin_dir):
+                yield
+        finally:
+            with self._lock:
+                self._pins[inode] -= 1
+                if not self._pins[inode]:
+                    del self._pins[inode]
+    
+    def pin(self, path: Path) -> Callable[[], None]:
+        """
+        Protect a file from eviction until the returned function is called.
+        
+        For uses that outlive a ``with`` block, e.g. a response body.
+        
+        Args:
+            path: File to protect.
+        
+        Returns:
+            Function releasing the pin; further calls do nothing.
+        """
+        stack = ExitStack()
+        stack.enter_context(self.pinned(path))
+        return stack.close
+    
+    def enforce(self) -> int:
+        """
+        Evict files until usage is back under the quota.
+        
+        Returns:
+            Number of bytes freed.
+        """
+        if self.quota is None:
+            return 0
+        files = self._scan()
+        self.usage = sum(f.size for f in files)
+        if self.usage <= self.quota:
+            return 0
+        
+        target = self.quota * self.low_watermark
+        now = time.time()
+        freed = 0
+        for stored in self._candidates(files, now):
+            if self.usage - freed <= target:
+                break
+            if self._evict(stored):
+                freed += stored.size
+        
+        self.usage -= freed
+        if self.usage > self.quota:
+            logger.warning(
+                f"Downloads use {self.usage} bytes, over the {self.quota} byte "
+                f"quota, but no more files can be evicted"
+            )
+        return freed
+    
+    def stats(self) -> Dict:
+        """
+        Get storage statistics.
+        
+        Returns:
+            Dictionary with usage, quota and eviction counters.
+        """
+        return {
+            'usage': self.usage,
+            'quota': self.quota,
+            'policy': self.policy,
+            'pinned': len(self._pins),
+            'evicted_files': self.evicted_files,
+            'evicted_bytes': self.evicted_bytes,
+        }
+    
+    def _run(self) -> None:
+        """Sweeper loop."""
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.enforce()
+            except Exception as e:
+                logger.error(f"Storage sweep failed: {str(e)}")
+    
+    def _scan(self) -> List[_StoredFile]:
+        """
+        List the files of the download folder grouped by inode.
+        
+        Returns:
+            Stored files, with access data merged in.
+        """
+        files: Dict[int, _StoredFile] = {}
+        with os.scandir(self.download_folder) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                stored = files.get(st.st_ino)
+                if stored is None:
+                    stored = _StoredFile(
+                        st.st_ino, st.st_size, st.st_mtime, max(st.st_atime, st.st_mtime)
+                    )
+                    files[st.st_ino] = stored
+                stored.paths.append(Path(entry.path))
+        
+        with self._lock:
+            # Forget files that are gone so the access table stays bounded
+            for inode in [inode for inode in self._access if inode not in files]:
+                del self._access[inode]
+            for inode, (accessed_at, hits) in self._access.items():
+                files[inode].accessed_at = max(files[inode].accessed_at, accessed_at)
+                files[inode].hits = hits
+        return list(files.values())
+    
+    def _candidates(self, files: List[_StoredFile], now: float) -> List[_StoredFile]:
+        """
+        Order evictable files from least to most valuable.
+        
+        Args:
+            files: Files of the download folder.
+            now: Current time.
+        
+        Returns:
+            Files that may be evicted, in eviction order.
+        """
+        evictable = [
+            f for f in files
+            if now - f.modified_at >= self.grace_period
+            and not any(p.name.endswith(PARTIAL_SUFFIXES) for p in f.paths)
+        ]
+        if self.policy == 'lfu':
+            return sorted(evictable, key=lambda f: (f.hits, f.accessed_at))
+        return sorted(evictable, key=lambda f: f.accessed_at)
+    
+    def _evict(self, stored: _StoredFile) -> bool:
+        """
+        Delete every name of a file unless it is pinned.
+        
+        Args:
+            stored: File to evict.
+        
+        Returns:
+            True if the file was deleted.
+        """
+        with self._lock:
+            if stored.inode in self._pins:
+                return False
+            with self._unpinned(stored.inode) as unpinned:
+                if not unpinned:
+                    return False
+                for path in stored.paths:
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.warning(f"Could not evict {path.name}: {str(e)}")
+                        return False
+            self._access.pop(stored.inode, None)
+        
+        self.evicted_files += 1
+        self.evicted_bytes += stored.size
+        logger.info(f"Evicted {', '.join(p.name for p in stored.paths)} ({stored.size} bytes)")
+        return True
+    
+    @contextmanager
+    def _unpinned(self, inode: int) -> Iterator[bool]:
+        """
+        Keep other processes from pinning a file while it is evicted.
+        
+        Args:
+            inode: Inode of the file.
+        
+        Yields:
+            False if another process holds a pin on the file.
+        """
+        if self.pin_dir is None or fcntl is None:
+            yield True
+            return
+        self.pin_dir.mkdir(parents=True, exist_ok=True)
+        lock_path = self.pin_dir / f'{inode}.pin'
+        with open(lock_path, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+            # The inode is free for reuse once its file is gone
+            lock_path.unlink(missing_ok=True)
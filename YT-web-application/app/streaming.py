@@ -0,0 +1,85 @@
+"""
+Streaming module.
+
+This module streams a file to an HTTP client while yt-dlp is still writing
+it, so playback or saving can start before the download has finished.
+"""
+
+import os
+import time
+import logging
+from typing import Iterator, Optional
+from app.downloader import DownloadProgress
+
+
+logger = logging.getLogger(__name__)
+
+
+def wait_for_file(
+    progress: DownloadProgress,
+    timeout: float = 30.0,
+    poll_interval: float = 0.2
+) -> Optional[str]:
+    """
+    Wait until a download has created its output file.
+    
+    Args:
+        progress: Progress record of the download.
+        timeout: Maximum seconds to wait.
+        poll_interval: Seconds between checks.
+    
+    Returns:
+        Path of the file being written, or None if the download ended or
+        the timeout expired before a file appeared.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        path = progress.filename
+        if path and os.path.exists(path):
+            return path
+        if progress.closed_at is not None:
+            return None
+        time.sleep(poll_interval)
+    return None
+
+
+def follow_file(
+    path: str,
+    progress: DownloadProgress,
+    chunk_size: int = 64 * 1024,
+    poll_interval: float = 0.2,
+    idle_timeout: float = 60.0
+) -> Iterator[bytes]:
+    """
+    Yield a file's bytes as they are written, until the download ends.
+    
+    The file on disk is the download's own output (and later the cached
+    file), so the client receives a tee of what yt-dlp writes without a
+    second copy of the data.
+    
+    Args:
+        path: File being written.
+        progress: Progress record of the download writing the file.
+        chunk_size: Maximum bytes read per chunk.
+        poll_interval: Seconds to wait when the reader caught up.
+        idle_timeout: Seconds without new data after which streaming stops.
+    
+    Yields:
+        Chunks of file data.
+    """
+    last_data = time.monotonic()
+    with open(path, 'rb') as f:
+        while True:
+            # Read before reading data: once closed, every byte is on disk
+            done = progress.closed_at is not None
+            chunk = f.read(chunk_size)
+            if chunk:
+                last_data = time.monotonic()
+                yield chunk
+                continue
+            if done:
+                return
+            if time.monotonic() - last_data > idle_timeout:
+                logger.warning(f"Stream of {path} stalled, closing")
+                return
+            time.sleep(poll_interval)
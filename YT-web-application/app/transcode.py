@@ -0,0 +1,335 @@
+"""
+Transcode planning module.
+
+This module decides, from the formats yt-dlp actually downloaded, whether a
+file needs no FFmpeg work, a stream copy into another container, or a real
+re-encode, and runs the matching yt-dlp post-processor. It also encodes audio
+from a local source file on a process pool.
+"""
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from app.ydl_pool import load_yt_dlp
+
+
+logger = logging.getLogger(__name__)
+
+# Codecs that can be stream-copied into an MP4 container
+MP4_VIDEO_CODECS = ('avc1', 'h264', 'hev1', 'hvc1', 'hevc', 'h265', 'av01', 'vp09', 'vp9')
+MP4_AUDIO_CODECS = ('aac', 'mp3', 'opus', 'ac-3', 'ec-3', 'none')
+
+# Audio output formats and the source codec each can be copied from
+AUDIO_FORMATS = {
+    'mp3': 'mp3',
+    'm4a': 'aac',
+    'opus': 'opus',
+    'best': None,  # keep whatever codec the source has
+}
+
+# Containers ``FFmpegExtractAudioPP`` leaves untouched for the 'best' format
+COMMON_AUDIO_EXTS = ('m4a', 'mka', 'mp3', 'ogg', 'opus', 'flac', 'wav', 'wma')
+
+# FFmpeg encoder of each audio output format
+AUDIO_ENCODERS = {'mp3': 'libmp3lame', 'm4a': 'aac', 'opus': 'libopus'}
+
+# Container a codec is stream-copied into, and the codec a container
+# usually holds when yt-dlp did not report one
+CODEC_EXTS = {'aac': 'm4a', 'opus': 'opus', 'mp3': 'mp3', 'vorbis': 'ogg', 'flac': 'flac'}
+EXT_CODECS = {'m4a': 'aac', 'webm': 'opus', 'opus': 'opus', 'mp3': 'mp3', 'ogg': 'vorbis'}
+
+# Plan actions, from cheapest to most expensive
+NONE = 'none'
+REMUX = 'remux'
+TRANSCODE = 'transcode'
+
+
+class TranscodePlan(NamedTuple):
+    """Post-processing decided for a downloaded file."""
+    
+    action: str
+    source: str
+    target: str
+    reason: str
+    
+    def to_dict(self, seconds: float) -> Dict:
+        """
+        Describe the executed plan for a download result.
+        
+        Args:
+            seconds: Time spent post-processing.
+        
+        Returns:
+            Dictionary with the action, formats and duration.
+        """
+        return {
+            'action': self.action,
+            'source': self.source,
+            'target': self.target,
+            'reason': self.reason,
+            'seconds': round(seconds, 3),
+        }
+
+
+def _codec(value: Optional[str]) -> str:
+    """
+    Normalize a yt-dlp codec string.
+    
+    Args:
+        value: Codec as reported by yt-dlp (e.g. 'mp4a.40.2', 'avc1.64001F').
+    
+    Returns:
+        Short codec name (e.g. 'aac', 'avc1'), or 'none'/'unknown'.
+    """
+    if not value:
+        return 'unknown'
+    name = value.split('.')[0].lower()
+    if name == 'mp4a':
+        return 'aac'
+    return name
+
+
+def plan_video(info: Dict, target: str = 'mp4') -> TranscodePlan:
+    """
+    Plan the post-processing of a downloaded video.
+    
+    Args:
+        info: Info dict of the downloaded file (with ``ext``, ``vcodec``
+            and ``acodec``).
+        target: Output container.
+    
+    Returns:
+        The plan: nothing if the file already is an MP4, a remux if its
+        codecs fit in MP4, otherwise a re-encode.
+    """
+    ext = info.get('ext', 'unknown')
+    vcodec = _codec(info.get('vcodec'))
+    acodec = _codec(info.get('acodec'))
+    source = f'{ext}/{vcodec}+{acodec}'
+    
+    if ext == target:
+        return TranscodePlan(NONE, source, target, f'already {target}')
+    if vcodec in MP4_VIDEO_CODECS and acodec in MP4_AUDIO_CODECS:
+        return TranscodePlan(REMUX, source, target, f'codecs fit in {target}')
+    return TranscodePlan(TRANSCODE, source, target, f'{vcodec}+{acodec} needs re-encoding for {target}')
+
+
+def plan_audio(info: Dict, target: str = 'mp3') -> TranscodePlan:
+    """
+    Plan the post-processing of downloaded audio.
+    
+    Args:
+        info: Info dict of the downloaded file (with ``ext`` and, if
+            known, ``acodec``).
+        target: Output format, one of ``AUDIO_FORMATS``.
+    
+    Returns:
+        The plan: nothing if the file already has the target format, a
+        stream copy into the target container if the source codec matches,
+        otherwise a re-encode. The plan's target is always a concrete
+        extension, also for 'best'.
+    """
+    ext = info.get('ext', 'unknown')
+    acodec = _codec(info.get('acodec') or EXT_CODECS.get(ext))
+    source = f'{ext}/{acodec}'
+    wanted = AUDIO_FORMATS[target]
+    
+    if wanted is None:
+        if ext in COMMON_AUDIO_EXTS:
+            return TranscodePlan(NONE, source, ext, f'{ext} is a common audio format')
+        if acodec in CODEC_EXTS:
+            return TranscodePlan(REMUX, source, CODEC_EXTS[acodec], f'{acodec} can be copied')
+        return TranscodePlan(TRANSCODE, source, 'mp3', f'{acodec} has no audio container')
+    if acodec == wanted:
+        if ext == target:
+            return TranscodePlan(NONE, source, target, f'already {target}')
+        return TranscodePlan(REMUX, source, target, f'{acodec} can be copied')
+    return TranscodePlan(TRANSCODE, source, target, f'{acodec} needs re-encoding to {target}')
+
+
+def run_video_plan(ydl: 'yt_dlp.YoutubeDL', info: Dict, plan: TranscodePlan) -> Tuple[Dict, float]:
+    """
+    Execute a video plan with the matching yt-dlp post-processor.
+    
+    Args:
+        ydl: YoutubeDL instance that downloaded the file.
+        info: Info dict of the downloaded file (with ``filepath``).
+        plan: Plan from ``plan_video``.
+    
+    Returns:
+        Updated info dict and seconds spent.
+    """
+    if plan.action == NONE:
+        return info, 0.0
+    
+    postprocessor = load_yt_dlp().postprocessor
+    if plan.action == REMUX:
+        pp = postprocessor.FFmpegVideoRemuxerPP(ydl, preferedformat=plan.target)
+    else:
+        pp = postprocessor.FFmpegVideoConvertorPP(ydl, preferedformat=plan.target)
+    return _run(ydl, pp, info, plan)
+
+
+def run_audio_plan(
+    ydl: 'yt_dlp.YoutubeDL',
+    info: Dict,
+    plan: TranscodePlan,
+    quality: str
+) -> Tuple[Dict, float]:
+    """
+    Execute an audio plan with yt-dlp's audio extractor.
+    
+    ``FFmpegExtractAudioPP`` copies the stream itself when the source codec
+    matches the target, so the same post-processor serves both actions.
+    
+    Args:
+        ydl: YoutubeDL instance that downloaded the file.
+        info: Info dict of the downloaded file (with ``filepath``).
+        plan: Plan from ``plan_audio``.
+        quality: Bitrate in kbps used when re-encoding.
+    
+    Returns:
+        Updated info dict and seconds spent.
+    """
+    if plan.action == NONE:
+        return info, 0.0
+    
+    pp = load_yt_dlp().postprocessor.FFmpegExtractAudioPP(
+        ydl, preferredcodec=plan.target, preferredquality=quality
+    )
+    return _run(ydl, pp, info, plan)
+
+
+def _run(ydl: 'yt_dlp.YoutubeDL', pp, info: Dict, plan: TranscodePlan) -> Tuple[Dict, float]:
+    """Run a post-processor and time it."""
+    start = time.perf_counter()
+    info = ydl.run_pp(pp, info)
+    seconds = time.perf_counter() - start
+    logger.info(f"Post-processing {plan.action} {plan.source} -> {plan.target} took {seconds:.2f}s")
+    return info, seconds
+
+
+def audio_args(plan: TranscodePlan, quality: str) -> List[str]:
+    """
+    Get the FFmpeg output options of an audio plan.
+    
+    Args:
+        plan: Plan from ``plan_audio`` (not 'none').
+        quality: Bitrate in kbps used when re-encoding.
+    
+    Returns:
+        FFmpeg options producing the plan's target.
+    """
+    if plan.action == REMUX:
+        args = ['-vn', '-acodec', 'copy']
+        if plan.target == 'm4a':
+            args += ['-bsf:a', 'aac_adtstoasc']
+        return args
+    return ['-vn', '-acodec', AUDIO_ENCODERS[plan.target], '-b:a', f'{quality}k']
+
+
+def encode_audio(source: str, target: str, args: List[str]) -> float:
+    """
+    Encode a local audio file with FFmpeg. Runs in a worker process.
+    
+    The output is written to a temporary name and moved into place, so a
+    partial file is never visible under the target name.
+    
+    Args:
+        source: Path of the source file, left untouched.
+        target: Path of the file to create.
+        args: FFmpeg output options from ``audio_args``.
+    
+    Returns:
+        Seconds spent encoding.
+    """
+    postprocessor = load_yt_dlp().postprocessor
+    ffmpeg = postprocessor.FFmpegPostProcessor()
+    base, ext = os.path.splitext(target)
+    temp = f'{base}.temp{ext}'
+    start = time.perf_counter()
+    try:
+        ffmpeg.run_ffmpeg(source, temp, args)
+    except Exception:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    os.replace(temp, target)
+    return time.perf_counter() - start
+
+
+class AudioTranscoder:
+    """
+    Process pool encoding audio from local source files.
+    
+    Encoding runs outside the web process so that several bitrates of a
+    video can be produced in parallel without holding the GIL, while the
+    download threads keep serving the network. Callers that already run in
+    a worker process can pass ``workers=0`` to encode in the calling thread.
+    """
+    
+    def __init__(self, workers: int = 2):
+        """
+        Initialize the transcoder; worker processes start on first use.
+        
+        Args:
+            workers: Number of encoder processes, 0 to encode in the
+                calling thread.
+        """
+        self.workers = max(0, workers)
+        self.encodes = 0
+        self.seconds = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def transcode(self, source: str, target: str, plan: TranscodePlan, quality: str) -> float:
+        """
+        Produce a target file from a local source and wait for it.
+        
+        Args:
+            source: Path of the source file.
+            target: Path of the file to create.
+            plan: Plan from ``plan_audio`` (not 'none').
+            quality: Bitrate in kbps used when re-encoding.
+        
+        Returns:
+            Seconds spent encoding.
+        """
+        args = audio_args(plan, quality)
+        if self.workers == 0:
+            seconds = encode_audio(source, target, args)
+        else:
+            seconds = self._get_executor().submit(encode_audio, source, target, args).result()
+        with self._lock:
+            self.encodes += 1
+            self.seconds += seconds
+        logger.info(f"Encoded {os.path.basename(target)} ({plan.action}) in {seconds:.2f}s")
+        return seconds
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the process pool once."""
+        with self._lock:
+            if self._executor is None:
+                # Forking a threaded server is unsafe; start clean interpreters
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+    
+    def stats(self) -> Dict:
+        """
+        Get transcoder statistics.
+        
+        Returns:
+            Dictionary with the pool size and encode totals.
+        """
+        return {
+            'workers': self.workers,
+            'encodes': self.encodes,
+            'seconds': round(self.seconds, 3),
+        }
@@ -5,7 +5,7 @@ This module provides functions to validate and sanitize user inputs.
 """
 
 import re
-from typing import Optional
+from typing import Optional, Union
 from urllib.parse import urlparse, parse_qs
 
 
@@ -85,6 +85,28 @@ def extract_video_id(url: str) -> Optional[str]:
     return None
 
 
+def extract_playlist_id(url: str) -> Optional[str]:
+    """
+    Extract playlist ID from a YouTube playlist URL.
+    
+    Only ``/playlist?list=...`` URLs are treated as playlists; a watch URL
+    that also carries a ``list`` parameter refers to its single video.
+    
+    Args:
+        url: YouTube URL.
+    
+    Returns:
+        Playlist ID if found, None otherwise.
+    """
+    parsed = urlparse(url)
+    
+    if parsed.hostname in ['www.youtube.com', 'youtube.com', 'm.youtube.com']:
+        if parsed.path == '/playlist':
+            return parse_qs(parsed.query).get('list', [None])[0]
+    
+    return None
+
+
 def validate_quality(quality: str, download_type: str) -> bool:
     """
     Validate quality parameter.
@@ -104,3 +126,35 @@ def validate_quality(quality: str, download_type: str) -> bool:
         return quality in valid_qualities
     
     return False
+
+
+def parse_timestamp(value: Union[str, int, float, None]) -> Optional[float]:
+    """
+    Parse a time offset into a video.
+    
+    Args:
+        value: Seconds as a number or string, 'MM:SS' or 'HH:MM:SS' (with
+            optional fractions of a second), or None/empty.
+    
+    Returns:
+        Offset in seconds, or None if no value was given.
+    
+    Raises:
+        ValueError: If the value is not a valid non-negative time.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid time: {value}")
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        parts = str(value).strip().split(':')
+        if len(parts) > 3 or not all(re.fullmatch(r'\d+(\.\d+)?', part) for part in parts):
+            raise ValueError(f"Invalid time: {value}")
+        seconds = 0.0
+        for part in parts:
+            seconds = seconds * 60 + float(part)
+    if not 0 <= seconds < float('inf'):
+        raise ValueError(f"Invalid time: {value}")
+    return seconds
@@ -0,0 +1,204 @@
+"""
+yt-dlp cache directory module.
+
+This module manages the on-disk cache where yt-dlp keeps data derived from
+YouTube's player JavaScript (signature and n-parameter functions, solved
+challenges). The directory is shared by every worker process, bounded in
+size, and instrumented to count the extractions that found it warm.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Leftovers of interrupted writes older than this are removed (seconds)
+STALE_TMP_AGE = 3600
+
+
+class YDLCache:
+    """
+    Shared, size-bounded yt-dlp ``cachedir``.
+    
+    yt-dlp writes each entry to a temporary file and renames it into place,
+    so processes sharing the directory never read a partial entry; the same
+    entry written twice by racing processes is simply replaced. When the
+    directory grows over ``max_bytes``, the oldest entries are deleted. A
+    process that loses an entry to pruning just fetches it again.
+    
+    An extraction is counted as cold if yt-dlp had to store new player data
+    during it, i.e. fetch and parse player JavaScript, and as warm otherwise.
+    """
+    
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024):
+        """
+        Initialize the cache directory.
+        
+        Args:
+            path: Directory passed to yt-dlp as ``cachedir``.
+            max_bytes: Size the directory is pruned down to.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.warm = 0
+        self.cold = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+    
+    def attach(self, ydl: Any) -> None:
+        """
+        Count cache use of a YoutubeDL instance (idempotent).
+        
+        Args:
+            ydl: ``yt_dlp.YoutubeDL`` instance using ``path`` as cachedir.
+        """
+        if not isinstance(ydl.cache, _CountingCache):
+            ydl.cache = _CountingCache(ydl.cache, self)
+    
+    @contextmanager
+    def track(self, ydl: Any) -> Iterator[None]:
+        """
+        Count one extraction as warm or cold.
+        
+        Args:
+            ydl: YoutubeDL instance running the extraction in this thread.
+        
+        Yields:
+            None; the extraction runs inside the block.
+        """
+        self.attach(ydl)
+        self._local.stored = 0
+        try:
+            yield
+        finally:
+            stored, self._local.stored = self._local.stored, None
+            with self._lock:
+                if stored:
+                    self.cold += 1
+                else:
+                    self.warm += 1
+            if stored:
+                self.prune()
+    
+    def _record(self, event: str) -> None:
+        """
+        Count a load or store of the wrapped cache.
+        
+        Args:
+            event: 'hit', 'miss' or 'store'.
+        """
+        with self._lock:
+            if event == 'hit':
+                self.hits += 1
+            elif event == 'miss':
+                self.misses += 1
+            else:
+                self.stores += 1
+        if event == 'store' and getattr(self._local, 'stored', None) is not None:
+            self._local.stored += 1
+    
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """
+        List the files of the directory.
+        
+        Returns:
+            ``(mtime, size, path)`` of each file.
+        """
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Replaced or pruned by another process
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+    
+    def prune(self) -> int:
+        """
+        Delete the oldest entries until the directory fits ``max_bytes``.
+        
+        Temporary files left by interrupted writes are deleted once stale.
+        
+        Returns:
+            Number of files deleted.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - STALE_TMP_AGE
+        deleted = 0
+        for mtime, size, path in entries:
+            stale = path.endswith('.tmp') and mtime < cutoff
+            if not stale and total <= self.max_bytes:
+                continue
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError:
+                pass
+            total -= size
+        if deleted:
+            logger.info(f"Pruned {deleted} files from the yt-dlp cache")
+        return deleted
+    
+    def stats(self) -> Dict:
+        """
+        Get cache statistics.
+        
+        Returns:
+            Dictionary with warm and cold extractions, entry loads and
+            stores of this process, and the directory's current size.
+        """
+        entries = self._entries()
+        extractions = self.warm + self.cold
+        return {
+            'warm': self.warm,
+            'cold': self.cold,
+            'warm_ratio': round(self.warm / extractions, 4) if extractions else 0.0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'files': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+
+class _CountingCache:
+    """Wrapper of a YoutubeDL's ``cache`` reporting its use to a YDLCache."""
+    
+    def __init__(self, cache: Any, owner: YDLCache):
+        """
+        Initialize the wrapper.
+        
+        Args:
+            cache: ``yt_dlp.cache.Cache`` of the instance.
+            owner: Cache directory to report to.
+        """
+        self._cache = cache
+        self._owner = owner
+    
+    def load(self, section: str, key: str, *args, **kwargs) -> Any:
+        """Load an entry, counting a hit or a miss."""
+        data = self._cache.load(section, key, *args, **kwargs)
+        self._owner._record('miss' if data is None else 'hit')
+        return data
+    
+    def store(self, section: str, key: str, data: Any, *args, **kwargs) -> None:
+        """Store an entry, marking the running extraction as cold."""
+        self._cache.store(section, key, data, *args, **kwargs)
+        self._owner._record('store')
+    
+    def __getattr__(self, name: str) -> Any:
+        """Delegate everything else to the wrapped cache."""
+        return getattr(self._cache, name)
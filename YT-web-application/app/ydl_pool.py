@@ -0,0 +1,222 @@
+"""
+YoutubeDL pool module.
+
+This module keeps pre-built yt-dlp ``YoutubeDL`` instances per option profile
+so that requests do not pay option parsing, format selector compilation and
+cookie jar setup every time.
+"""
+
+import queue
+import logging
+import importlib
+import threading
+from types import ModuleType
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_yt_dlp() -> ModuleType:
+    """
+    Import yt-dlp on first use.
+    
+    yt-dlp loads its whole extractor registry at import time, so it is not
+    imported at module level; this keeps application startup and test
+    collection fast. After the first call the module comes from
+    ``sys.modules`` at negligible cost.
+    
+    Returns:
+        The ``yt_dlp`` module.
+    """
+    return importlib.import_module('yt_dlp')
+
+
+class PooledYoutubeDL:
+    """A reusable ``YoutubeDL`` instance whose per-job settings can be swapped."""
+    
+    def __init__(self, profile: str, ydl_opts: Dict):
+        """
+        Build the underlying ``YoutubeDL`` instance.
+        
+        Args:
+            profile: Name of the option profile this instance belongs to.
+            ydl_opts: yt-dlp options of the profile. Progress and
+                postprocessor hooks are managed by the pool and must not be
+                part of them.
+        """
+        self.profile = profile
+        self.progress_hook: Optional[Callable[[Dict], None]] = None
+        self.postprocessor_hook: Optional[Callable[[Dict], None]] = None
+        self.ydl = load_yt_dlp().YoutubeDL({
+            **ydl_opts,
+            'progress_hooks': [self._dispatch_progress],
+            'postprocessor_hooks': [self._dispatch_postprocessor],
+        })
+    
+    def _dispatch_progress(self, data: Dict) -> None:
+        """Forward yt-dlp progress to the hook of the current job."""
+        hook = self.progress_hook
+        if hook is not None:
+            hook(data)
+    
+    def _dispatch_postprocessor(self, data: Dict) -> None:
+        """Forward yt-dlp postprocessor events to the hook of the current job."""
+        hook = self.postprocessor_hook
+        if hook is not None:
+            hook(data)
+    
+    def configure(
+        self,
+        outtmpl: Optional[str] = None,
+        progress_hook: Optional[Callable[[Dict], None]] = None,
+        postprocessor_hook: Optional[Callable[[Dict], None]] = None
+    ) -> None:
+        """
+        Apply per-job settings without rebuilding the instance.
+        
+        Args:
+            outtmpl: Output template of the job.
+            progress_hook: Progress hook of the job.
+            postprocessor_hook: Postprocessor hook of the job.
+        """
+        if outtmpl is not None:
+            self.ydl.params['outtmpl']['default'] = outtmpl
+        self.progress_hook = progress_hook
+        self.postprocessor_hook = postprocessor_hook
+    
+    def reset(self) -> None:
+        """Drop per-job settings before the instance is reused."""
+        self.progress_hook = None
+        self.postprocessor_hook = None
+    
+    def close(self) -> None:
+        """Release the instance's network and cookie resources."""
+        self.ydl.close()
+
+
+class YDLPool:
+    """
+    Pool of ``PooledYoutubeDL`` instances keyed by option profile.
+    
+    Each profile (e.g. ``info``, ``video-720``, ``audio``) maps to a fixed
+    set of yt-dlp options, so instances of a profile are interchangeable and
+    only the output template and progress hook change between jobs. At most
+    ``max_profiles`` profiles keep idle instances; the least recently used
+    one is dropped beyond that.
+    """
+    
+    def __init__(self, size: int = 2, max_profiles: int = 32):
+        """
+        Initialize the pool.
+        
+        Args:
+            size: Maximum number of idle instances kept per profile.
+            max_profiles: Maximum number of profiles with idle instances.
+        """
+        self.size = max(1, size)
+        self.max_profiles = max(1, max_profiles)
+        self.created = 0
+        self.reused = 0
+        self._idle: 'OrderedDict[str, queue.LifoQueue[PooledYoutubeDL]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _idle_queue(self, profile: str) -> 'queue.LifoQueue[PooledYoutubeDL]':
+        """Get the idle queue of a profile, creating it and evicting the oldest if needed."""
+        evicted = []
+        with self._lock:
+            idle = self._idle.get(profile)
+            if idle is None:
+                idle = self._idle[profile] = queue.LifoQueue()
+                while len(self._idle) > self.max_profiles:
+                    evicted.append(self._idle.popitem(last=False)[1])
+            else:
+                self._idle.move_to_end(profile)
+        for old in evicted:
+            while not old.empty():
+                old.get_nowait().close()
+        return idle
+    
+    def warm(self, profile: str, ydl_opts: Dict, count: Optional[int] = None) -> None:
+        """
+        Pre-build idle instances for a profile.
+        
+        Args:
+            profile: Profile name.
+            ydl_opts: yt-dlp options of the profile.
+            count: Number of instances to have ready (defaults to pool size).
+        """
+        idle = self._idle_queue(profile)
+        for _ in range(min(count or self.size, self.size) - idle.qsize()):
+            idle.put(self._create(profile, ydl_opts))
+    
+    def _create(self, profile: str, ydl_opts: Dict) -> PooledYoutubeDL:
+        """Build a new instance and count it."""
+        self.created += 1
+        return PooledYoutubeDL(profile, ydl_opts)
+    
+    @contextmanager
+    def lease(
+        self,
+        profile: str,
+        ydl_opts: Dict,
+        outtmpl: Optional[str] = None,
+        progress_hook: Optional[Callable[[Dict], None]] = None,
+        postprocessor_hook: Optional[Callable[[Dict], None]] = None
+    ) -> Iterator['yt_dlp.YoutubeDL']:
+        """
+        Borrow a ``YoutubeDL`` instance for the duration of a job.
+        
+        Instances are exclusive to their borrower. An instance whose job
+        raised is closed rather than returned, so a failed job cannot leave
+        inconsistent state behind for the next one.
+        
+        Args:
+            profile: Profile name.
+            ydl_opts: yt-dlp options of the profile, used if a new instance
+                must be built.
+            outtmpl: Output template of the job.
+            progress_hook: Progress hook of the job.
+            postprocessor_hook: Postprocessor hook of the job.
+        
+        Yields:
+            A configured ``YoutubeDL`` instance.
+        """
+        idle = self._idle_queue(profile)
+        try:
+            pooled = idle.get_nowait()
+            self.reused += 1
+        except queue.Empty:
+            pooled = self._create(profile, ydl_opts)
+        
+        pooled.configure(
+            outtmpl=outtmpl,
+            progress_hook=progress_hook,
+            postprocessor_hook=postprocessor_hook
+        )
+        try:
+            yield pooled.ydl
+        except BaseException:
+            pooled.close()
+            raise
+        
+        pooled.reset()
+        if idle.qsize() < self.size and self._idle.get(profile) is idle:
+            idle.put(pooled)
+        else:
+            pooled.close()
+    
+    def stats(self) -> Dict:
+        """
+        Get pool statistics.
+        
+        Returns:
+            Dictionary with instance counts per profile and reuse counters.
+        """
+        return {
+            'created': self.created,
+            'reused': self.reused,
+            'idle': {profile: idle.qsize() for profile, idle in self._idle.items()},
+        }
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark application startup time.
+
+Measures, in fresh interpreter processes, how long it takes to import the
+``app`` package and run ``create_app()`` for each ``YTDLP_WARMUP`` mode, and
+whether yt-dlp was imported by then. Run it before and after changes touching
+module imports to catch startup regressions.
+
+Usage:
+    python benchmarks/bench_startup.py [runs]
+"""
+
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "yt_dlp_loaded": "yt_dlp" in sys.modules}))
+'''
+
+
+def measure(mode: str) -> dict:
+    """Run ``create_app()`` once in a fresh process with the given mode."""
+    env = {**os.environ, 'YTDLP_WARMUP': mode}
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    """Run the benchmark for every startup mode and print a summary."""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'mode':<12} {'create_app (ms)':>16} {'yt-dlp loaded':>14}")
+    for mode in ('lazy', 'background', 'eager'):
+        results = [measure(mode) for _ in range(runs)]
+        median = statistics.median(r['seconds'] for r in results) * 1000
+        print(f"{mode:<12} {median:>16.1f} {str(results[-1]['yt_dlp_loaded']):>14}")
+
+
+if __name__ == '__main__':
+    main()
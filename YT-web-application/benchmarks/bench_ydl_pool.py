@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-request YoutubeDL setup cost saved by the pool.
+
+Compares building a fresh ``yt_dlp.YoutubeDL`` for every request (the previous
+behaviour) with leasing a pre-warmed instance from ``YDLPool``. No network
+access is needed: only instance setup is measured, not extraction.
+
+Usage:
+    python benchmarks/bench_ydl_pool.py [iterations]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp  # noqa: E402
+from app.downloader import YouTubeDownloader  # noqa: E402
+from app.ydl_pool import YDLPool  # noqa: E402
+
+
+def bench_fresh(opts: dict, iterations: int) -> list:
+    """Time building and closing a new instance per request."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with yt_dlp.YoutubeDL({**opts, 'outtmpl': 'x.%(ext)s', 'progress_hooks': [print]}):
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_pooled(pool: YDLPool, profile: str, opts: dict, iterations: int) -> list:
+    """Time leasing and returning a pre-warmed instance per request."""
+    pool.warm(profile, opts)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with pool.lease(profile, opts, outtmpl='x.%(ext)s', progress_hook=print):
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    """Run the benchmark for each option profile and print a summary."""
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as folder:
+        downloader = YouTubeDownloader(folder)
+        profiles = {
+            'info': downloader._info_opts(),
+            'video-720': downloader._video_opts('720'),
+            'audio': downloader._audio_opts(),
+        }
+        pool = YDLPool(size=1)
+
+        print(f"{'profile':<12} {'fresh (ms)':>12} {'pooled (ms)':>12} {'saved (ms)':>12}")
+        for profile, opts in profiles.items():
+            fresh = statistics.median(bench_fresh(opts, iterations)) * 1000
+            pooled = statistics.median(bench_pooled(pool, profile, opts, iterations)) * 1000
+            print(f"{profile:<12} {fresh:>12.3f} {pooled:>12.3f} {fresh - pooled:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
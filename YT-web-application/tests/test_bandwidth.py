@@ -0,0 +1,174 @@
+"""
+Unit tests for bandwidth scheduling.
+
+This module contains test cases for fair sharing of the download rate limit.
+"""
+
+import os
+import contextlib
+import tempfile
+import time
+import unittest
+from unittest import mock
+from app.bandwidth import MIN_RATE, UNLIMITED, BandwidthScheduler
+from app.downloader import DownloadProgress, YouTubeDownloader
+
+
+class TestBandwidthScheduler(unittest.TestCase):
+    """Test cases for BandwidthScheduler class."""
+    
+    def test_jobs_share_the_global_rate(self):
+        """Test that running jobs get equal shares, returned on close."""
+        scheduler = BandwidthScheduler(rate=900)
+        first = scheduler.open()
+        second = scheduler.open()
+        third = scheduler.open()
+        
+        self.assertEqual([first.rate, second.rate, third.rate], [300, 300, 300])
+        
+        third.close()
+        self.assertEqual([first.rate, second.rate], [450, 450])
+    
+    def test_client_limit(self):
+        """Test that one client's jobs share its limit and others get the rest."""
+        scheduler = BandwidthScheduler(rate=1000, client_rate=200)
+        greedy = [scheduler.open('10.0.0.1') for _ in range(2)]
+        other = scheduler.open('10.0.0.2')
+        
+        self.assertEqual([lane.rate for lane in greedy], [100, 100])
+        self.assertEqual(other.rate, 200)
+        self.assertEqual(scheduler.ceiling, 200)
+    
+    def test_no_global_limit(self):
+        """Test that only the client limit applies without a global one."""
+        scheduler = BandwidthScheduler(client_rate=500)
+        lane = scheduler.open('10.0.0.1')
+        
+        self.assertEqual(lane.rate, 500)
+        self.assertEqual(scheduler.open('10.0.0.2').rate, 500)
+    
+    def test_source_limited_job_gives_up_share(self):
+        """Test that a job slower than its share leaves the rest to others."""
+        scheduler = BandwidthScheduler(rate=10 * MIN_RATE)
+        slow = scheduler.open()
+        fast = scheduler.open()
+        now = time.monotonic()
+        for lane in (slow, fast):
+            lane.window_start = now - 1
+        slow.window_bytes = MIN_RATE
+        fast.throttled = True
+        
+        with scheduler._lock:
+            scheduler._measure(now)
+            scheduler._rebalance(now)
+        
+        self.assertEqual(slow.rate, 1.5 * MIN_RATE)
+        self.assertEqual(fast.rate, 8.5 * MIN_RATE)
+        self.assertEqual(fast.demand, UNLIMITED)
+    
+    def test_debt_is_paid_by_waiting(self):
+        """Test that bytes over the share make the job wait, in bounded steps."""
+        scheduler = BandwidthScheduler(rate=1000, rebalance_interval=1.0)
+        lane = scheduler.open()
+        
+        self.assertAlmostEqual(scheduler.consume(lane, 500), 0.5, places=2)
+        self.assertEqual(scheduler.consume(lane, 5000), 1.0)
+        self.assertLess(lane.tokens, -5000)
+    
+    def test_resumed_file_is_not_charged(self):
+        """Test that bytes already on disk do not count against the share."""
+        # A frozen clock, so no tokens are earned between the calls
+        with mock.patch('time.monotonic', return_value=1000.0), mock.patch('time.sleep') as sleep:
+            scheduler = BandwidthScheduler(rate=1000)
+            lane = scheduler.open()
+            lane.update({'status': 'downloading', 'filename': 'a.part', 'downloaded_bytes': 10 ** 9})
+            lane.update({'status': 'downloading', 'filename': 'a.part', 'downloaded_bytes': 10 ** 9 + 100})
+        
+        sleep.assert_called_once_with(0.1)
+        self.assertEqual(lane.tokens, -100)
+
+
+class TestSharedBandwidth(unittest.TestCase):
+    """Test cases for schedulers of several processes sharing the limits."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, BandwidthScheduler.DB_FILENAME)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.tmp.cleanup()
+    
+    def rebalance(self, scheduler: BandwidthScheduler) -> None:
+        """Recompute a scheduler's shares, as on its next measurement."""
+        with scheduler._lock:
+            scheduler._rebalance(time.monotonic())
+    
+    def test_processes_share_the_global_rate(self):
+        """Test that jobs of two processes get equal shares of one limit."""
+        first = BandwidthScheduler(rate=900, path=self.path)
+        second = BandwidthScheduler(rate=900, path=self.path)
+        lane = first.open()
+        others = [second.open(), second.open()]
+        self.rebalance(first)
+        
+        self.assertEqual([lane.rate] + [other.rate for other in others], [300, 300, 300])
+        
+        for other in others:
+            other.close()
+        self.rebalance(first)
+        self.assertEqual(lane.rate, 900)
+    
+    def test_client_limit_across_processes(self):
+        """Test that a client's jobs in two processes share its limit."""
+        first = BandwidthScheduler(rate=1000, client_rate=200, path=self.path)
+        second = BandwidthScheduler(rate=1000, client_rate=200, path=self.path)
+        lane = first.open('10.0.0.1')
+        other = second.open('10.0.0.1')
+        self.rebalance(first)
+        
+        self.assertEqual([lane.rate, other.rate], [100, 100])
+    
+    def test_silent_process_is_left_out(self):
+        """Test that jobs of a process that stopped publishing expire."""
+        first = BandwidthScheduler(rate=900, path=self.path)
+        second = BandwidthScheduler(rate=900, path=self.path)
+        lane = first.open()
+        second.open()
+        second._conn.execute('UPDATE lanes SET updated_at = 0 WHERE scheduler = ?', (second.instance,))
+        self.rebalance(first)
+        
+        self.assertEqual(lane.rate, 900)
+
+
+class TestDownloaderBandwidth(unittest.TestCase):
+    """Test cases for bandwidth scheduling of downloads."""
+    
+    def test_lease_applies_share(self):
+        """Test that a leased instance is limited and its client registered."""
+        ydl = mock.Mock(params={})
+        hooks = {}
+        
+        @contextlib.contextmanager
+        def lease(profile, opts, outtmpl=None, progress_hook=None, postprocessor_hook=None):
+            hooks['progress'] = progress_hook
+            yield ydl
+        
+        scheduler = BandwidthScheduler(rate=1000, client_rate=400)
+        with tempfile.TemporaryDirectory() as folder:
+            downloader = YouTubeDownloader(folder, bandwidth=scheduler)
+            downloader.ydl_pool = mock.Mock(lease=lease)
+            downloader._job.client = '10.0.0.1'
+            
+            with downloader._lease('audio', {}, 'out', DownloadProgress()):
+                self.assertEqual(ydl.params['ratelimit'], 400)
+                self.assertEqual(scheduler.stats()['jobs'], [400])
+                lane = scheduler._lanes[0]
+                self.assertEqual(lane.client, '10.0.0.1')
+        
+        self.assertEqual(scheduler.stats()['jobs'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+"""
+Unit tests for batch downloads.
+
+This module contains test cases for batch expansion and aggregate progress.
+"""
+
+import os
+import time
+import tempfile
+import threading
+import unittest
+from app.batch import Batch, BatchManager, StoredBatch
+from app.job_store import JobStore
+from app.progress import ProgressRegistry
+
+
+def wait_for(batch: Batch, timeout: float = 5.0) -> None:
+    """Block until every item of the batch is done."""
+    deadline = time.time() + timeout
+    while not batch.done and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def expand(urls):
+    """Expand test URLs: 'list' stands for a playlist of two videos."""
+    entries = []
+    for url in urls:
+        if url == 'list':
+            entries += [{'id': 'a', 'url': 'a'}, {'id': 'b', 'url': 'b'}]
+        elif url == 'broken':
+            entries.append({'id': None, 'url': url, 'error': 'unavailable'})
+        else:
+            entries.append({'id': url, 'url': url})
+    return entries
+
+
+class TestBatchManager(unittest.TestCase):
+    """Test cases for BatchManager class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.registry = ProgressRegistry()
+    
+    def test_batch_dedupes_and_reports_progress(self):
+        """Test that duplicate videos run once and results are aggregated."""
+        manager = BatchManager(self.registry, workers=2)
+        calls = []
+        
+        def download(url, quality, progress):
+            calls.append(url)
+            if url == 'c':
+                raise Exception('boom')
+            return {'filename': f'{url}-{quality}.mp4'}
+        
+        batch = manager.submit(['list', 'a', 'c', 'broken'], expand, download, quality='720')
+        wait_for(batch)
+        data = batch.to_dict()
+        
+        self.assertEqual(sorted(calls), ['a', 'b', 'c'])
+        self.assertEqual(data['status'], Batch.FINISHED)
+        self.assertEqual(data['total'], 4)
+        self.assertEqual(data['finished'], 2)
+        self.assertEqual(data['failed'], 2)
+        self.assertEqual(data['duplicates'], 1)
+        self.assertEqual(data['percentage'], 50.0)
+        self.assertEqual(data['items'][0]['filename'], 'a-720.mp4')
+        self.assertEqual(data['items'][2]['error'], 'boom')
+        self.assertEqual(data['items'][3]['error'], 'unavailable')
+        self.assertIs(manager.get(batch.id), batch)
+    
+    def test_batch_concurrency_and_limit(self):
+        """Test that items are truncated and run on a bounded pool."""
+        manager = BatchManager(self.registry, workers=2, max_items=3)
+        release = threading.Event()
+        running = []
+        peak = []
+        lock = threading.Lock()
+        
+        def download(url, progress):
+            with lock:
+                running.append(url)
+                peak.append(len(running))
+            release.wait(5)
+            with lock:
+                running.remove(url)
+            return {'filename': url}
+        
+        batch = manager.submit(['1', '2', '3', '4', '5'], expand, download)
+        deadline = time.time() + 5
+        while len(running) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(batch.status, Batch.RUNNING)
+        release.set()
+        wait_for(batch)
+        
+        self.assertEqual(batch.to_dict()['total'], 3)
+        self.assertEqual(batch.truncated, 2)
+        self.assertLessEqual(max(peak), 2)
+    
+    def test_expansion_failure(self):
+        """Test that a failing expansion fails the batch."""
+        def broken(urls):
+            raise Exception('no network')
+        
+        manager = BatchManager(self.registry, workers=1)
+        batch = manager.submit(['x'], broken, lambda url, progress: {})
+        wait_for(batch)
+        
+        self.assertEqual(batch.status, Batch.FAILED)
+        self.assertEqual(batch.to_dict()['error'], 'no network')
+    
+    def test_retention_counts_from_finish(self):
+        """Test that a long batch stays queryable after it finishes."""
+        manager = BatchManager(self.registry, workers=1, retention=60)
+        batch = manager.submit(['a'], expand, lambda url, progress: {'filename': url})
+        wait_for(batch)
+        
+        # Created long ago, but just finished
+        batch.created_at -= 3600
+        manager._prune()
+        self.assertIs(manager.get(batch.id), batch)
+        
+        batch.expanded_at -= 3600
+        batch.items[0].job.finished_at -= 3600
+        manager._prune()
+        self.assertIsNone(manager.get(batch.id))
+
+
+
+class TestBatchPersistence(unittest.TestCase):
+    """Test cases for batches kept in the job store."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, JobStore.DB_FILENAME)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.tmp.cleanup()
+    
+    def manager(self, store: JobStore) -> BatchManager:
+        """Create a batch manager of one worker process."""
+        return BatchManager(ProgressRegistry(), workers=1, store=store, sync_interval=60)
+    
+    def test_other_process_reads_batch(self):
+        """Test that a batch is reported by a process that does not run it."""
+        running = self.manager(JobStore(self.path))
+        batch = running.submit(['list'], expand, lambda url, progress: {'filename': url}, kind='video')
+        wait_for(batch)
+        running.sync()
+        
+        stored = self.manager(JobStore(self.path)).get(batch.id)
+        
+        self.assertIsInstance(stored, StoredBatch)
+        self.assertEqual(stored.status, Batch.FINISHED)
+        self.assertEqual(stored.to_dict(), batch.to_dict())
+    
+    def test_interrupted_batch_runs_again(self):
+        """Test that a batch of a stopped process is taken over under its id."""
+        stopped = JobStore(self.path, lease=0)
+        release = threading.Event()
+        batch = self.manager(stopped).submit(
+            ['list'], expand, lambda url, progress: release.wait(5) and {}, kind='audio', quality='128'
+        )
+        restarted = self.manager(JobStore(self.path, lease=0))
+        calls = []
+        
+        def resolve(record):
+            if record['kind'] != 'audio':
+                return None
+            return expand, lambda url, quality, progress: calls.append((url, quality)) or {}
+        
+        try:
+            self.assertEqual(restarted.recover(resolve), 1)
+            resumed = restarted.get(batch.id)
+            wait_for(resumed)
+        finally:
+            release.set()
+        
+        self.assertIsInstance(resumed, Batch)
+        self.assertEqual(resumed.status, Batch.FINISHED)
+        self.assertEqual(sorted(calls), [('a', '128'), ('b', '128')])
+        self.assertEqual(restarted.recover(resolve), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
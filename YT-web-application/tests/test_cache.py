@@ -0,0 +1,71 @@
+"""
+Unit tests for the TTL cache.
+
+This module contains test cases for caching, expiry and persistence.
+"""
+
+import os
+import tempfile
+import unittest
+from app.cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    """Test cases for TTLCache class."""
+    
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', {'title': 'A'})
+        
+        self.assertEqual(cache.get('a'), {'title': 'A'})
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+    
+    def test_peek_is_not_counted(self):
+        """Test that peeking neither counts nor refreshes an entry."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        
+        self.assertEqual(cache.peek('a'), 1)
+        self.assertIsNone(cache.peek('missing'))
+        cache.set('c', 3)
+        
+        self.assertIsNone(cache.peek('a'))
+        self.assertEqual(cache.stats()['hits'] + cache.stats()['misses'], 0)
+    
+    def test_expiry(self):
+        """Test that expired entries are not returned."""
+        cache = TTLCache(maxsize=2, ttl=-1)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+    
+    def test_persistence(self):
+        """Test that entries survive a reload from disk."""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'cache.json')
+            TTLCache(ttl=60, path=path).set('a', {'title': 'A'})
+            
+            reloaded = TTLCache(ttl=60, path=path)
+            self.assertEqual(reloaded.get('a'), {'title': 'A'})
+
+
+if __name__ == '__main__':
+    unittest.main()
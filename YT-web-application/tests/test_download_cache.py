@@ -0,0 +1,143 @@
+"""
+Unit tests for the download cache.
+
+This module contains test cases for the finished-file index and aliases.
+"""
+
+import os
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from app.download_cache import DownloadCache
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class TestDownloadCache(unittest.TestCase):
+    """Test cases for DownloadCache class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        (self.folder / 'Song [abc audio-192].mp3').write_bytes(b'data')
+        self.key = ('abc', 'audio', '192', 'mp3')
+        self.cache = DownloadCache(self.tmp.name)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.tmp.cleanup()
+    
+    def test_store_and_lookup(self):
+        """Test that stored entries are found again after a reload."""
+        self.assertIsNone(self.cache.lookup(self.key))
+        self.cache.store(self.key, str(self.folder / 'Song [abc audio-192].mp3'), 'Song')
+        
+        entry = DownloadCache(self.tmp.name).lookup(self.key)
+        self.assertEqual(entry['filename'], 'Song [abc audio-192].mp3')
+        self.assertEqual(entry['title'], 'Song')
+    
+    def test_lookup_drops_missing_files(self):
+        """Test that entries whose file was deleted are forgotten."""
+        self.cache.store(self.key, 'Song [abc audio-192].mp3', 'Song')
+        (self.folder / 'Song [abc audio-192].mp3').unlink()
+        
+        self.assertIsNone(self.cache.lookup(self.key))
+    
+    def test_alias_is_hardlink(self):
+        """Test that aliases share the canonical file's data."""
+        name = self.cache.alias('Song [abc audio-192].mp3', 'mine.mp3')
+        
+        self.assertEqual(name, 'mine.mp3')
+        self.assertTrue(os.path.samefile(
+            self.folder / 'mine.mp3',
+            self.folder / 'Song [abc audio-192].mp3'
+        ))
+    
+    def test_alias_falls_back_to_mapping(self):
+        """Test name mapping when hardlinks are not supported."""
+        with mock.patch('os.link', side_effect=OSError('not supported')):
+            self.cache.alias('Song [abc audio-192].mp3', 'mine.mp3')
+        
+        self.assertFalse((self.folder / 'mine.mp3').exists())
+        self.assertEqual(
+            self.cache.resolve('mine.mp3'),
+            self.folder / 'Song [abc audio-192].mp3'
+        )
+        self.assertIsNone(self.cache.resolve('other.mp3'))
+    
+    
+    def test_index_is_shared(self):
+        """Test that entries stored through one instance are seen by another."""
+        other = DownloadCache(self.tmp.name)
+        self.cache.store(self.key, 'Song [abc audio-192].mp3', 'Song')
+        
+        self.assertEqual(other.lookup(self.key)['title'], 'Song')
+        self.assertEqual(other.stats()['size'], 1)
+    
+    def test_lookup_without_counting(self):
+        """Test that re-checks do not skew the hit ratio."""
+        self.cache.lookup(self.key)
+        self.cache.lookup(self.key, count=False)
+        
+        self.assertEqual(self.cache.stats()['misses'], 1)
+    
+    def test_locked_is_exclusive(self):
+        """Test that a key lock is held until the block exits."""
+        if fcntl is None:
+            self.skipTest('fcntl not available')
+        
+        with self.cache.locked(self.key):
+            lock_file = next((self.folder / DownloadCache.LOCK_DIRNAME).iterdir())
+            with open(lock_file, 'a') as f:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        
+        with open(lock_file, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    
+    def test_imports_legacy_json_index(self):
+        """Test that an index written by older versions is carried over."""
+        (self.folder / 'Clip [def video-720].mp4').write_bytes(b'data')
+        legacy = self.folder / DownloadCache.LEGACY_INDEX_FILENAME
+        legacy.write_text(json.dumps({
+            'entries': {'def|video|720|mp4': {
+                'filename': 'Clip [def video-720].mp4', 'title': 'Clip', 'created_at': 1.0
+            }},
+            'aliases': {'clip.mp4': 'Clip [def video-720].mp4'},
+        }))
+        
+        cache = DownloadCache(self.tmp.name)
+        
+        self.assertFalse(legacy.exists())
+        self.assertEqual(cache.lookup(('def', 'video', '720', 'mp4'))['title'], 'Clip')
+        self.assertEqual(cache.resolve('clip.mp4'), self.folder / 'Clip [def video-720].mp4')
+    
+    def test_internal_names_are_not_resolved(self):
+        """Test that dotfiles and names outside the folder are never served."""
+        (self.folder / '.hidden').write_bytes(b'data')
+        
+        for name in ('.hidden', DownloadCache.INDEX_FILENAME, '..', '../etc/passwd', ''):
+            with self.subTest(name=name):
+                self.assertIsNone(self.cache.resolve(name))
+    
+    def test_state_dir(self):
+        """Test that the index and locks can live outside the served folder."""
+        with tempfile.TemporaryDirectory() as state:
+            cache = DownloadCache(self.tmp.name, state)
+            cache.store(self.key, 'Song [abc audio-192].mp3', 'Song')
+            with cache.locked(self.key):
+                pass
+            
+            self.assertTrue((Path(state) / DownloadCache.INDEX_FILENAME).exists())
+            self.assertTrue((Path(state) / DownloadCache.LOCK_DIRNAME).is_dir())
+            self.assertEqual(DownloadCache(self.tmp.name, state).lookup(self.key)['title'], 'Song')
+
+
+if __name__ == '__main__':
+    unittest.main()
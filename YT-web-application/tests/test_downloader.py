@@ -5,9 +5,19 @@ This module contains test cases for the downloader functionality.
 """
 
 import unittest
+import contextlib
 import os
+import shutil
+import threading
+import time
 from pathlib import Path
-from app.downloader import YouTubeDownloader, DownloadProgress
+from unittest import mock
+import yt_dlp
+from app.cache import TTLCache
+from app.download_cache import DownloadCache
+from app.downloader import YouTubeDownloader, DownloadProgress, clip_tag, make_clip
+from app.fragments import FragmentTuner
+from app.storage import StorageManager
 
 
 class TestDownloadProgress(unittest.TestCase):
@@ -61,11 +71,8 @@ class TestYouTubeDownloader(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test fixtures."""
-        # Clean up downloaded files
-        if self.test_folder.exists():
-            for file in self.test_folder.glob('*'):
-                file.unlink()
-            self.test_folder.rmdir()
+        # Clean up downloaded files and cache lock files
+        shutil.rmtree(self.test_folder, ignore_errors=True)
     
     def test_initialization(self):
         """Test downloader initialization."""
@@ -79,6 +86,363 @@ class TestYouTubeDownloader(unittest.TestCase):
         self.assertIsInstance(progress, dict)
         self.assertIn('status', progress)
         self.assertIn('percentage', progress)
+    
+    def test_video_info_cached_by_video_id(self):
+        """Test that all URL forms of a video share one cache entry."""
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            info_cache=TTLCache(maxsize=8, ttl=60)
+        )
+        urls = [
+            'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+            'https://youtu.be/dQw4w9WgXcQ',
+            'https://www.youtube.com/embed/dQw4w9WgXcQ',
+        ]
+        
+        with mock.patch.object(
+            downloader, '_extract_video_info', return_value={'title': 'T'}
+        ) as extract:
+            for url in urls:
+                self.assertEqual(downloader.get_video_info(url), {'title': 'T'})
+        
+        extract.assert_called_once_with(urls[0])
+        self.assertEqual(downloader.info_cache.stats()['hits'], 2)
+    
+    def test_download_reuses_extraction(self):
+        """Test that a download starts from the cached extraction result."""
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            extraction_cache=TTLCache(maxsize=8, ttl=60)
+        )
+        downloader._remember_extraction(
+            'https://youtu.be/dQw4w9WgXcQ',
+            {'id': 'dQw4w9WgXcQ', 'formats': [], 'description': 'long'}
+        )
+        ydl = mock.Mock()
+        ydl.process_ie_result.return_value = {'id': 'dQw4w9WgXcQ'}
+        
+        info = downloader._extract_and_download(
+            ydl, 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+        )
+        
+        self.assertEqual(info, {'id': 'dQw4w9WgXcQ'})
+        ydl.process_ie_result.assert_called_once_with(
+            {'id': 'dQw4w9WgXcQ', 'formats': []}, download=True
+        )
+        ydl.extract_info.assert_not_called()
+    
+    def test_download_re_extracts_stale_info(self):
+        """Test fallback to a fresh extraction when cached info fails."""
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            extraction_cache=TTLCache(maxsize=8, ttl=60)
+        )
+        downloader._remember_extraction('https://youtu.be/abc', {'id': 'abc'})
+        ydl = mock.Mock()
+        ydl.process_ie_result.side_effect = yt_dlp.utils.DownloadError('403')
+        ydl.extract_info.return_value = {'id': 'abc'}
+        
+        info = downloader._extract_and_download(ydl, 'https://youtu.be/abc')
+        
+        self.assertEqual(info, {'id': 'abc'})
+        ydl.extract_info.assert_called_once_with(
+            'https://youtu.be/abc', download=True
+        )
+    
+    def test_repeat_download_served_from_cache(self):
+        """Test that a cached file is returned without downloading."""
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            download_cache=DownloadCache(str(self.test_folder))
+        )
+        canonical = self.test_folder / 'Song [abc audio-192].mp3'
+        canonical.write_bytes(b'data')
+        downloader.download_cache.store(
+            ('abc', 'audio', '192', 'mp3'), str(canonical), 'Song'
+        )
+        progress = DownloadProgress()
+        
+        with mock.patch('yt_dlp.YoutubeDL') as ydl_class:
+            result = downloader.download_audio(
+                'https://youtu.be/abc', quality='192',
+                filename='mine', progress=progress
+            )
+        
+        ydl_class.assert_not_called()
+        self.assertTrue(result['cached'])
+        self.assertEqual(result['filename'], 'mine.mp3')
+        self.assertEqual(result['title'], 'Song')
+        self.assertEqual(progress.percentage, 100.0)
+        self.assertIsNotNone(progress.closed_at)
+    
+    def test_identical_downloads_are_coalesced(self):
+        """Test that concurrent identical downloads run yt-dlp once."""
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            download_cache=DownloadCache(str(self.test_folder))
+        )
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        
+        def fetch(url, quality, output_template, key, progress):
+            calls.append(url)
+            progress.update({'status': 'downloading', 'total_bytes': 10, 'downloaded_bytes': 5})
+            started.set()
+            release.wait(5)
+            path = self.test_folder / 'Song [abc audio-192].mp3'
+            path.write_bytes(b'data')
+            return downloader._store_result(key, {
+                'success': True, 'filename': path.name,
+                'path': str(path), 'title': 'Song'
+            })
+        
+        results = {}
+        follower_progress = DownloadProgress()
+        
+        def run(name, progress=None):
+            results[name] = downloader._run_download(
+                fetch, 'audio', 'mp3', 'https://youtu.be/abc', '192', name, progress
+            )
+        
+        leader = threading.Thread(target=run, args=('first',))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=run, args=('second', follower_progress))
+        follower.start()
+        while follower_progress.version == 0:
+            time.sleep(0.01)
+        self.assertEqual(follower_progress.percentage, 50.0)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results['first']['filename'], 'first.mp3')
+        self.assertEqual(results['second']['filename'], 'second.mp3')
+        self.assertTrue((self.test_folder / 'second.mp3').exists())
+    
+    def test_download_finished_by_other_process(self):
+        """Test that a file stored while waiting for the key lock is used."""
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            download_cache=DownloadCache(str(self.test_folder))
+        )
+        cache = downloader.download_cache
+        key = ('abc', 'audio', '192', 'mp3')
+        locked = cache.locked
+        
+        @contextlib.contextmanager
+        def finished_meanwhile(lock_key):
+            # Another worker process held the lock and stored the file
+            path = self.test_folder / 'Song [abc audio-192].mp3'
+            path.write_bytes(b'data')
+            cache.store(lock_key, str(path), 'Song')
+            with locked(lock_key):
+                yield
+        
+        fetch = mock.Mock()
+        progress = DownloadProgress()
+        with mock.patch.object(cache, 'locked', side_effect=finished_meanwhile):
+            result = downloader._run_download(
+                fetch, 'audio', 'mp3', 'https://youtu.be/abc', '192', None, progress
+            )
+        
+        fetch.assert_not_called()
+        self.assertTrue(result['cached'])
+        self.assertEqual(result['filename'], 'Song [abc audio-192].mp3')
+        self.assertEqual(progress.percentage, 100.0)
+        self.assertEqual(cache.stats()['misses'], 1)
+    
+    def test_audio_download_copies_matching_codec(self):
+        """Test that audio is remuxed, not re-encoded, when the codec fits."""
+        source = self.test_folder / 'Song.webm'
+        info = {
+            'id': 'abc', 'title': 'Song', 'ext': 'webm', 'acodec': 'opus',
+            'requested_downloads': [{'filepath': str(source)}],
+        }
+        
+        with mock.patch('yt_dlp.YoutubeDL') as ydl_class:
+            ydl = ydl_class.return_value
+            ydl.params = {'outtmpl': {}}
+            ydl._postprocessor_hooks = []
+            ydl.extract_info.return_value = info
+            ydl.run_pp.return_value = {'filepath': str(self.test_folder / 'Song.opus')}
+            result = self.downloader.download_audio(
+                'https://youtu.be/abc', audio_format='opus'
+            )
+        
+        self.assertNotIn('postprocessors', ydl_class.call_args[0][0])
+        self.assertEqual(type(ydl.run_pp.call_args[0][0]).__name__, 'FFmpegExtractAudioPP')
+        self.assertEqual(ydl.run_pp.call_args[0][1]['filepath'], str(source))
+        self.assertEqual(result['filename'], 'Song.opus')
+        self.assertEqual(result['transcode']['action'], 'remux')
+    
+    def test_bitrates_encoded_from_shared_source(self):
+        """Test that a second bitrate is encoded locally without downloading."""
+        transcoder = mock.Mock()
+        transcoder.transcode.return_value = 0.5
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            download_cache=DownloadCache(str(self.test_folder)),
+            transcoder=transcoder
+        )
+        source = self.test_folder / 'Song [abc audio-best-source].webm'
+        source.write_bytes(b'data')
+        info = {
+            'id': 'abc', 'title': 'Song', 'ext': 'webm', 'acodec': 'opus',
+            'requested_downloads': [{'filepath': str(source)}],
+        }
+        
+        with mock.patch('yt_dlp.YoutubeDL') as ydl_class:
+            ydl = ydl_class.return_value
+            ydl.params = {'outtmpl': {}}
+            ydl.extract_info.return_value = info
+            first = downloader.download_audio('https://youtu.be/abc', quality='192')
+            second = downloader.download_audio('https://youtu.be/abc', quality='128')
+        
+        ydl.extract_info.assert_called_once()
+        self.assertEqual(first['filename'], 'Song [abc audio-192].mp3')
+        self.assertEqual(second['filename'], 'Song [abc audio-128].mp3')
+        self.assertEqual(second['transcode']['action'], 'transcode')
+        self.assertEqual(second['transcode']['seconds'], 0.5)
+        calls = transcoder.transcode.call_args_list
+        self.assertEqual([call[0][0] for call in calls], [str(source)] * 2)
+        self.assertEqual(calls[1][0][3], '128')
+    
+    def test_shared_source_pinned_while_transcoding(self):
+        """Test that storage sweeps cannot evict the source during an encode."""
+        storage = StorageManager(
+            str(self.test_folder), quota=1, grace_period=0, state_dir=str(self.test_folder)
+        )
+        transcoder = mock.Mock()
+        transcoder.transcode.side_effect = lambda *args: storage.enforce()
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            download_cache=DownloadCache(str(self.test_folder)),
+            transcoder=transcoder
+        )
+        source = self.test_folder / 'Song [abc audio-best-source].webm'
+        source.write_bytes(b'data')
+        info = {
+            'id': 'abc', 'title': 'Song', 'ext': 'webm', 'acodec': 'opus',
+            'requested_downloads': [{'filepath': str(source)}],
+        }
+        
+        with mock.patch('yt_dlp.YoutubeDL') as ydl_class:
+            ydl = ydl_class.return_value
+            ydl.params = {'outtmpl': {}}
+            ydl.extract_info.return_value = info
+            result = downloader.download_audio('https://youtu.be/abc', quality='192')
+        
+        self.assertEqual(result['transcode']['seconds'], 0)
+        self.assertTrue(source.exists())
+        self.assertEqual(storage.enforce(), 4)
+    
+    def test_audio_clip_fetches_only_its_range(self):
+        """Test that a clip is downloaded by range and cached apart."""
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            download_cache=DownloadCache(str(self.test_folder)),
+            transcoder=mock.Mock()
+        )
+        clip = self.test_folder / 'Song [abc audio-192-clip30-90].webm'
+        ranges = []
+        
+        def extract_info(url, download):
+            ranges.append(list(ydl.params['download_ranges']({}, ydl)))
+            return {
+                'id': 'abc', 'title': 'Song', 'ext': 'webm', 'acodec': 'opus',
+                'requested_downloads': [{'filepath': str(clip)}],
+            }
+        
+        with mock.patch('yt_dlp.YoutubeDL') as ydl_class:
+            ydl = ydl_class.return_value
+            ydl.params = {'outtmpl': {}}
+            ydl._postprocessor_hooks = []
+            ydl.extract_info.side_effect = extract_info
+            ydl.run_pp.return_value = {'filepath': str(clip.with_suffix('.mp3'))}
+            result = downloader.download_audio('https://youtu.be/abc', start=30, end=90)
+            
+            self.assertEqual(ranges, [[{'start_time': 30.0, 'end_time': 90.0}]])
+            self.assertEqual(result['filename'], 'Song [abc audio-192-clip30-90].mp3')
+            downloader.transcoder.transcode.assert_not_called()
+            
+            # The pooled instance does not keep the range for the next job
+            with downloader._lease('audio', {}, 'out', DownloadProgress()) as leased:
+                self.assertNotIn('download_ranges', leased.params)
+    
+    def test_invalid_clip(self):
+        """Test that empty or negative time ranges are rejected."""
+        self.assertEqual(make_clip(None, None), None)
+        self.assertEqual(make_clip(0, None), None)
+        self.assertEqual(clip_tag(make_clip(30, None)), 'clip30-end')
+        for start, end in ((60, 30), (-5, 10), (10, 10)):
+            with self.assertRaises(ValueError):
+                self.downloader.download_video('https://youtu.be/abc', start=start, end=end)
+    
+    def test_unsupported_audio_format(self):
+        """Test that unknown audio formats are rejected."""
+        with self.assertRaises(ValueError):
+            self.downloader.download_audio('https://youtu.be/abc', audio_format='wav')
+    
+    def test_segmented_formats_need_fragment_tuner(self):
+        """Test that DASH/HLS are only selected with parallel fragments."""
+        sequential = self.downloader._get_base_ydl_opts()
+        parallel = YouTubeDownloader(
+            str(self.test_folder), fragment_tuner=FragmentTuner()
+        )._get_base_ydl_opts()
+        
+        self.assertEqual(sequential['extractor_args']['youtube']['skip'], ['hls', 'dash'])
+        self.assertNotIn('skip', parallel['extractor_args']['youtube'])
+    
+    def test_expand_urls(self):
+        """Test that playlists are listed flat and videos are taken as is."""
+        playlist = {
+            '_type': 'playlist',
+            'entries': [
+                {'id': 'aaa', 'url': 'https://www.youtube.com/watch?v=aaa', 'title': 'A'},
+                {'id': 'bbb', 'url': 'https://www.youtube.com/watch?v=bbb', 'title': 'B'},
+                None,
+            ],
+        }
+        
+        with mock.patch('yt_dlp.YoutubeDL') as ydl_class:
+            ydl_class.return_value.extract_info.return_value = playlist
+            entries = self.downloader.expand_urls([
+                'https://youtu.be/abc',
+                'https://www.youtube.com/playlist?list=PL1',
+            ])
+        
+        ydl_class.return_value.extract_info.assert_called_once_with(
+            'https://www.youtube.com/playlist?list=PL1', download=False
+        )
+        self.assertEqual(ydl_class.call_args[0][0]['extract_flat'], 'in_playlist')
+        self.assertEqual([entry['id'] for entry in entries], ['abc', 'aaa', 'bbb'])
+        self.assertEqual(entries[1]['title'], 'A')
+    
+    def test_stream_download_keeps_source_format(self):
+        """Test that streamed downloads skip conversion and keep their extension."""
+        downloader = YouTubeDownloader(
+            str(self.test_folder),
+            download_cache=DownloadCache(str(self.test_folder))
+        )
+        opts = downloader._stream_opts('audio', 'best')
+        self.assertTrue(opts['nopart'])
+        self.assertNotIn('postprocessors', opts)
+        
+        canonical = self.test_folder / 'Song [abc audio-best-stream].m4a'
+        canonical.write_bytes(b'data')
+        downloader.download_cache.store(
+            ('abc', 'audio', 'best', 'stream'), str(canonical), 'Song'
+        )
+        
+        result = downloader.download_stream(
+            'https://youtu.be/abc', download_type='audio', filename='mine'
+        )
+        
+        self.assertTrue(result['cached'])
+        self.assertEqual(result['filename'], 'mine.m4a')
 
 
 if __name__ == '__main__':
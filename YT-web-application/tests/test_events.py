@@ -0,0 +1,88 @@
+"""
+Unit tests for the progress event pipeline.
+
+This module contains test cases for event coalescing and rate limiting.
+"""
+
+import time
+import unittest
+from app.events import ProgressEvent, ProgressEvents
+
+
+def event(key: str, downloaded: int, status: str = 'downloading') -> ProgressEvent:
+    """Build a test event of a 100-byte download."""
+    return ProgressEvent.from_hook(key, {
+        'status': status,
+        'downloaded_bytes': downloaded,
+        'total_bytes': 100,
+        'filename': f'{key}.mp4',
+    })
+
+
+def wait_until(predicate, timeout: float = 5.0) -> None:
+    """Poll until ``predicate`` holds or the timeout expires."""
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestProgressEvents(unittest.TestCase):
+    """Test cases for ProgressEvents class."""
+    
+    def test_event_from_hook(self):
+        """Test the compact event built from yt-dlp data."""
+        self.assertEqual(event('a', 25).percentage, 25.0)
+        self.assertEqual(event('a', 25, 'finished').percentage, 100.0)
+    
+    def test_events_are_coalesced_per_download(self):
+        """Test that a subscriber gets only the latest event of each download."""
+        events = ProgressEvents()
+        batches = []
+        events.subscribe(batches.append, interval=60)
+        
+        events.publish(event('a', 10))
+        wait_until(lambda: batches)
+        for downloaded in range(20, 100, 10):
+            events.publish(event('a', downloaded))
+        events.publish(event('b', 5))
+        time.sleep(0.1)
+        
+        # The first event went out at once; the rest waits for the interval
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0][0].downloaded, 10)
+    
+    def test_subscribers_have_own_rates(self):
+        """Test that a fast subscriber is not held back by a slow one."""
+        events = ProgressEvents()
+        fast = []
+        slow = []
+        events.subscribe(fast.append, interval=0.01)
+        events.subscribe(slow.append, interval=60)
+        
+        events.publish(event('a', 10))
+        wait_until(lambda: fast)
+        time.sleep(0.05)
+        events.publish(event('a', 90))
+        wait_until(lambda: len(fast) == 2)
+        
+        self.assertEqual([batch[0].downloaded for batch in fast], [10, 90])
+        self.assertEqual(len(slow), 1)
+    
+    def test_failing_subscriber_is_isolated(self):
+        """Test that an exception in one subscriber does not stop delivery."""
+        def broken(batch):
+            raise Exception('boom')
+        
+        events = ProgressEvents()
+        received = []
+        events.subscribe(broken, interval=0.01)
+        events.subscribe(received.append, interval=0.01)
+        
+        events.publish(event('a', 10))
+        wait_until(lambda: received)
+        
+        self.assertEqual(received[0][0].key, 'a')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Unit tests for fragment concurrency tuning.
+
+This module contains test cases for FragmentTuner and FragmentSession.
+"""
+
+import unittest
+from app.fragments import FragmentSession, FragmentTuner
+
+
+class TestFragmentTuner(unittest.TestCase):
+    """Test cases for FragmentTuner class."""
+    
+    def test_global_cap(self):
+        """Test that slots are capped across jobs with one slot minimum."""
+        tuner = FragmentTuner(max_total=6, max_per_job=4, initial=4)
+        
+        self.assertEqual(tuner.acquire(), 4)
+        self.assertEqual(tuner.acquire(), 2)
+        self.assertEqual(tuner.acquire(), 1)
+        tuner.release(4)
+        self.assertEqual(tuner.in_use, 3)
+        self.assertEqual(tuner.stats()['max_total'], 6)
+    
+    def test_climbs_while_throughput_scales(self):
+        """Test that the level rises while it pays off and settles otherwise."""
+        tuner = FragmentTuner(max_total=16, max_per_job=8, initial=2)
+        
+        tuner.observe(2, 2e6)
+        self.assertEqual(tuner.target, 4)
+        tuner.observe(4, 4e6)
+        self.assertEqual(tuner.target, 8)
+        tuner.observe(8, 4.1e6)
+        # 8 is not meaningfully faster than 4, so the lower level wins
+        self.assertEqual(tuner.target, 4)
+    
+    def test_backs_off_when_slower(self):
+        """Test that a level that got slower is abandoned."""
+        tuner = FragmentTuner(max_total=16, max_per_job=4, initial=2, smoothing=1.0)
+        tuner.observe(2, 3e6)
+        tuner.observe(4, 1e6)
+        
+        self.assertEqual(tuner.target, 2)
+
+
+class TestFragmentSession(unittest.TestCase):
+    """Test cases for FragmentSession class."""
+    
+    def test_session_retunes_between_formats(self):
+        """Test that a finished segmented format updates the next format's level."""
+        tuner = FragmentTuner(max_total=16, max_per_job=8, initial=2)
+        session = FragmentSession(tuner)
+        params = {}
+        
+        session.start(params)
+        self.assertEqual(params['concurrent_fragment_downloads'], 2)
+        
+        session.update({'status': 'downloading', 'fragment_index': 1, 'fragment_count': 10})
+        session.update({'status': 'finished', 'downloaded_bytes': 4e6, 'elapsed': 2})
+        
+        self.assertEqual(params['concurrent_fragment_downloads'], 4)
+        self.assertEqual(tuner.in_use, 4)
+        session.close()
+        self.assertEqual(tuner.in_use, 0)
+    
+    def test_unsegmented_download_is_not_measured(self):
+        """Test that plain HTTP downloads do not feed the tuner."""
+        tuner = FragmentTuner(initial=2)
+        session = FragmentSession(tuner)
+        session.start({})
+        session.update({'status': 'finished', 'downloaded_bytes': 1e6, 'elapsed': 1})
+        session.close()
+        
+        self.assertEqual(tuner.stats()['throughput'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+"""
+Unit tests for process isolation.
+
+This module contains test cases for the worker pool and the downloader that
+runs yt-dlp in it.
+"""
+
+import os
+import queue
+import signal
+import tempfile
+import time
+import unittest
+import multiprocessing
+from unittest import mock
+from app.cache import TTLCache
+from app.downloader import DownloadProgress
+from app.isolation import (
+    PROGRESS, ProcessDownloader, WorkerError, WorkerPool, _RelayProgress, rss_mb,
+)
+
+
+def run_pool_and_die(folder: str, pids: multiprocessing.Queue) -> None:
+    """Start a pool, report its worker's pid and get killed (child process)."""
+    pool = WorkerPool({'download_folder': folder}, workers=1)
+    pool.start()
+    pids.put(next(iter(pool._workers)))
+    pids.close()
+    pids.join_thread()
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def is_running(pid: int) -> bool:
+    """Whether a process exists and has not exited (zombies count as exited)."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+class TestRelayProgress(unittest.TestCase):
+    """Test cases for progress sent from a worker process."""
+    
+    def test_downloading_updates_are_throttled(self):
+        """Test that only status changes and spaced updates are sent."""
+        channel = queue.Queue()
+        progress = _RelayProgress(channel, 7, interval=60)
+        
+        for downloaded in (10, 20, 30):
+            progress.update({
+                'status': 'downloading', 'downloaded_bytes': downloaded,
+                'total_bytes': 100, 'info_dict': {'formats': []}
+            })
+        progress.update({'status': 'finished', 'filename': '/downloads/a.mp3'})
+        
+        messages = [channel.get_nowait() for _ in range(channel.qsize())]
+        self.assertEqual([m[3]['status'] for m in messages], ['downloading', 'finished'])
+        self.assertEqual(messages[0][0], PROGRESS)
+        self.assertEqual(messages[0][2], 7)
+        self.assertNotIn('info_dict', messages[0][3])
+        self.assertEqual(progress.percentage, 100.0)
+
+
+class TestProcessDownloader(unittest.TestCase):
+    """Test cases for ProcessDownloader class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.pool = mock.Mock(spec=WorkerPool)
+        self.downloader = ProcessDownloader(self.pool, info_cache=TTLCache())
+    
+    def test_progress_is_mirrored(self):
+        """Test that relayed progress updates the caller's record."""
+        def call(method, args, kwargs, on_progress):
+            on_progress({'status': 'downloading', 'downloaded_bytes': 50, 'total_bytes': 100})
+            self.assertEqual(progress.percentage, 50.0)
+            return {'success': True, 'filename': 'a.mp3'}
+        
+        self.pool.call.side_effect = call
+        progress = DownloadProgress()
+        result = self.downloader.download_audio(
+            'https://youtu.be/abc', quality='128', progress=progress, audio_format='opus'
+        )
+        
+        self.assertEqual(result['filename'], 'a.mp3')
+        method, args, kwargs = self.pool.call.call_args[0]
+        self.assertEqual(method, 'download_audio')
+        self.assertEqual(args, ('https://youtu.be/abc', '128', None))
+        self.assertEqual(kwargs, {'audio_format': 'opus', 'client': None, 'start': None, 'end': None})
+        self.assertIsNotNone(progress.closed_at)
+    
+    def test_failure_is_recorded(self):
+        """Test that a worker's error reaches the progress record."""
+        self.pool.call.side_effect = WorkerError('Failed to download video: gone')
+        progress = DownloadProgress()
+        
+        with self.assertRaises(WorkerError):
+            self.downloader.download_video('https://youtu.be/abc', progress=progress)
+        
+        self.assertEqual(progress.error, 'Failed to download video: gone')
+        self.assertIsNotNone(progress.closed_at)
+    
+    def test_video_info_cached_in_web_process(self):
+        """Test that repeated info lookups do not reach a worker."""
+        self.pool.call.return_value = {'title': 'Song'}
+        
+        self.downloader.get_video_info('https://youtu.be/dQw4w9WgXcQ')
+        info = self.downloader.get_video_info('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+        
+        self.assertEqual(info['title'], 'Song')
+        self.pool.call.assert_called_once()
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Test cases for WorkerPool class, with real worker processes."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = WorkerPool(
+            {'download_folder': self.tmp.name},
+            workers=1,
+            max_jobs=1,
+            poll_interval=0.1
+        )
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.pool.close()
+        self.tmp.cleanup()
+    
+    def test_worker_recycled_after_max_jobs(self):
+        """Test that calls keep working while workers are replaced."""
+        url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+        
+        for _ in range(2):
+            entries = self.pool.call('expand_urls', ([url],))
+            self.assertEqual(entries, [{'id': 'dQw4w9WgXcQ', 'url': url, 'title': None}])
+        
+        deadline = time.monotonic() + 30
+        while self.pool.stats()['recycled'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.pool.stats()['recycled'], 2)
+        self.assertEqual(self.pool.stats()['crashed'], 0)
+    
+    def test_killed_worker_is_replaced(self):
+        """Test that the pool keeps serving after a worker died."""
+        self.pool.start()
+        next(iter(self.pool._workers.values())).process.kill()
+        
+        entries = self.pool.call('expand_urls', (['https://youtu.be/dQw4w9WgXcQ'],))
+        
+        self.assertEqual(entries[0]['id'], 'dQw4w9WgXcQ')
+    
+    def test_error_is_raised_in_caller(self):
+        """Test that an exception in the worker reaches the caller."""
+        with self.assertRaises(WorkerError):
+            self.pool.call('no_such_method')
+    
+    def test_worker_exits_with_web_process(self):
+        """Test that workers do not outlive a killed web process."""
+        if not os.path.isdir('/proc'):
+            self.skipTest('Needs /proc')
+        context = multiprocessing.get_context('spawn')
+        pids = context.Queue()
+        parent = context.Process(target=run_pool_and_die, args=(self.tmp.name, pids))
+        parent.start()
+        worker = pids.get(timeout=30)
+        parent.join(30)
+        
+        deadline = time.monotonic() + 30
+        while is_running(worker) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(is_running(worker))
+    
+    def test_rss(self):
+        """Test that the memory reading is plausible."""
+        self.assertGreater(rss_mb(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+Unit tests for the job store.
+
+This module contains test cases for persisting jobs in SQLite.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from app.job_store import JobStore
+
+
+def record(job_id: str, status: str = 'queued', **fields) -> dict:
+    """Build job fields as produced by ``Job.to_record``."""
+    return {
+        'id': job_id,
+        'kind': 'audio',
+        'params': {'url': 'https://youtu.be/abc', 'quality': '192'},
+        'status': status,
+        'result': None,
+        'error': None,
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        **fields,
+    }
+
+
+class TestJobStore(unittest.TestCase):
+    """Test cases for JobStore class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, JobStore.DB_FILENAME)
+        self.store = JobStore(self.path)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.tmp.cleanup()
+    
+    def test_state_changes_survive_reopen(self):
+        """Test that a job's latest state and history are read back."""
+        self.store.save(record('a'))
+        self.store.save(record('a', 'running', started_at=1.0))
+        self.store.save(record(
+            'a', 'finished', started_at=1.0, finished_at=2.0,
+            result={'path': '/downloads/a.mp3', 'title': 'A'}
+        ))
+        
+        store = JobStore(self.path)
+        job = store.get('a')
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual(job['params']['quality'], '192')
+        self.assertEqual(job['result']['title'], 'A')
+        self.assertEqual(job['path'], '/downloads/a.mp3')
+        self.assertEqual(job['attempts'], 1)
+        self.assertEqual([status for status, _ in store.events('a')], ['queued', 'running', 'finished'])
+    
+    def test_wal_mode(self):
+        """Test that the database uses write-ahead logging."""
+        mode = self.store._conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+    
+    def expire(self, store: JobStore) -> None:
+        """Make the lease of a store instance run out, as if its process died."""
+        self.store._conn.execute(
+            'UPDATE instances SET heartbeat = ? WHERE token = ?',
+            (time.time() - store.lease - 1, store.instance)
+        )
+    
+    def test_interrupted(self):
+        """Test that unfinished jobs of instances whose lease expired count as interrupted."""
+        self.store.save(record('queued', created_at=2.0))
+        self.store.save(record('running', 'running', created_at=1.0))
+        self.store.save(record('done', 'finished', finished_at=3.0))
+        other = JobStore(self.path)
+        
+        # Owned by this instance, then by a live one
+        self.assertEqual(self.store.interrupted(), [])
+        self.assertEqual(other.interrupted(), [])
+        
+        self.expire(self.store)
+        interrupted = other.interrupted()
+        self.assertEqual([job['id'] for job in interrupted], ['running', 'queued'])
+    
+    def test_restart_with_same_pid(self):
+        """Test that jobs are recovered after a restart that reuses the pid."""
+        self.store.save(record('a', 'running'))
+        self.expire(self.store)
+        
+        # The restarted process gets the same pid, as in a new container
+        restarted = JobStore(self.path)
+        pids = [row['pid'] for row in restarted._conn.execute('SELECT pid FROM instances')]
+        self.assertEqual(pids, [os.getpid(), os.getpid()])
+        
+        self.assertEqual([job['id'] for job in restarted.interrupted()], ['a'])
+    
+    def test_heartbeat_keeps_jobs(self):
+        """Test that renewing the lease keeps jobs from being taken over."""
+        self.store.save(record('a'))
+        self.expire(self.store)
+        self.store.heartbeat()
+        
+        self.assertEqual(JobStore(self.path).interrupted(), [])
+    
+    def test_claim_once(self):
+        """Test that only one process can take over an interrupted job."""
+        self.store.save(record('a'))
+        # Left behind by an instance that is no longer recorded
+        self.store._conn.execute("UPDATE jobs SET owner = 'gone'")
+        job = self.store.interrupted()[0]
+        
+        self.assertTrue(self.store.claim(job))
+        self.assertFalse(JobStore(self.path).claim(job))
+    
+    def test_batches(self):
+        """Test that batches are shared, and taken over once their owner is gone."""
+        batch = {
+            'id': 'b1', 'kind': 'video', 'urls': ['list'], 'params': {'quality': '720'},
+            'status': 'running', 'snapshot': {'status': 'running', 'total': 2},
+            'created_at': time.time(), 'finished_at': None,
+        }
+        self.store.save_batch(batch)
+        other = JobStore(self.path)
+        
+        self.assertEqual(other.get_batch('b1')['snapshot'], {'status': 'running', 'total': 2})
+        self.assertEqual(other.interrupted_batches(), [])
+        
+        self.expire(self.store)
+        interrupted = other.interrupted_batches()
+        self.assertEqual([b['urls'] for b in interrupted], [['list']])
+        self.assertTrue(other.claim_batch(interrupted[0]))
+        self.assertFalse(JobStore(self.path).claim_batch(interrupted[0]))
+        
+        other.save_batch({**batch, 'status': 'finished', 'finished_at': 1.0})
+        other.prune(time.time() - 60)
+        self.assertIsNone(other.get_batch('b1'))
+    
+    def test_prune_and_delete(self):
+        """Test that old finished jobs and deleted jobs are gone with their events."""
+        self.store.save(record('old', 'finished', finished_at=1.0))
+        self.store.save(record('new', 'finished', finished_at=time.time()))
+        self.store.save(record('rejected'))
+        
+        self.assertEqual(self.store.prune(time.time() - 60), 1)
+        self.store.delete('rejected')
+        
+        self.assertIsNone(self.store.get('old'))
+        self.assertIsNone(self.store.get('rejected'))
+        self.assertEqual(self.store.events('old'), [])
+        self.assertIsNotNone(self.store.get('new'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+"""
+Unit tests for the background job manager.
+
+This module contains test cases for job queueing and execution.
+"""
+
+import os
+import time
+import tempfile
+import threading
+import unittest
+from app.job_store import JobStore
+from app.jobs import Job, JobManager, QueueFullError
+
+
+def wait_for(job: Job, timeout: float = 5.0) -> None:
+    """Block until the job reaches a terminal state."""
+    deadline = time.time() + timeout
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestJobManager(unittest.TestCase):
+    """Test cases for JobManager class."""
+    
+    def test_job_runs_and_reports_result(self):
+        """Test successful job execution."""
+        manager = JobManager(workers=1, queue_size=5)
+        job = manager.submit(lambda url: {'success': True, 'url': url}, url='x')
+        wait_for(job)
+        
+        self.assertEqual(job.status, Job.FINISHED)
+        self.assertEqual(job.result, {'success': True, 'url': 'x'})
+        self.assertIs(manager.get(job.id), job)
+    
+    def test_job_failure_is_recorded(self):
+        """Test failed job records its error."""
+        def fail():
+            raise Exception('boom')
+        
+        manager = JobManager(workers=1, queue_size=5)
+        job = manager.submit(fail)
+        wait_for(job)
+        
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.error, 'boom')
+        self.assertEqual(job.to_dict()['status'], 'failed')
+    
+    def test_queue_full(self):
+        """Test submissions beyond the queue size are rejected."""
+        release = threading.Event()
+        manager = JobManager(workers=1, queue_size=1)
+        first = manager.submit(release.wait)
+        while first.status != Job.RUNNING:
+            time.sleep(0.01)
+        manager.submit(release.wait)
+        
+        with self.assertRaises(QueueFullError):
+            manager.submit(release.wait)
+        release.set()
+    
+    def test_unknown_job(self):
+        """Test lookup of an unknown job id."""
+        manager = JobManager(workers=1, queue_size=1)
+        self.assertIsNone(manager.get('missing'))
+    
+    def test_estimated_jobs_run_shortest_first(self):
+        """Test that the estimate orders jobs and wait times are reported."""
+        release = threading.Event()
+        order = []
+        
+        def run(name):
+            release.wait()
+            order.append(name)
+            return {}
+        
+        manager = JobManager(
+            workers=1,
+            queue_size=5,
+            estimate=lambda job: ('video', {'long': 10000, 'short': 100}.get(job.params['name'], 0))
+        )
+        blocker = manager.submit(run, name='blocker')
+        while blocker.status != Job.RUNNING:
+            time.sleep(0.01)
+        long = manager.submit(run, name='long')
+        short = manager.submit(run, name='short')
+        
+        self.assertEqual(manager.stats()['lanes']['video'], {'queued': 2, 'running': 1})
+        self.assertGreaterEqual(long.to_dict()['wait_time'], 0)
+        release.set()
+        wait_for(long)
+        
+        self.assertEqual(order, ['blocker', 'short', 'long'])
+        self.assertEqual(long.to_dict()['cost'], 10000)
+        self.assertGreaterEqual(long.wait_time, short.wait_time)
+
+
+class TestJobRecovery(unittest.TestCase):
+    """Test cases for jobs backed by a JobStore."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, JobStore.DB_FILENAME)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.tmp.cleanup()
+    
+    def test_finished_job_survives_restart(self):
+        """Test that a finished job is readable from a new manager."""
+        manager = JobManager(workers=1, queue_size=5, store=JobStore(self.path))
+        job = manager.submit(lambda url: {'path': url}, kind='video', url='x')
+        wait_for(job)
+        
+        restored = JobManager(workers=1, queue_size=5, store=JobStore(self.path)).get(job.id)
+        
+        self.assertEqual(restored.status, Job.FINISHED)
+        self.assertEqual(restored.result, {'path': 'x'})
+        self.assertEqual(restored.kind, 'video')
+    
+    def test_interrupted_jobs_are_requeued(self):
+        """Test that unfinished jobs run again and unknown kinds fail."""
+        store = JobStore(self.path)
+        release = threading.Event()
+        old = JobManager(workers=1, queue_size=5, store=store)
+        running = old.submit(release.wait, kind='video')
+        while running.status != Job.RUNNING:
+            time.sleep(0.01)
+        queued = old.submit(release.wait, kind='video')
+        unknown = old.submit(release.wait, kind='other')
+        
+        # A new process finds the jobs still queued or running
+        manager = JobManager(workers=2, queue_size=5, store=JobStore(self.path))
+        
+        def resolve(job):
+            if job.kind != 'video':
+                return None
+            return lambda: {'resumed': job.id}
+        
+        # The old process stops renewing its lease
+        store._conn.execute('UPDATE instances SET heartbeat = 0 WHERE token = ?', (store.instance,))
+        self.assertEqual(manager.recover(resolve), 2)
+        for job_id in (running.id, queued.id):
+            wait_for(manager.get(job_id))
+            self.assertEqual(manager.get(job_id).result, {'resumed': job_id})
+        self.assertEqual(manager.get(unknown.id).status, Job.FAILED)
+        self.assertEqual(store.get(running.id)['attempts'], 2)
+        release.set()
+    
+    def test_job_killing_its_process_is_given_up(self):
+        """Test that a job interrupted max_attempts times is failed, not requeued."""
+        store = JobStore(self.path)
+        job = Job(None, {}, kind='video')
+        job.status = Job.RUNNING
+        # Started twice, each time by a process that then died
+        store.save(job.to_record())
+        store.save(job.to_record())
+        store._conn.execute('UPDATE instances SET heartbeat = 0')
+        
+        manager = JobManager(workers=1, queue_size=5, store=JobStore(self.path), max_attempts=2)
+        
+        self.assertEqual(manager.recover(lambda job: lambda: {}), 0)
+        self.assertEqual(manager.get(job.id).status, Job.FAILED)
+        self.assertEqual(store.get(job.id)['attempts'], 2)
+        self.assertIn('Interrupted 2 times', store.get(job.id)['error'])
+    
+    def test_jobs_are_taken_over_when_lease_expires(self):
+        """Test that jobs of a process that stopped after startup are requeued later."""
+        manager = JobManager(workers=1, queue_size=5, store=JobStore(self.path, lease=0.3))
+        self.assertEqual(manager.recover(lambda job: lambda: {'resumed': job.id}), 0)
+        
+        # Another process takes a job, then stops renewing its lease
+        other = JobStore(self.path)
+        job = Job(None, {}, kind='video')
+        other.save(job.to_record())
+        other._conn.execute('UPDATE instances SET heartbeat = 0 WHERE token = ?', (other.instance,))
+        
+        deadline = time.time() + 5.0
+        while manager.get(job.id).status != Job.FINISHED and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(manager.get(job.id).result, {'resumed': job.id})
+
+
+if __name__ == '__main__':
+    unittest.main()
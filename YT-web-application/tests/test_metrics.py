@@ -0,0 +1,96 @@
+"""
+Unit tests for the metrics module.
+
+This module contains test cases for sharded metrics and their exposition.
+"""
+
+import threading
+import unittest
+from app import metrics
+from app.metrics import Counter, DownloadMeter, Gauge, Histogram, SampledCounter, render
+
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for counters, histograms and gauges."""
+    
+    def test_counter_sums_thread_shards(self):
+        """Test that increments from many threads are all counted."""
+        counter = Counter('test_total', 'Test counter.', ('kind',))
+        
+        def work():
+            for _ in range(1000):
+                counter.inc(labels=('a',))
+        
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(5, ('b',))
+        
+        self.assertEqual(counter.values(), {('a',): 8000, ('b',): 5})
+        self.assertIn('test_total{kind="a"} 8000', render([counter]))
+    
+    def test_histogram_exposition(self):
+        """Test cumulative buckets, sum and count."""
+        histogram = Histogram('test_seconds', 'Test histogram.', ('route',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, ('/',))
+        histogram.observe(0.1, ('/',))
+        histogram.observe(3, ('/',))
+        
+        text = render([histogram])
+        
+        self.assertIn('# TYPE test_seconds histogram', text)
+        self.assertIn('test_seconds_bucket{route="/",le="0.1"} 2', text)
+        self.assertIn('test_seconds_bucket{route="/",le="1"} 2', text)
+        self.assertIn('test_seconds_bucket{route="/",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_sum{route="/"} 3.15', text)
+        self.assertIn('test_seconds_count{route="/"} 3', text)
+    
+    def test_gauge_label_escaping(self):
+        """Test that label values are escaped."""
+        gauge = Gauge('test_gauge', 'Test gauge.', ('name',))
+        gauge.set(1.5, ('a"b',))
+        
+        self.assertIn('test_gauge{name="a\\"b"} 1.5', render([gauge]))
+    
+    def test_sampled_counter(self):
+        """Test that a counter set at scrape time is exposed as a counter."""
+        counter = SampledCounter('test_requests_total', 'Test requests.', ('result',))
+        counter.set(3, ('hit',))
+        text = render([counter])
+        
+        self.assertIn('# TYPE test_requests_total counter', text)
+        self.assertIn('test_requests_total{result="hit"} 3', text)
+    
+    def test_cumulative_series_are_counters(self):
+        """Test that totals sampled from components are exposed as counters."""
+        for metric in (
+            metrics.CACHE_REQUESTS,
+            metrics.WORKER_RESTARTS,
+            metrics.BANDWIDTH_THROTTLED,
+            metrics.YDL_CACHE_EXTRACTIONS,
+        ):
+            with self.subTest(metric=metric.name):
+                self.assertTrue(metric.name.endswith('_total'))
+                self.assertIn(f'# TYPE {metric.name} counter', render([metric]))
+    
+    def test_download_meter(self):
+        """Test byte accounting from cumulative progress data."""
+        before = metrics.DOWNLOADED_BYTES.values().get(('test',), 0)
+        meter = DownloadMeter('test')
+        meter.progress({'status': 'downloading', 'filename': 'a', 'downloaded_bytes': 100, 'speed': 50})
+        meter.progress({'status': 'downloading', 'filename': 'a', 'downloaded_bytes': 300, 'speed': 70})
+        self.assertIn('ytdl_download_speed_bytes 70', render())
+        meter.progress({'status': 'finished', 'filename': 'a', 'downloaded_bytes': 400, 'elapsed': 2})
+        meter.progress({'status': 'downloading', 'filename': 'b', 'downloaded_bytes': 50})
+        meter.postprocessor({'status': 'started', 'postprocessor': 'FFmpegExtractAudio'})
+        meter.postprocessor({'status': 'finished', 'postprocessor': 'FFmpegExtractAudio'})
+        meter.close()
+        
+        self.assertEqual(metrics.DOWNLOADED_BYTES.values()[('test',)] - before, 450)
+        self.assertIn('ytdl_postprocess_duration_seconds_count{postprocessor="FFmpegExtractAudio"}', render())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Unit tests for the progress registry.
+
+This module contains test cases for per-job progress tracking.
+"""
+
+import os
+import json
+import tempfile
+import unittest
+from app.downloader import DownloadProgress
+from app.progress import ProgressRegistry, ProgressStore, RemoteProgress, stream_progress
+
+
+class TestProgressRegistry(unittest.TestCase):
+    """Test cases for ProgressRegistry class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.registry = ProgressRegistry(ttl=60)
+    
+    def test_records_are_independent(self):
+        """Test that concurrent jobs do not share progress."""
+        first = self.registry.create('job-1')
+        second = self.registry.create('job-2')
+        first.update({
+            'status': 'downloading',
+            'total_bytes': 100,
+            'downloaded_bytes': 50
+        })
+        
+        self.assertIs(self.registry.get('job-1'), first)
+        self.assertEqual(self.registry.get('job-1').percentage, 50.0)
+        self.assertEqual(self.registry.get('job-2').percentage, 0.0)
+        self.assertIsInstance(second, DownloadProgress)
+    
+    def test_records_carry_job_id(self):
+        """Test that records know their job, which keys their progress events."""
+        self.assertEqual(self.registry.create('job-1').job_id, 'job-1')
+        self.assertNotEqual(DownloadProgress().job_id, DownloadProgress().job_id)
+    
+    def test_closed_records_expire(self):
+        """Test that finished records are dropped after the TTL."""
+        progress = self.registry.create('job-1')
+        progress.close()
+        self.assertIs(self.registry.get('job-1'), progress)
+        
+        progress.closed_at -= 61
+        self.assertIsNone(self.registry.get('job-1'))
+        
+        self.registry.create('job-2')
+        self.assertEqual(len(self.registry), 1)
+    
+    def test_discard(self):
+        """Test removal of a record that will never be used."""
+        self.registry.create('job-1')
+        self.registry.discard('job-1')
+        self.assertIsNone(self.registry.get('job-1'))
+
+
+class TestProgressStore(unittest.TestCase):
+    """Test cases for progress shared between worker processes."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, ProgressStore.DB_FILENAME)
+        self.writer = ProgressRegistry(ttl=60, store=ProgressStore(path))
+        self.reader = ProgressRegistry(ttl=60, store=ProgressStore(path))
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.tmp.cleanup()
+    
+    def test_other_process_reads_progress(self):
+        """Test that a job is visible through a registry that did not run it."""
+        self.assertIsNone(self.reader.get('job-1'))
+        progress = self.writer.create('job-1')
+        progress.update({
+            'status': 'downloading',
+            'total_bytes': 100,
+            'downloaded_bytes': 25,
+            'filename': '/downloads/Song.webm.part'
+        })
+        self.writer.sync()
+        
+        remote = self.reader.get('job-1')
+        self.assertIsInstance(remote, RemoteProgress)
+        self.assertEqual(remote.percentage, 25.0)
+        self.assertEqual(remote.filename, '/downloads/Song.webm.part')
+        self.assertEqual(remote.to_dict(), progress.to_dict())
+        
+        progress.update({'status': 'finished', 'filename': '/downloads/Song.mp3'})
+        progress.close()
+        self.writer.sync()
+        remote.refresh_interval = 0
+        self.assertEqual(remote.status, 'finished')
+        self.assertIsNotNone(remote.closed_at)
+    
+    def test_sync_writes_changed_records(self):
+        """Test that unchanged records are not written again."""
+        progress = self.writer.create('job-1')
+        self.assertEqual(self.writer.sync(), 1)
+        self.assertEqual(self.writer.sync(), 0)
+        
+        progress.update({'status': 'downloading'})
+        self.assertEqual(self.writer.sync(), 1)
+    
+    def test_closed_snapshots_expire(self):
+        """Test that old snapshots are neither served nor kept."""
+        progress = self.writer.create('job-1')
+        progress.close()
+        progress.closed_at -= 61
+        self.writer.store.write([('job-1', progress)])
+        
+        self.assertIsNone(self.reader.get('job-1'))
+        self.writer.sync()
+        self.assertIsNone(self.reader.store.read('job-1'))
+
+
+class TestStreamProgress(unittest.TestCase):
+    """Test cases for the Server-Sent Events progress stream."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.registry = ProgressRegistry(ttl=60)
+    
+    def test_sends_deltas_and_done(self):
+        """Test that only changed fields are sent and the stream ends."""
+        progress = self.registry.create('job-1')
+        stream = stream_progress(self.registry, 'job-1', interval=0)
+        
+        first = json.loads(next(stream)[len('data: '):])
+        self.assertEqual(first['status'], 'idle')
+        self.assertIn('percentage', first)
+        
+        progress.update({'status': 'finished', 'filename': 'a.mp4'})
+        progress.close()
+        delta = next(stream)
+        done = next(stream)
+        
+        self.assertEqual(
+            json.loads(delta[len('data: '):]),
+            {'status': 'finished', 'percentage': 100.0, 'filename': 'a.mp4'}
+        )
+        self.assertTrue(done.startswith('event: done\n'))
+        self.assertEqual(list(stream), [])
+    
+    def test_unknown_job(self):
+        """Test that an unknown job ends the stream immediately."""
+        events = list(stream_progress(self.registry, 'missing', interval=0))
+        
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0].startswith('event: gone\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
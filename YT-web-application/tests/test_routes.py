@@ -0,0 +1,347 @@
+"""
+Unit tests for the application factory and API routes.
+
+This module contains test cases that exercise the Flask app without network
+access.
+"""
+
+import os
+import time
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+from flask import current_app
+from app import create_app, routes
+from app.config import Config
+from app.job_store import JobStore
+from app.jobs import Job, new_job_id
+
+# Module-level singletons created on demand by app.routes
+SINGLETONS = (
+    'downloader', 'download_cache', 'storage_manager', 'job_manager',
+    'progress_registry', 'batch_manager',
+)
+
+
+def isolate(test: unittest.TestCase) -> str:
+    """
+    Point the application at temporary downloads and state folders for one test.
+    
+    The job, progress and download index databases live in the state
+    folder, so the real ``downloads`` and ``instance`` folders are never
+    touched. Singletons are reset before and after the test so every test
+    builds its own.
+    
+    Args:
+        test: Test case whose cleanups undo the changes.
+    
+    Returns:
+        Path of the temporary downloads folder.
+    """
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    folder = os.path.join(tmp.name, 'downloads')
+    os.makedirs(folder)
+    patcher = mock.patch.multiple(
+        Config,
+        DOWNLOAD_FOLDER=folder,
+        STATE_DIR=os.path.join(tmp.name, 'state'),
+        JOB_STORE_PATH=None
+    )
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    
+    def reset():
+        for name in SINGLETONS:
+            setattr(routes, name, None)
+    
+    reset()
+    test.addCleanup(reset)
+    return folder
+
+
+class TestCreateApp(unittest.TestCase):
+    """Test cases for application startup."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.folder = isolate(self)
+    
+    def test_lazy_startup_defers_downloader(self):
+        """Test that lazy mode does not build the downloader at startup."""
+        with mock.patch.object(Config, 'YTDLP_WARMUP', 'lazy'):
+            app = create_app()
+        
+        self.assertEqual(app.config['YTDLP_WARMUP'], 'lazy')
+        self.assertIsNone(routes.downloader)
+    
+    def test_recovered_job_builds_downloader_when_it_runs(self):
+        """Test that resuming a job at startup defers the downloader to its worker."""
+        os.makedirs(Config.STATE_DIR)
+        store = JobStore(os.path.join(Config.STATE_DIR, JobStore.DB_FILENAME))
+        job = Job(None, {'url': 'https://youtu.be/abc', 'quality': '720'}, kind='video')
+        store.save(job.to_record())
+        # Its process is gone
+        store._conn.execute('UPDATE instances SET heartbeat = 0')
+        threads = []
+        
+        def get_downloader():
+            threads.append(threading.current_thread().name)
+            self.assertEqual(current_app.config['DOWNLOAD_FOLDER'], self.folder)
+            return mock.Mock(download_video=lambda **params: {'resumed': params['url']})
+        
+        with mock.patch.object(Config, 'YTDLP_WARMUP', 'lazy'), \
+                mock.patch.object(routes, 'get_downloader', get_downloader):
+            create_app()
+            resumed = routes.job_manager.get(job.id)
+            deadline = time.time() + 5
+            while not resumed.done and time.time() < deadline:
+                time.sleep(0.01)
+        
+        self.assertEqual(resumed.result, {'resumed': 'https://youtu.be/abc'})
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('job-worker'))
+    
+    def test_eager_startup_builds_downloader(self):
+        """Test that eager mode builds the downloader inside create_app."""
+        with mock.patch.object(Config, 'YTDLP_WARMUP', 'eager'), \
+                mock.patch.object(routes.YouTubeDownloader, 'warm_pool') as warm, \
+                mock.patch.object(routes.YouTubeDownloader, 'warm_ydl_cache') as warm_cache:
+            create_app()
+        
+        self.assertIsNotNone(routes.downloader)
+        warm.assert_called_once_with()
+        # Cache warming is opt-in
+        warm_cache.assert_not_called()
+    
+    def test_startup_warms_ydl_cache_when_configured(self):
+        """Test that a configured warm URL is extracted at startup."""
+        url = 'https://www.youtube.com/watch?v=abc'
+        with mock.patch.object(Config, 'YTDLP_WARMUP', 'eager'), \
+                mock.patch.object(Config, 'YDL_CACHE_WARM_URL', url), \
+                mock.patch.object(routes.YouTubeDownloader, 'warm_pool'), \
+                mock.patch.object(routes.YouTubeDownloader, 'warm_ydl_cache') as warm_cache:
+            create_app()
+        
+        warm_cache.assert_called_once_with(url)
+
+
+class TestRoutes(unittest.TestCase):
+    """Test cases for API endpoints."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.folder = isolate(self)
+        with mock.patch.object(Config, 'YTDLP_WARMUP', 'lazy'):
+            self.client = create_app().test_client()
+    
+    def test_job_stats(self):
+        """Test the job queue statistics endpoint."""
+        response = self.client.get('/api/jobs')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('queued', response.get_json())
+    
+    def test_unknown_job(self):
+        """Test that unknown jobs return 404."""
+        self.assertEqual(self.client.get('/api/jobs/missing').status_code, 404)
+        self.assertEqual(self.client.get('/api/progress/missing').status_code, 404)
+    
+    def test_download_requires_url(self):
+        """Test that a download without URL is rejected."""
+        response = self.client.post('/api/download', json={'type': 'audio'})
+        
+        self.assertEqual(response.status_code, 400)
+    
+    def test_download_rejects_unknown_format(self):
+        """Test that an unsupported audio format is rejected."""
+        response = self.client.post('/api/download', json={
+            'url': 'https://youtu.be/abc', 'type': 'audio', 'format': 'wav'
+        })
+        
+        self.assertEqual(response.status_code, 400)
+    
+    def test_download_rejects_invalid_type_and_quality(self):
+        """Test that only configured types and qualities are accepted."""
+        for path, body in (
+            ('/api/download', {'url': 'https://youtu.be/abc', 'quality': '../../x'}),
+            ('/api/download', {'url': 'https://youtu.be/abc', 'type': 'audio', 'quality': '720'}),
+            ('/api/download', {'url': 'https://youtu.be/abc', 'type': 'gif'}),
+            ('/api/batch', {'urls': ['https://youtu.be/abc'], 'quality': '../../x'}),
+        ):
+            with self.subTest(path=path, body=body):
+                self.assertEqual(self.client.post(path, json=body).status_code, 400)
+        
+        self.assertEqual(routes.get_job_manager().stats()['queued'], 0)
+    
+    def test_download_rejects_invalid_range(self):
+        """Test that bad or streamed time ranges are rejected."""
+        for body in (
+            {'start': '1:30', 'end': '1:00'},
+            {'start': 'soon'},
+            {'start': 10, 'stream': True},
+        ):
+            response = self.client.post('/api/download', json={
+                'url': 'https://youtu.be/abc', 'type': 'video', **body
+            })
+            
+            self.assertEqual(response.status_code, 400)
+    
+    def test_metrics(self):
+        """Test that request latency and queue gauges are exposed."""
+        self.client.get('/api/jobs')
+        response = self.client.get('/metrics')
+        text = response.get_data(as_text=True)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_request_duration_seconds_count{route="/api/jobs",method="GET",status="200"}', text)
+        self.assertIn('job_queue_depth{queue="download"}', text)
+    
+    def test_batch_requires_urls(self):
+        """Test that a batch without URLs is rejected."""
+        response = self.client.post('/api/batch', json={'urls': ['  ']})
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/batch/missing').status_code, 404)
+    
+    def test_batch_is_stored(self):
+        """Test that a batch runs through the downloader and is kept in the job store."""
+        downloader = mock.Mock()
+        downloader.expand_urls.return_value = [{'id': 'abc', 'url': 'https://youtu.be/abc'}]
+        downloader.download_audio.return_value = {'filename': 'Song.m4a'}
+        with mock.patch.object(routes, 'get_downloader', return_value=downloader):
+            response = self.client.post('/api/batch', json={
+                'urls': ['https://youtu.be/abc'], 'type': 'audio', 'format': 'm4a'
+            })
+            batch = routes.batch_manager.get(response.get_json()['batch_id'])
+            deadline = time.time() + 5
+            while not batch.done and time.time() < deadline:
+                time.sleep(0.01)
+        routes.batch_manager.sync()
+        
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(downloader.download_audio.call_args.kwargs['audio_format'], 'm4a')
+        record = routes.get_job_manager().store.get_batch(batch.id)
+        self.assertEqual(record['kind'], 'audio')
+        self.assertEqual(record['params'], {'quality': '192', 'audio_format': 'm4a'})
+        self.assertEqual(record['snapshot']['items'][0]['filename'], 'Song.m4a')
+
+
+class TestDownloadFile(unittest.TestCase):
+    """Test cases for file delivery."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.folder = isolate(self)
+        Path(self.folder, 'clip.mp4').write_bytes(b'0123456789')
+        with mock.patch.object(Config, 'YTDLP_WARMUP', 'lazy'):
+            self.app = create_app()
+        self.client = self.app.test_client()
+    
+    def test_range_request(self):
+        """Test that a byte range is served as partial content."""
+        response = self.client.get(
+            '/api/download-file/clip.mp4', headers={'Range': 'bytes=2-5'}
+        )
+        
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, b'2345')
+        self.assertEqual(response.headers['Content-Range'], 'bytes 2-5/10')
+        response.close()
+    
+    def test_conditional_request(self):
+        """Test ETag revalidation and If-Range with a stale validator."""
+        response = self.client.get('/api/download-file/clip.mp4')
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        response.close()
+        
+        cached = self.client.get(
+            '/api/download-file/clip.mp4', headers={'If-None-Match': etag}
+        )
+        self.assertEqual(cached.status_code, 304)
+        
+        stale = self.client.get(
+            '/api/download-file/clip.mp4',
+            headers={'Range': 'bytes=2-5', 'If-Range': '"stale"'}
+        )
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.data, b'0123456789')
+        stale.close()
+    
+    def test_served_file_is_pinned_until_closed(self):
+        """Test that a file being sent cannot be evicted."""
+        response = self.client.get('/api/download-file/clip.mp4')
+        self.assertEqual(routes.storage_manager.stats()['pinned'], 1)
+        
+        response.close()
+        self.assertEqual(routes.storage_manager.stats()['pinned'], 0)
+        
+        self.app.config['USE_X_SENDFILE'] = True
+        self.client.get('/api/download-file/clip.mp4').close()
+        self.assertEqual(routes.storage_manager.stats()['pinned'], 0)
+    
+    def test_x_accel_redirect(self):
+        """Test that nginx delivery only sets the redirect header."""
+        self.app.config['FILE_DELIVERY'] = 'x-accel'
+        response = self.client.get('/api/download-file/clip.mp4')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(
+            response.headers['X-Accel-Redirect'], '/protected-downloads/clip.mp4'
+        )
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+    
+    def test_internal_files_are_not_served(self):
+        """Test that state databases and other dotfiles return 404."""
+        Path(self.folder, '.secret').write_bytes(b'x')
+        names = ['.jobs.sqlite3', '.download_index.sqlite3', '.progress.sqlite3', '.bandwidth.sqlite3', '.secret']
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(f'/api/download-file/{name}').status_code, 404)
+        
+        self.assertFalse(any(Path(self.folder).glob('*.sqlite3')))
+    
+    def test_missing_file(self):
+        """Test that unknown files return 404."""
+        response = self.client.get('/api/download-file/missing.mp4')
+        
+        self.assertEqual(response.status_code, 404)
+    
+    def test_stream_running_job(self):
+        """Test that a running job's file is streamed as it is written."""
+        path = Path(self.folder, 'live.mp4')
+        path.write_bytes(b'abc')
+        release = threading.Event()
+        job_id = new_job_id()
+        with self.app.app_context():
+            progress = routes.get_progress_registry().create(job_id)
+        progress.update({'status': 'downloading', 'filename': str(path)})
+        
+        def fetch():
+            release.wait(5)
+            with open(path, 'ab') as f:
+                f.write(b'def')
+            progress.close()
+            return {'filename': path.name}
+        
+        with self.app.app_context():
+            routes.get_job_manager().submit(fetch, job_id=job_id)
+        response = self.client.get(f'/api/stream/{job_id}')
+        release.set()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'video/mp4')
+        self.assertEqual(response.data, b'abcdef')
+    
+    def test_stream_unknown_job(self):
+        """Test that streaming an unknown job returns 404."""
+        self.assertEqual(self.client.get('/api/stream/missing').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Unit tests for job scheduling.
+
+This module contains test cases for shortest-job-first ordering, lanes and
+aging of waiting jobs.
+"""
+
+import queue
+import unittest
+from app.jobs import Job
+from app.scheduler import DEFAULT_DURATION, JobScheduler, estimate_cost
+
+
+def make_job(lane: str = 'video', cost: float = 0.0, queued_at: float = 0.0) -> Job:
+    """Create a job with the given scheduling fields."""
+    job = Job(None, {})
+    job.lane = lane
+    job.cost = cost
+    job.queued_at = queued_at
+    return job
+
+
+class TestEstimateCost(unittest.TestCase):
+    """Test cases for estimate_cost function."""
+    
+    def test_video_costs_more_than_audio(self):
+        """Test that type and quality weigh the duration."""
+        audio = estimate_cost('audio', '320', 180)
+        low = estimate_cost('video', '360', 180)
+        high = estimate_cost('video', '1080', 180)
+        
+        self.assertEqual(audio, 180)
+        self.assertLess(audio, low)
+        self.assertLess(low, high)
+        self.assertEqual(estimate_cost('video', 'best', 180), high)
+    
+    def test_unknown_duration(self):
+        """Test that a default duration is assumed."""
+        self.assertEqual(estimate_cost('audio', '192', None), DEFAULT_DURATION)
+
+
+class TestJobScheduler(unittest.TestCase):
+    """Test cases for JobScheduler class."""
+    
+    def test_shortest_job_first(self):
+        """Test that the cheapest job of a lane runs first."""
+        scheduler = JobScheduler(10)
+        long = make_job(cost=10800)
+        short = make_job(cost=180, queued_at=1)
+        scheduler.put_nowait(long)
+        scheduler.put_nowait(short)
+        
+        self.assertIs(scheduler.get(), short)
+        self.assertIs(scheduler.get(), long)
+    
+    def test_equal_costs_run_in_arrival_order(self):
+        """Test FIFO order when no costs are known."""
+        scheduler = JobScheduler(10)
+        jobs = [make_job() for _ in range(3)]
+        for job in jobs:
+            scheduler.put_nowait(job)
+        
+        self.assertEqual([scheduler.get() for _ in jobs], jobs)
+    
+    def test_aging(self):
+        """Test that a long job is not overtaken once it waited long enough."""
+        scheduler = JobScheduler(10, aging=100)
+        long = make_job(cost=10000, queued_at=0)
+        early = make_job(cost=500, queued_at=50)
+        late = make_job(cost=500, queued_at=200)
+        for job in (late, long, early):
+            scheduler.put_nowait(job)
+        
+        self.assertEqual([scheduler.get() for _ in range(3)], [early, long, late])
+    
+    def test_lanes_share_workers(self):
+        """Test that a waiting audio job is not stuck behind running videos."""
+        scheduler = JobScheduler(10)
+        videos = [make_job('video', 100, queued_at=index) for index in range(3)]
+        audio = make_job('audio', 1000, queued_at=10)
+        for job in videos + [audio]:
+            scheduler.put_nowait(job)
+        
+        first = scheduler.get()
+        self.assertIs(first, videos[0])
+        self.assertIs(scheduler.get(), audio)
+        self.assertIs(scheduler.get(), videos[1])
+        
+        self.assertEqual(scheduler.stats(), {
+            'audio': {'queued': 0, 'running': 1},
+            'video': {'queued': 1, 'running': 2},
+        })
+        scheduler.done(first)
+        self.assertEqual(scheduler.stats()['video']['running'], 1)
+    
+    def test_full(self):
+        """Test that the size bound spans all lanes."""
+        scheduler = JobScheduler(2)
+        scheduler.put_nowait(make_job('video'))
+        scheduler.put_nowait(make_job('audio'))
+        
+        with self.assertRaises(queue.Full):
+            scheduler.put_nowait(make_job('audio'))
+        self.assertEqual(scheduler.qsize(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
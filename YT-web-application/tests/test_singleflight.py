@@ -0,0 +1,68 @@
+"""
+Unit tests for single-flight call coalescing.
+
+This module contains test cases for sharing the result of identical calls.
+"""
+
+import threading
+import time
+import unittest
+from app.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for SingleFlight class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.flights = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+    
+    def _work(self):
+        """Blocking unit of work counting its executions."""
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return {'value': 42}
+    
+    def test_identical_calls_share_result(self):
+        """Test that concurrent identical calls run the work once."""
+        results = []
+        joined = []
+        leader = threading.Thread(
+            target=lambda: results.append(self.flights.do('k', self._work, token='lead'))
+        )
+        leader.start()
+        self.started.wait(5)
+        
+        follower = threading.Thread(
+            target=lambda: results.append(
+                self.flights.do('k', self._work, on_join=joined.append)
+            )
+        )
+        follower.start()
+        while self.flights.coalesced == 0:
+            time.sleep(0.01)
+        self.release.set()
+        leader.join(5)
+        follower.join(5)
+        
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{'value': 42}, {'value': 42}])
+        self.assertEqual(joined, ['lead'])
+        self.assertEqual(self.flights.in_flight(), 0)
+    
+    def test_errors_are_shared_and_not_cached(self):
+        """Test that a failure is raised and the next call runs again."""
+        def fail():
+            raise ValueError('boom')
+        
+        with self.assertRaises(ValueError):
+            self.flights.do('k', fail)
+        self.assertEqual(self.flights.do('k', lambda: 'ok'), 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit tests for the storage quota manager.
+
+This module contains test cases for eviction and pinning.
+"""
+
+import os
+import time
+import tempfile
+import unittest
+from pathlib import Path
+from app.storage import PIN_DIRNAME, StorageManager, pin_file
+
+
+class TestStorageManager(unittest.TestCase):
+    """Test cases for StorageManager class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.tmp.cleanup()
+    
+    def make(self, name: str, size: int = 100, age: float = 3600) -> Path:
+        """Create a file of ``size`` bytes last modified ``age`` seconds ago."""
+        path = self.folder / name
+        path.write_bytes(b'x' * size)
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+        return path
+    
+    def test_no_quota(self):
+        """Test that nothing is evicted without a quota."""
+        self.make('a.mp4')
+        
+        self.assertEqual(StorageManager(str(self.folder), quota=None).enforce(), 0)
+    
+    def test_lru_eviction(self):
+        """Test that least recently used files go first, down to the watermark."""
+        a = self.make('a.mp4', age=300 + 30)
+        b = self.make('b.mp4', age=300 + 20)
+        c = self.make('c.mp4', age=300 + 10)
+        manager = StorageManager(str(self.folder), quota=200, grace_period=300)
+        manager.touch(a)
+        
+        freed = manager.enforce()
+        
+        self.assertEqual(freed, 200)
+        self.assertTrue(a.exists())
+        self.assertFalse(b.exists())
+        self.assertFalse(c.exists())
+        self.assertEqual(manager.stats()['evicted_files'], 2)
+        self.assertEqual(manager.stats()['usage'], 100)
+    
+    def test_lfu_eviction(self):
+        """Test that least frequently used files go first."""
+        a = self.make('a.mp4')
+        b = self.make('b.mp4')
+        manager = StorageManager(str(self.folder), quota=150, policy='lfu')
+        manager.touch(a)
+        manager.touch(a)
+        manager.touch(b)
+        
+        manager.enforce()
+        
+        self.assertTrue(a.exists())
+        self.assertFalse(b.exists())
+    
+    def test_protected_files(self):
+        """Test that pinned, partial and recent files are never evicted."""
+        pinned = self.make('pinned.m4a')
+        self.make('video.mp4.part')
+        self.make('fresh.mp4', age=1)
+        manager = StorageManager(str(self.folder), quota=10)
+        
+        with manager.pinned(pinned):
+            self.assertEqual(manager.enforce(), 0)
+        
+        self.assertEqual(len(list(self.folder.iterdir())), 3)
+        self.assertEqual(manager.enforce(), 100)
+        self.assertFalse(pinned.exists())
+    
+    def test_pins_are_shared_between_processes(self):
+        """Test that a pin taken elsewhere through the state dir blocks eviction."""
+        state_dir = Path(self.tmp.name) / 'state'
+        pinned = self.make('pinned.m4a')
+        manager = StorageManager(str(self.folder), quota=10, state_dir=str(state_dir))
+        
+        with pin_file(pinned, state_dir / PIN_DIRNAME):
+            self.assertEqual(manager.enforce(), 0)
+        
+        self.assertEqual(manager.enforce(), 100)
+        self.assertEqual(list((state_dir / PIN_DIRNAME).iterdir()), [])
+    
+    def test_pin_until_released(self):
+        """Test that a pin outlives its call and is released once."""
+        pinned = self.make('pinned.m4a')
+        manager = StorageManager(str(self.folder), quota=10, state_dir=self.tmp.name)
+        
+        unpin = manager.pin(pinned)
+        self.assertEqual(manager.enforce(), 0)
+        unpin()
+        unpin()
+        
+        self.assertEqual(manager.stats()['pinned'], 0)
+        self.assertEqual(manager.enforce(), 100)
+    
+    def test_aliases_evicted_together(self):
+        """Test that hardlinked aliases count once and go with their file."""
+        canonical = self.make('Song [abc audio-192].mp3')
+        try:
+            os.link(canonical, self.folder / 'mine.mp3')
+        except OSError:
+            self.skipTest('Hardlinks unsupported')
+        self.make('other.mp3', age=7200)
+        manager = StorageManager(str(self.folder), quota=150)
+        manager.touch(canonical)
+        
+        self.assertEqual(manager.enforce(), 100)
+        self.assertEqual(sorted(p.name for p in self.folder.iterdir()), ['Song [abc audio-192].mp3', 'mine.mp3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Unit tests for streaming files that are still being written.
+
+This module contains test cases for the streaming helpers.
+"""
+
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from app.downloader import DownloadProgress
+from app.streaming import follow_file, wait_for_file
+
+
+class TestStreaming(unittest.TestCase):
+    """Test cases for wait_for_file and follow_file."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name, 'clip.m4a')
+        self.progress = DownloadProgress()
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.tmp.cleanup()
+    
+    def test_wait_for_file(self):
+        """Test that the path is returned once the file exists."""
+        self.progress.filename = str(self.path)
+        self.assertIsNone(wait_for_file(self.progress, timeout=0.05, poll_interval=0.01))
+        
+        self.path.write_bytes(b'')
+        self.assertEqual(wait_for_file(self.progress, timeout=1), str(self.path))
+    
+    def test_wait_for_closed_download(self):
+        """Test that a download ending without a file stops the wait."""
+        self.progress.close()
+        
+        self.assertIsNone(wait_for_file(self.progress, timeout=5))
+    
+    def test_follow_growing_file(self):
+        """Test that data appended while following is streamed until close."""
+        self.path.write_bytes(b'abc')
+        
+        def writer():
+            time.sleep(0.05)
+            with open(self.path, 'ab') as f:
+                f.write(b'def')
+            time.sleep(0.05)
+            self.progress.close()
+        
+        thread = threading.Thread(target=writer)
+        thread.start()
+        data = b''.join(follow_file(
+            str(self.path), self.progress, chunk_size=2, poll_interval=0.01
+        ))
+        thread.join(5)
+        
+        self.assertEqual(data, b'abcdef')
+    
+    def test_follow_stalled_file(self):
+        """Test that streaming stops when no data arrives."""
+        self.path.write_bytes(b'abc')
+        
+        data = b''.join(follow_file(
+            str(self.path), self.progress, poll_interval=0.01, idle_timeout=0.05
+        ))
+        
+        self.assertEqual(data, b'abc')
+
+
+if __name__ == '__main__':
+    unittest.main()
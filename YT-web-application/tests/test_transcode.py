@@ -0,0 +1,138 @@
+"""
+Unit tests for the transcode planner.
+
+This module contains test cases for choosing between no post-processing,
+remuxing and re-encoding.
+"""
+
+import unittest
+from unittest import mock
+from app.transcode import (
+    NONE, REMUX, TRANSCODE, TranscodePlan, audio_args, encode_audio,
+    plan_audio, plan_video, run_audio_plan, run_video_plan,
+)
+
+
+class TestPlanVideo(unittest.TestCase):
+    """Test cases for video planning."""
+    
+    def test_mp4_needs_nothing(self):
+        """Test that an MP4 download is kept as is."""
+        plan = plan_video({'ext': 'mp4', 'vcodec': 'avc1.64001F', 'acodec': 'mp4a.40.2'})
+        
+        self.assertEqual(plan.action, NONE)
+        self.assertEqual(plan.source, 'mp4/avc1+aac')
+    
+    def test_compatible_codecs_are_remuxed(self):
+        """Test that MP4-compatible codecs in another container are remuxed."""
+        plan = plan_video({'ext': 'mkv', 'vcodec': 'vp09.00.40.08', 'acodec': 'opus'})
+        
+        self.assertEqual(plan.action, REMUX)
+        self.assertEqual(plan.target, 'mp4')
+    
+    def test_incompatible_codecs_are_transcoded(self):
+        """Test that codecs MP4 cannot hold are re-encoded."""
+        plan = plan_video({'ext': 'webm', 'vcodec': 'vp8', 'acodec': 'vorbis'})
+        
+        self.assertEqual(plan.action, TRANSCODE)
+    
+    def test_unknown_codecs_are_transcoded(self):
+        """Test that missing codec information falls back to re-encoding."""
+        self.assertEqual(plan_video({'ext': 'flv'}).action, TRANSCODE)
+
+
+class TestPlanAudio(unittest.TestCase):
+    """Test cases for audio planning."""
+    
+    def test_matching_codec_is_copied(self):
+        """Test that the source codec is copied into the target container."""
+        plan = plan_audio({'ext': 'webm', 'acodec': 'opus'}, 'opus')
+        
+        self.assertEqual(plan.action, REMUX)
+        self.assertEqual(plan.target, 'opus')
+    
+    def test_target_format_needs_nothing(self):
+        """Test that a download already in the target format is kept."""
+        self.assertEqual(plan_audio({'ext': 'm4a', 'acodec': 'mp4a.40.2'}, 'm4a').action, NONE)
+    
+    def test_mp3_is_transcoded(self):
+        """Test that YouTube audio is re-encoded for MP3."""
+        self.assertEqual(plan_audio({'ext': 'webm', 'acodec': 'opus'}, 'mp3').action, TRANSCODE)
+    
+    def test_best_keeps_source(self):
+        """Test that 'best' keeps common audio files and copies others."""
+        kept = plan_audio({'ext': 'm4a', 'acodec': 'mp4a.40.2'}, 'best')
+        copied = plan_audio({'ext': 'webm', 'acodec': 'opus'}, 'best')
+        
+        self.assertEqual((kept.action, kept.target), (NONE, 'm4a'))
+        self.assertEqual((copied.action, copied.target), (REMUX, 'opus'))
+    
+    def test_codec_guessed_from_container(self):
+        """Test that a cached source without codec info is planned by extension."""
+        self.assertEqual(plan_audio({'ext': 'webm'}, 'opus').action, REMUX)
+
+
+class TestRunPlan(unittest.TestCase):
+    """Test cases for executing plans."""
+    
+    def test_nothing_to_do_skips_ffmpeg(self):
+        """Test that a 'none' plan does not run a post-processor."""
+        ydl = mock.Mock()
+        info = {'filepath': 'a.mp4'}
+        
+        result, seconds = run_video_plan(ydl, info, TranscodePlan(NONE, 'mp4', 'mp4', ''))
+        
+        self.assertIs(result, info)
+        self.assertEqual(seconds, 0.0)
+        ydl.run_pp.assert_not_called()
+    
+    def test_remux_uses_stream_copy(self):
+        """Test that a remux runs the remuxer rather than the converter."""
+        ydl = mock.Mock(_postprocessor_hooks=[], params={})
+        ydl.run_pp.return_value = {'filepath': 'a.mp4'}
+        
+        result, _ = run_video_plan(ydl, {'filepath': 'a.mkv'}, TranscodePlan(REMUX, 'mkv', 'mp4', ''))
+        
+        self.assertEqual(result, {'filepath': 'a.mp4'})
+        self.assertEqual(type(ydl.run_pp.call_args[0][0]).__name__, 'FFmpegVideoRemuxerPP')
+    
+    def test_audio_plan_passes_quality(self):
+        """Test that audio plans run the extractor with the target and bitrate."""
+        ydl = mock.Mock(_postprocessor_hooks=[], params={})
+        ydl.run_pp.return_value = {'filepath': 'a.mp3'}
+        
+        run_audio_plan(ydl, {'filepath': 'a.webm'}, TranscodePlan(TRANSCODE, 'webm', 'mp3', ''), '192')
+        
+        pp = ydl.run_pp.call_args[0][0]
+        self.assertEqual(type(pp).__name__, 'FFmpegExtractAudioPP')
+        self.assertEqual(pp.mapping, 'mp3')
+        self.assertEqual(pp._preferredquality, 192.0)
+
+
+class TestEncodeAudio(unittest.TestCase):
+    """Test cases for encoding from a local source."""
+    
+    def test_audio_args(self):
+        """Test FFmpeg options for copies and re-encodes."""
+        self.assertEqual(
+            audio_args(TranscodePlan(REMUX, 'webm/opus', 'opus', ''), '192'),
+            ['-vn', '-acodec', 'copy']
+        )
+        self.assertEqual(
+            audio_args(TranscodePlan(TRANSCODE, 'webm/opus', 'mp3', ''), '128'),
+            ['-vn', '-acodec', 'libmp3lame', '-b:a', '128k']
+        )
+    
+    def test_encode_writes_through_temp_file(self):
+        """Test that the target only appears once FFmpeg has finished."""
+        with mock.patch(
+            'yt_dlp.postprocessor.FFmpegPostProcessor.run_ffmpeg', autospec=True
+        ) as run_ffmpeg, mock.patch('os.replace') as replace:
+            encode_audio('src.webm', 'out.mp3', ['-vn'])
+        
+        self.assertEqual(run_ffmpeg.call_args[0][1:], ('src.webm', 'out.temp.mp3', ['-vn']))
+        replace.assert_called_once_with('out.temp.mp3', 'out.mp3')
+
+
+if __name__ == '__main__':
+    unittest.main()
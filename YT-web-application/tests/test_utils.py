@@ -9,7 +9,8 @@ from app.utils import (
     is_valid_youtube_url,
     sanitize_filename,
     extract_video_id,
-    validate_quality
+    validate_quality,
+    parse_timestamp
 )
 
 
@@ -83,6 +84,19 @@ class TestValidation(unittest.TestCase):
         # Invalid qualities
         self.assertFalse(validate_quality('999', 'video'))
         self.assertFalse(validate_quality('invalid', 'audio'))
+    
+    def test_parse_timestamp(self):
+        """Test parsing of clip start and end times."""
+        self.assertEqual(parse_timestamp(90), 90.0)
+        self.assertEqual(parse_timestamp('90.5'), 90.5)
+        self.assertEqual(parse_timestamp('1:30'), 90.0)
+        self.assertEqual(parse_timestamp('1:00:05'), 3605.0)
+        self.assertIsNone(parse_timestamp(None))
+        self.assertIsNone(parse_timestamp(''))
+        
+        for value in (-1, '-1', '1:2:3:4', 'abc', True, float('nan'), '1::2'):
+            with self.assertRaises(ValueError):
+                parse_timestamp(value)
 
 
 if __name__ == '__main__':
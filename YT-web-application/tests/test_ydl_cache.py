@@ -0,0 +1,84 @@
+"""
+Unit tests for the yt-dlp cache directory.
+
+This module contains test cases for warm/cold counting and size pruning.
+"""
+
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+from app.ydl_cache import STALE_TMP_AGE, YDLCache
+
+
+class TestYDLCache(unittest.TestCase):
+    """Test cases for YDLCache class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = YDLCache(self.tmp.name, max_bytes=250)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.tmp.cleanup()
+    
+    def write(self, name: str, size: int, age: float) -> str:
+        """Create a cache file of the given size and age."""
+        path = os.path.join(self.tmp.name, 'youtube-nsig', name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+    
+    def test_extractions_counted_warm_or_cold(self):
+        """Test that only extractions storing player data are cold."""
+        ydl = mock.Mock()
+        ydl.cache.load.side_effect = [None, {'code': 'f'}, None]
+        
+        with self.cache.track(ydl):
+            ydl.cache.load('youtube-nsig', 'a')
+            ydl.cache.store('youtube-nsig', 'a', {'code': 'f'})
+        with self.cache.track(ydl):
+            ydl.cache.load('youtube-nsig', 'a')
+        with self.cache.track(ydl):
+            pass  # Player functions still in memory
+        
+        stats = self.cache.stats()
+        self.assertEqual((stats['warm'], stats['cold']), (2, 1))
+        self.assertEqual((stats['hits'], stats['misses'], stats['stores']), (1, 1, 1))
+        
+        # Attaching again does not count twice
+        self.cache.attach(ydl)
+        ydl.cache.load('youtube-nsig', 'a')
+        self.assertEqual(self.cache.stats()['misses'], 2)
+    
+    def test_prune_oldest_first(self):
+        """Test that the oldest entries go once over the size bound."""
+        oldest = self.write('a.json', 100, age=30)
+        older = self.write('b.json', 100, age=20)
+        newest = self.write('c.json', 100, age=10)
+        
+        self.assertEqual(self.cache.prune(), 1)
+        
+        self.assertFalse(os.path.exists(oldest))
+        self.assertTrue(os.path.exists(older))
+        self.assertTrue(os.path.exists(newest))
+    
+    def test_prune_stale_temporary_files(self):
+        """Test that leftovers of interrupted writes are removed."""
+        stale = self.write('a.json.x1.tmp', 10, age=STALE_TMP_AGE + 60)
+        fresh = self.write('b.json.x2.tmp', 10, age=1)
+        
+        self.assertEqual(self.cache.prune(), 1)
+        
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertEqual(self.cache.stats()['files'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Unit tests for the YoutubeDL pool.
+
+This module contains test cases for leasing and reusing YoutubeDL instances.
+"""
+
+import unittest
+from app.ydl_pool import YDLPool
+
+
+class TestYDLPool(unittest.TestCase):
+    """Test cases for YDLPool class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.pool = YDLPool(size=1)
+        self.opts = {'quiet': True, 'format': 'bestaudio/best'}
+    
+    def test_instances_are_reused(self):
+        """Test that a returned instance is handed out again."""
+        with self.pool.lease('audio', self.opts) as first:
+            pass
+        with self.pool.lease('audio', self.opts) as second:
+            pass
+        
+        self.assertIs(first, second)
+        self.assertEqual(self.pool.stats()['created'], 1)
+        self.assertEqual(self.pool.stats()['reused'], 1)
+    
+    def test_warm(self):
+        """Test that warming pre-builds idle instances."""
+        self.pool.warm('audio', self.opts)
+        with self.pool.lease('audio', self.opts):
+            pass
+        
+        self.assertEqual(self.pool.stats()['created'], 1)
+        self.assertEqual(self.pool.stats()['idle'], {'audio': 1})
+    
+    def test_per_job_settings(self):
+        """Test that output template and progress hook are swapped per job."""
+        events = []
+        with self.pool.lease('audio', self.opts, outtmpl='a.%(ext)s',
+                             progress_hook=events.append) as ydl:
+            self.assertEqual(ydl.params['outtmpl']['default'], 'a.%(ext)s')
+            for hook in ydl._progress_hooks:
+                hook({'status': 'downloading'})
+        
+        with self.pool.lease('audio', self.opts, outtmpl='b.%(ext)s') as ydl:
+            self.assertEqual(ydl.params['outtmpl']['default'], 'b.%(ext)s')
+            for hook in ydl._progress_hooks:
+                hook({'status': 'downloading'})
+        
+        self.assertEqual(events, [{'status': 'downloading'}])
+    
+    def test_profiles_are_bounded(self):
+        """Test that the least recently used profile is dropped beyond the limit."""
+        pool = YDLPool(size=1, max_profiles=2)
+        for profile in ('a', 'b', 'a', 'c'):
+            with pool.lease(profile, self.opts):
+                pass
+        
+        self.assertEqual(pool.stats()['idle'], {'a': 1, 'c': 1})
+    
+    def test_failed_job_discards_instance(self):
+        """Test that an instance is not reused after its job raised."""
+        with self.assertRaises(RuntimeError):
+            with self.pool.lease('audio', self.opts) as first:
+                raise RuntimeError('failed')
+        with self.pool.lease('audio', self.opts) as second:
+            pass
+        
+        self.assertIsNot(first, second)
+        self.assertEqual(self.pool.stats()['created'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()